@@ -1,5 +1,5 @@
 """API module initialization"""
 
-from app.api import chat, notifications, auth, agents, navigation
+from app.api import chat, notifications, auth, agents, navigation, knowledge
 
-__all__ = ["chat", "notifications", "auth", "agents", "navigation"]
\ No newline at end of file
+__all__ = ["chat", "notifications", "auth", "agents", "navigation", "knowledge"]
\ No newline at end of file
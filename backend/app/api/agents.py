@@ -0,0 +1,115 @@
+"""
+Agent API endpoints
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.requests import HTTPConnection
+from fastapi.responses import StreamingResponse
+from typing import Dict, Any, AsyncIterator
+import json
+import time
+import structlog
+
+from app.api.chat import get_current_user
+from app.core.config import settings
+from app.services.agent_orchestrator import AgentOrchestrator
+from app.services.agent_pool import AgentOverloaded
+
+logger = structlog.get_logger()
+router = APIRouter()
+
+def get_orchestrator(connection: HTTPConnection) -> AgentOrchestrator:
+    """Process-wide agent orchestrator created in the application lifespan"""
+    return connection.app.state.agent_orchestrator
+
+@router.post("/claims/batch")
+async def analyze_claims_batch(
+    request: Dict[str, Any],
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    orchestrator: AgentOrchestrator = Depends(get_orchestrator)
+) -> StreamingResponse:
+    """Triage a batch of claims, streamed as NDJSON
+
+    One {"type": "claim", ...} line per claim, in input order, then a
+    {"type": "summary"} line with totals. A malformed claim gets a claim
+    line with an "error" field; an unexpected failure mid-stream ends the
+    stream with a {"type": "error"} line rather than cutting it off.
+    """
+
+    claims = request.get("claims")
+    if not isinstance(claims, list) or not claims:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="claims must be a non-empty list"
+        )
+    if len(claims) > settings.AGENT_CLAIMS_BATCH_MAX_CLAIMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.AGENT_CLAIMS_BATCH_MAX_CLAIMS} claims per batch"
+        )
+
+    user_id = current_user["user_id"]
+    started = time.perf_counter()
+    results = orchestrator.analyze_claims_batch(
+        claims,
+        user_id,
+        chunk_size=settings.AGENT_CLAIMS_BATCH_CHUNK_SIZE
+    )
+
+    # Claim an agent before committing to a 200 so overload can still be a 503
+    try:
+        first = await results.__anext__()
+    except AgentOverloaded as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Claims processor is overloaded, please retry shortly ({e.reason})"
+        )
+
+    logger.info("Claims batch started", user_id=user_id, claims=len(claims))
+
+    async def stream() -> AsyncIterator[str]:
+        exams = 0
+        rejected = 0
+        statuses: Dict[str, int] = {}
+
+        def line(result: Dict[str, Any]) -> str:
+            nonlocal exams, rejected
+            if "error" in result:
+                rejected += 1
+            else:
+                exams += result["exam_required"]
+                statuses[result["evidence_status"]] = statuses.get(result["evidence_status"], 0) + 1
+            return json.dumps({"type": "claim", **result}, default=str) + "\n"
+
+        try:
+            yield line(first)
+            async for result in results:
+                yield line(result)
+        except Exception as e:
+            logger.error("Claims batch failed", user_id=user_id, error=str(e))
+            yield json.dumps({"type": "error", "error": "Claims batch failed"}) + "\n"
+            return
+        finally:
+            # Returns the agent to its pool promptly if the client goes away
+            await results.aclose()
+
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        logger.info("Claims batch finished", user_id=user_id, claims=len(claims), elapsed_ms=round(elapsed_ms, 1))
+        yield json.dumps({
+            "type": "summary",
+            "claims": len(claims),
+            "rejected": rejected,
+            "exam_required": exams,
+            "evidence_status": statuses,
+            "elapsed_ms": round(elapsed_ms, 3)
+        }) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@router.get("/stats")
+async def get_agent_stats(
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    orchestrator: AgentOrchestrator = Depends(get_orchestrator)
+) -> Dict[str, Any]:
+    """Per-role agent pool statistics"""
+    return orchestrator.get_agent_stats()
@@ -3,6 +3,7 @@ Chat API endpoints with WebSocket support
 """
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException, status
+from fastapi.requests import HTTPConnection
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Dict, Any, Optional
 import json
@@ -25,11 +26,16 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         "permissions": ["chat", "navigate", "query_knowledge"]
     }
 
+def get_qbit(connection: HTTPConnection) -> QBitChatbot:
+    """Process-wide QBit chatbot created in the application lifespan"""
+    return connection.app.state.qbit
+
 @router.websocket("/ws/{session_id}")
 async def websocket_endpoint(
     websocket: WebSocket,
     session_id: str,
-    token: Optional[str] = None
+    token: Optional[str] = None,
+    qbit: QBitChatbot = Depends(get_qbit)
 ):
     """WebSocket endpoint for real-time chat"""
     
@@ -50,13 +56,6 @@ async def websocket_endpoint(
             single_session=True
         )
         
-        # Initialize QBit chatbot
-        from app.main import app
-        qbit = QBitChatbot(
-            kb_service=app.state.kb_service,
-            orchestrator=app.state.agent_orchestrator
-        )
-        
         # Send welcome message
         await connection.send_json({
             "type": "system",
@@ -77,8 +76,7 @@ async def websocket_endpoint(
                     await connection.send_json(message)
                     continue
                 
-                # Process with QBit
-                response = await qbit.process_message(
+                request = dict(
                     user_id=user_id,
                     session_id=session_id,
                     message=message.get("content", ""),
@@ -86,6 +84,16 @@ async def websocket_endpoint(
                     context=message.get("context", {})
                 )
                 
+                # Streaming mode: forward chunk frames as they are produced,
+                # then a final frame with the complete response
+                if message.get("stream"):
+                    async for frame in qbit.stream_message(**request):
+                        await connection.send_json(frame)
+                    continue
+                
+                # Process with QBit
+                response = await qbit.process_message(**request)
+                
                 # Send response
                 await connection.send_json(response)
                 
@@ -107,7 +115,8 @@ async def websocket_endpoint(
 @router.post("/message")
 async def send_message(
     message: Dict[str, Any],
-    current_user: Dict[str, Any] = Depends(get_current_user)
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    qbit: QBitChatbot = Depends(get_qbit)
 ) -> Dict[str, Any]:
     """Send a chat message (REST endpoint)"""
     
@@ -131,12 +140,6 @@ async def send_message(
         )
     
     # Process with QBit
-    from app.main import app
-    qbit = QBitChatbot(
-        kb_service=app.state.kb_service,
-        orchestrator=app.state.agent_orchestrator
-    )
-    
     response = await qbit.process_message(
         user_id=current_user["user_id"],
         session_id=message.get("session_id", "default"),
@@ -151,23 +154,41 @@ async def send_message(
 async def get_chat_history(
     session_id: str,
     limit: int = 50,
-    current_user: Dict[str, Any] = Depends(get_current_user)
+    cursor: Optional[str] = None,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    qbit: QBitChatbot = Depends(get_qbit)
 ) -> Dict[str, Any]:
-    """Get chat history for a session"""
+    """Get chat history for a session, newest page first
+    
+    Pass next_cursor from a response as cursor to fetch the page before it.
+    """
+    
+    limit = max(1, min(limit, 200))
+    
+    if qbit.chat_log is None:
+        # No persistent log configured; serve the recent turns held in memory
+        messages = qbit.conversations.history(current_user["user_id"], session_id, limit=limit)
+        page = {"messages": messages, "next_cursor": None, "has_more": False}
+    else:
+        if cursor is not None and not cursor.isdigit():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+        page = await qbit.chat_log.page(current_user["user_id"], session_id, limit=limit, cursor=cursor)
     
-    # Note: In production, this would retrieve from database
-    # For now, return empty history
     return {
         "session_id": session_id,
         "user_id": current_user["user_id"],
-        "messages": [],
-        "total": 0
+        **page,
+        "total": len(page["messages"])
     }
 
 @router.delete("/history/{session_id}")
 async def clear_chat_history(
     session_id: str,
-    current_user: Dict[str, Any] = Depends(get_current_user)
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    qbit: QBitChatbot = Depends(get_qbit)
 ) -> Dict[str, Any]:
     """Clear chat history for a session"""
     
@@ -177,7 +198,11 @@ async def clear_chat_history(
         user_id=current_user["user_id"]
     )
     
-    # Note: In production, this would clear from database
+    # Logged turns are tombstoned, not rewritten
+    qbit.conversations.clear(current_user["user_id"], session_id)
+    if qbit.chat_log is not None:
+        await qbit.chat_log.clear(current_user["user_id"], session_id)
+    
     return {
         "status": "success",
         "message": "Chat history cleared"
@@ -185,7 +210,8 @@ async def clear_chat_history(
 
 @router.get("/stats")
 async def get_chat_stats(
-    current_user: Dict[str, Any] = Depends(get_current_user)
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    qbit: QBitChatbot = Depends(get_qbit)
 ) -> Dict[str, Any]:
     """Get chat statistics"""
     
@@ -193,5 +219,8 @@ async def get_chat_stats(
     
     return {
         "websocket_stats": stats,
+        "conversation_stats": qbit.conversations.get_stats(),
+        "response_cache": qbit.response_cache.get_stats(),
+        "in_flight": qbit.in_flight.get_stats(),
         "user_id": current_user["user_id"]
     }
\ No newline at end of file
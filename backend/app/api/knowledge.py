@@ -0,0 +1,112 @@
+"""
+Knowledge base API endpoints
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.requests import HTTPConnection
+from typing import Dict, Any, List, Optional
+import asyncio
+import os
+import structlog
+
+from app.api.chat import get_current_user
+from app.core.config import settings
+from app.services.ingestion import IngestionPipeline
+from app.services.knowledge_base import KnowledgeBaseService
+
+logger = structlog.get_logger()
+router = APIRouter()
+
+# One bulk load at a time; concurrent loads would interleave segments
+_ingest_lock = asyncio.Lock()
+
+def get_kb_service(connection: HTTPConnection) -> KnowledgeBaseService:
+    """Process-wide knowledge base created in the application lifespan"""
+    return connection.app.state.kb_service
+
+def _resolve_ingest_path(name: str) -> str:
+    """Resolve a file name inside KB_INGEST_DIR, rejecting traversal"""
+    root = os.path.realpath(settings.KB_INGEST_DIR)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, path]) != root:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid source file: {name}"
+        )
+    return path
+
+@router.post("/ingest")
+async def ingest_sources(
+    request: Dict[str, Any],
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    kb_service: KnowledgeBaseService = Depends(get_kb_service)
+) -> Dict[str, Any]:
+    """Bulk-load M21-1 / 38 CFR exports from KB_INGEST_DIR"""
+
+    files = request.get("files") or []
+    source = request.get("source")
+    if not files or not source:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="files and source are required"
+        )
+
+    if _ingest_lock.locked():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="An ingestion run is already in progress"
+        )
+
+    paths = [_resolve_ingest_path(name) for name in files]
+
+    pipeline = IngestionPipeline(kb_service)
+
+    logger.info("Starting knowledge ingestion", user_id=current_user["user_id"], source=source, files=len(paths))
+    async with _ingest_lock:
+        try:
+            return await pipeline.run(
+                paths,
+                source=source,
+                category=request.get("category", "regulation")
+            )
+        except FileNotFoundError as e:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+@router.get("/facets")
+async def get_facets(
+    q: Optional[str] = None,
+    categories: Optional[str] = None,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    kb_service: KnowledgeBaseService = Depends(get_kb_service)
+) -> Dict[str, Any]:
+    """Document counts per source and category, optionally for a query"""
+
+    category_list: Optional[List[str]] = (
+        [c.strip() for c in categories.split(",") if c.strip()] if categories else None
+    )
+    facets = await kb_service.get_facets(q, category_list)
+
+    return {
+        "query": q,
+        "facets": facets
+    }
+
+@router.get("/suggest")
+async def suggest_terms(
+    q: str = "",
+    limit: int = 8,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    kb_service: KnowledgeBaseService = Depends(get_kb_service)
+) -> Dict[str, Any]:
+    """Typeahead completions for the search box"""
+
+    return await kb_service.suggest(q[:200], limit=max(1, min(limit, 20)))
+
+@router.get("/stats")
+async def get_knowledge_stats(
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    kb_service: KnowledgeBaseService = Depends(get_kb_service)
+) -> Dict[str, Any]:
+    """Get knowledge base statistics"""
+
+    return kb_service.get_stats()
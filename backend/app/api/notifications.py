@@ -9,7 +9,8 @@ import uuid
 import structlog
 
 from app.core.security import rate_limiter
-from app.api.chat import get_current_user
+from app.api.chat import get_current_user, get_qbit
+from app.services.qbit_chatbot import QBitChatbot, MessageType
 
 logger = structlog.get_logger()
 router = APIRouter()
@@ -120,7 +121,8 @@ notification_service = NotificationService()
 async def create_notification(
     notification: Dict[str, Any],
     background_tasks: BackgroundTasks,
-    current_user: Dict[str, Any] = Depends(get_current_user)
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    qbit: QBitChatbot = Depends(get_qbit)
 ) -> Dict[str, Any]:
     """Create a new notification"""
     
@@ -156,7 +158,8 @@ async def create_notification(
         background_tasks.add_task(
             process_notification_with_qbit,
             notification=result,
-            user_id=current_user["user_id"]
+            user_id=current_user["user_id"],
+            qbit=qbit
         )
     
     return result
@@ -302,18 +305,11 @@ async def update_notification_preferences(
 
 async def process_notification_with_qbit(
     notification: Dict[str, Any],
-    user_id: str
+    user_id: str,
+    qbit: QBitChatbot
 ):
     """Process notification with QBit for intelligent handling"""
     
-    from app.main import app
-    from app.services.qbit_chatbot import QBitChatbot, MessageType
-    
-    qbit = QBitChatbot(
-        kb_service=app.state.kb_service,
-        orchestrator=app.state.agent_orchestrator
-    )
-    
     # Generate intelligent notification summary
     summary = await qbit.process_message(
         user_id=user_id,
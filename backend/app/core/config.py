@@ -2,7 +2,7 @@
 Application configuration with security best practices
 """
 
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings
 from pydantic import Field, validator
 import secrets
@@ -55,6 +55,17 @@ class Settings(BaseSettings):
     WS_HEARTBEAT_INTERVAL: int = 30
     WS_CONNECTION_TIMEOUT: int = 60
     
+    # QBit conversations (shared, in-process)
+    CHAT_MAX_CONVERSATIONS: int = 10000
+    CHAT_MAX_TURNS_PER_CONVERSATION: int = 20
+    CHAT_CONVERSATION_IDLE_SECONDS: int = 3600
+    CHAT_RESPONSE_CACHE_SIZE: int = 2048
+    CHAT_RESPONSE_CACHE_TTL_SECONDS: int = 600
+    CHAT_LOG_PATH: Optional[str] = Field(
+        default="data/chat_log.sqlite3",
+        description="SQLite file for the persistent chat history log (None disables)"
+    )
+    
     # Rate Limiting
     RATE_LIMIT_PER_MINUTE: int = 60
     RATE_LIMIT_PER_HOUR: int = 1000
@@ -73,11 +84,59 @@ class Settings(BaseSettings):
     KB_CHUNK_SIZE: int = 1000
     KB_CHUNK_OVERLAP: int = 200
     KB_TOP_K_RESULTS: int = 5
+    # Keyword (BM25) ranking by default; "hybrid" blends in embedding similarity and is opt-in
+    KB_SEARCH_MODE: str = Field(default="keyword", pattern="^(keyword|vector|hybrid)$")
+    KB_EMBEDDER: str = "hashing"
+    KB_LOCAL_EMBEDDING_DIMENSION: int = 384
+    KB_VECTOR_NPROBE: int = 8
+    KB_VECTOR_MIN_SCORE: float = 0.1
+    KB_HYBRID_KEYWORD_WEIGHT: float = 0.7
+    KB_FUZZY_MAX_EDITS: int = 2
+    KB_QUERY_CACHE_SIZE: int = 1024
+    KB_QUERY_CACHE_TTL_SECONDS: int = 300
+    KB_SNAPSHOT_DIR: Optional[str] = Field(
+        default="data/kb_index",
+        description="Directory for memory-mapped index snapshots (None disables)"
+    )
+    KB_INGEST_DIR: str = Field(
+        default="data/regulations",
+        description="Directory the ingestion API may read source exports from"
+    )
+    KB_INGEST_WORKERS: int = 4
+    KB_INGEST_BATCH_SIZE: int = 256
+    KB_INGEST_MAX_PENDING_BATCHES: int = 8
     
     # Agent Configuration
     MAX_AGENT_ITERATIONS: int = 10
     AGENT_TIMEOUT_SECONDS: int = 30
     AGENT_MEMORY_SIZE: int = 100
+    AGENT_POOL_SIZE: int = 4
+    AGENT_POOL_SIZES: Dict[str, int] = Field(
+        default_factory=dict,
+        description="Per-role pool size overrides, e.g. {\"claims_processor\": 8}"
+    )
+    AGENT_QUEUE_LIMIT: int = 32
+    AGENT_QUEUE_TIMEOUT_SECONDS: float = 5.0
+    AGENT_PRIORITY_AGING_SECONDS: float = 2.0
+    AGENT_REQUEST_LOG_SIZE: int = 10000
+    AGENT_REQUEST_LOG_PATH: Optional[str] = Field(
+        default="data/agent_requests.jsonl",
+        description="Append-only JSONL export of the agent request log (None disables)"
+    )
+    AGENT_REQUEST_LOG_FLUSH_SECONDS: float = 5.0
+    AGENT_CLAIMS_BATCH_MAX_CLAIMS: int = 50000
+    AGENT_CLAIMS_BATCH_CHUNK_SIZE: int = 1000
+    AGENT_RESULT_CACHE_ROLES: List[str] = Field(
+        default_factory=lambda: ["claims_processor", "quality_auditor"],
+        description="Roles whose results are cached by task content and data version"
+    )
+    AGENT_RESULT_CACHE_SIZE: int = 1024
+    AGENT_RESULT_CACHE_TTL_SECONDS: int = 300
+    AGENT_EXECUTION_BACKENDS: Dict[str, str] = Field(
+        default_factory=lambda: {"leiden_analyzer": "process"},
+        description="Per-role execution backend: \"inline\" (event loop, default) or \"process\""
+    )
+    AGENT_PROCESS_WORKERS: int = 2
     
     # Security Headers
     CONTENT_SECURITY_POLICY: str = "default-src 'self'; script-src 'self' 'unsafe-inline'; style-src 'self' 'unsafe-inline';"
@@ -14,12 +14,16 @@ from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
+from app.core.cache import TTLCache
 from app.core.config import settings
 from app.core.security import SecurityMiddleware
-from app.api import chat, agents, auth, navigation, notifications
+from app.api import chat, agents, auth, knowledge, navigation, notifications
 from app.websocket.manager import WebSocketManager
 from app.services.knowledge_base import KnowledgeBaseService
 from app.services.agent_orchestrator import AgentOrchestrator
+from app.services.chat_log import ChatLog
+from app.services.conversation_store import ConversationStore
+from app.services.qbit_chatbot import QBitChatbot
 
 # Configure structured logging
 structlog.configure(
@@ -53,7 +57,7 @@ async def lifespan(app: FastAPI):
     # Initialize services
     app.state.ws_manager = WebSocketManager()
     app.state.kb_service = KnowledgeBaseService()
-    app.state.agent_orchestrator = AgentOrchestrator()
+    app.state.agent_orchestrator = AgentOrchestrator(kb_service=app.state.kb_service)
     
     # Load knowledge base
     await app.state.kb_service.initialize()
@@ -63,12 +67,33 @@ async def lifespan(app: FastAPI):
     await app.state.agent_orchestrator.initialize()
     logger.info("Agent orchestrator initialized")
     
+    # Persistent chat history
+    app.state.chat_log = ChatLog(settings.CHAT_LOG_PATH) if settings.CHAT_LOG_PATH else None
+    
+    # One chatbot for the process, sharing a bounded conversation store
+    app.state.qbit = QBitChatbot(
+        kb_service=app.state.kb_service,
+        orchestrator=app.state.agent_orchestrator,
+        conversations=ConversationStore(
+            max_sessions=settings.CHAT_MAX_CONVERSATIONS,
+            max_turns=settings.CHAT_MAX_TURNS_PER_CONVERSATION,
+            idle_seconds=settings.CHAT_CONVERSATION_IDLE_SECONDS
+        ),
+        chat_log=app.state.chat_log,
+        response_cache=TTLCache(
+            max_size=settings.CHAT_RESPONSE_CACHE_SIZE,
+            ttl_seconds=settings.CHAT_RESPONSE_CACHE_TTL_SECONDS
+        )
+    )
+    
     yield
     
     # Shutdown
     logger.info("Shutting down NOVA QBit Backend")
     await app.state.ws_manager.disconnect_all()
     await app.state.agent_orchestrator.shutdown()
+    if app.state.chat_log:
+        app.state.chat_log.close()
 
 # Create FastAPI app
 app = FastAPI(
@@ -148,6 +173,7 @@ app.include_router(chat.router, prefix="/api/chat", tags=["Chat"])
 app.include_router(agents.router, prefix="/api/agents", tags=["Agents"])
 app.include_router(navigation.router, prefix="/api/navigation", tags=["Navigation"])
 app.include_router(notifications.router, prefix="/api/notifications", tags=["Notifications"])
+app.include_router(knowledge.router, prefix="/api/knowledge", tags=["Knowledge Base"])
 
 if __name__ == "__main__":
     import uvicorn
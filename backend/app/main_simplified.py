@@ -15,6 +15,11 @@ import jwt
 import hashlib
 import structlog
 
+from app.core.cache import TTLCache
+from app.services.conversation_store import ConversationStore
+from app.services.graph_clustering import analyze_patterns
+from app.services.intent_matcher import IntentMatcher
+
 # Configure structured logging
 structlog.configure(
     processors=[
@@ -35,13 +40,29 @@ structlog.configure(
 
 logger = structlog.get_logger()
 
+# Conversation memory bounds (recent turns per session; older turns are compacted)
+CHAT_MAX_SESSIONS = 10000
+CHAT_MAX_TURNS_PER_SESSION = 20
+CHAT_SESSION_IDLE_SECONDS = 3600
+CHAT_MAX_CONTENT_CHARS = 2000
+
+# Memoized responses for handlers that depend only on the message and knowledge base
+RESPONSE_CACHE_SIZE = 2048
+RESPONSE_CACHE_TTL_SECONDS = 600
+MEMOIZED_INTENTS = {"service_connection", "disability_rating", "navigation"}
+
 # In-memory storage (replaces Redis/PostgreSQL)
 class InMemoryStorage:
     def __init__(self):
         self.users = {}
         self.sessions = {}
         self.notifications = {}
-        self.chat_history = {}
+        self.chat_history = ConversationStore(
+            max_sessions=CHAT_MAX_SESSIONS,
+            max_turns=CHAT_MAX_TURNS_PER_SESSION,
+            idle_seconds=CHAT_SESSION_IDLE_SECONDS,
+            max_content_chars=CHAT_MAX_CONTENT_CHARS
+        )
         self.knowledge_base = self._init_knowledge_base()
     
     def _init_knowledge_base(self):
@@ -134,20 +155,52 @@ def verify_token(token: str):
     except jwt.PyJWTError:
         return None
 
+# Intent keywords, highest precedence first: (intent, weight, patterns)
+INTENT_PATTERNS = (
+    ("service_connection", 0.9, ["service connection", "connected", "nexus"]),
+    ("disability_rating", 0.85, ["rating", "percentage", "evaluation"]),
+    ("navigation", 0.8, ["navigate", "go to", "show me", "where"]),
+    ("notification", 0.75, ["notification", "alert", "update"])
+)
+
+NAVIGATION_PAGES = {
+    "dashboard": "/dashboard",
+    "claims": "/claims",
+    "appeals": "/appeals",
+    "metrics": "/metrics",
+    "quality": "/quality",
+    "notifications": "/notifications",
+    "profile": "/profile"
+}
+
+# Compiled once so each message is scanned in a single pass
+intent_matcher = IntentMatcher(INTENT_PATTERNS)
+navigation_matcher = IntentMatcher([(page, 1.0, [page]) for page in NAVIGATION_PAGES])
+
 # QBit Chatbot service
 class QBitService:
-    def __init__(self, knowledge_base):
+    def __init__(self, knowledge_base, context_memory: ConversationStore):
         self.knowledge_base = knowledge_base
-        self.context_memory = {}
+        self.context_memory = context_memory
+        # knowledge_base is static for the life of the process, so entries only expire by TTL
+        self.response_cache = TTLCache(max_size=RESPONSE_CACHE_SIZE, ttl_seconds=RESPONSE_CACHE_TTL_SECONDS)
     
-    async def process_message(self, user_id: str, message: str, context: dict = None):
+    async def process_message(self, user_id: str, message: str, context: dict = None, session_id: str = "default"):
         """Process user message and generate response"""
         
         # Simple intent detection
         intent = self._detect_intent(message.lower())
         
-        # Generate response based on intent
-        if intent == "service_connection":
+        # Generate response based on intent (deterministic handlers are memoized)
+        memo_key = None
+        if intent in MEMOIZED_INTENTS:
+            normalized = " ".join(message.lower().split()).rstrip("?!.")
+            memo_key = (intent, normalized)
+        cached = self.response_cache.get(memo_key) if memo_key else None
+        
+        if cached is not None:
+            response = dict(cached)
+        elif intent == "service_connection":
             response = await self._handle_service_connection(message)
         elif intent == "disability_rating":
             response = await self._handle_disability_rating(message)
@@ -158,28 +211,23 @@ class QBitService:
         else:
             response = await self._handle_general(message)
         
-        # Store context for future reference
-        if user_id not in self.context_memory:
-            self.context_memory[user_id] = []
-        self.context_memory[user_id].append({
-            "message": message,
-            "response": response,
-            "timestamp": datetime.utcnow().isoformat()
-        })
+        if memo_key and cached is None:
+            self.response_cache.set(memo_key, dict(response))
+        
+        # Store context for future reference (text and citations only, not the full response)
+        self.context_memory.append(user_id, session_id, "user", message, intent=intent)
+        self.context_memory.append(
+            user_id, session_id, "assistant", response.get("content", ""),
+            type=response.get("type"),
+            citations=response.get("citations", [])
+        )
         
         return response
     
     def _detect_intent(self, message):
-        """Simple keyword-based intent detection"""
-        if any(word in message for word in ["service connection", "connected", "nexus"]):
-            return "service_connection"
-        elif any(word in message for word in ["rating", "percentage", "evaluation"]):
-            return "disability_rating"
-        elif any(word in message for word in ["navigate", "go to", "show me", "where"]):
-            return "navigation"
-        elif any(word in message for word in ["notification", "alert", "update"]):
-            return "notification"
-        return "general"
+        """Keyword-based intent detection"""
+        match = intent_matcher.best(message)
+        return match["intent"] if match else "general"
     
     async def _handle_service_connection(self, message):
         """Handle service connection queries"""
@@ -215,32 +263,23 @@ class QBitService:
     async def _handle_navigation(self, message):
         """Handle navigation requests"""
         # Extract potential page/feature from message
-        pages = {
-            "dashboard": "/dashboard",
-            "claims": "/claims",
-            "appeals": "/appeals",
-            "metrics": "/metrics",
-            "quality": "/quality",
-            "notifications": "/notifications",
-            "profile": "/profile"
-        }
-        
-        for page, path in pages.items():
-            if page in message.lower():
-                return {
-                    "type": "navigation",
-                    "content": f"I'll help you navigate to the {page} section.",
-                    "action": {
-                        "type": "navigate",
-                        "path": path
-                    },
-                    "instructions": f"Click here to go to {page}, or use the navigation menu on the left."
-                }
+        match = navigation_matcher.best(message)
+        if match:
+            page = match["intent"]
+            return {
+                "type": "navigation",
+                "content": f"I'll help you navigate to the {page} section.",
+                "action": {
+                    "type": "navigate",
+                    "path": NAVIGATION_PAGES[page]
+                },
+                "instructions": f"Click here to go to {page}, or use the navigation menu on the left."
+            }
         
         return {
             "type": "navigation",
             "content": "I can help you navigate the NOVA platform. Which section would you like to visit?",
-            "options": list(pages.keys())
+            "options": list(NAVIGATION_PAGES.keys())
         }
     
     async def _handle_notification(self, message):
@@ -287,13 +326,25 @@ class AgentOrchestrator:
         agent_name = agent_mapping.get(task_type, "claims_processor")
         agent = self.agents.get(agent_name)
         
-        # Simulate agent processing
+        if agent_name == "leiden_analyzer":
+            # Claim records (or feature vectors) in data["records"]
+            records = data.get("records") or data.get("claims") or []
+            output = await asyncio.to_thread(
+                analyze_patterns,
+                records,
+                k=data.get("k", 15),
+                resolution=data.get("resolution", 1.0)
+            )
+        else:
+            # Simulate agent processing
+            output = f"Task processed by {agent_name}"
+        
         result = {
             "agent": agent_name,
             "role": agent["role"],
             "task_type": task_type,
             "status": "completed",
-            "result": f"Task processed by {agent_name}",
+            "result": output,
             "timestamp": datetime.utcnow().isoformat()
         }
         
@@ -301,7 +352,7 @@ class AgentOrchestrator:
         return result
 
 # Initialize services
-qbit_service = QBitService(storage.knowledge_base)
+qbit_service = QBitService(storage.knowledge_base, storage.chat_history)
 orchestrator = AgentOrchestrator()
 
 # Lifespan manager
@@ -386,18 +437,11 @@ async def send_message(message: dict):
     content = message.get("content", "")
     context = message.get("context", {})
     
-    response = await qbit_service.process_message(user_id, content, context)
-    
-    # Store in chat history
-    if user_id not in storage.chat_history:
-        storage.chat_history[user_id] = []
-    
-    storage.chat_history[user_id].append({
-        "id": str(uuid.uuid4()),
-        "user_message": content,
-        "bot_response": response,
-        "timestamp": datetime.utcnow().isoformat()
-    })
+    # QBit records the exchange in the (bounded) chat history
+    response = await qbit_service.process_message(
+        user_id, content, context,
+        session_id=message.get("session_id", "default")
+    )
     
     return response
 
@@ -425,7 +469,8 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str, token: str =
             response = await qbit_service.process_message(
                 user_id,
                 message.get("content", ""),
-                message.get("context", {})
+                message.get("context", {}),
+                session_id=session_id
             )
             
             # Send response
@@ -571,6 +616,8 @@ async def get_stats():
         "active_connections": len(manager.active_connections),
         "total_notifications": sum(len(notifs) for notifs in storage.notifications.values()),
         "chat_sessions": len(storage.chat_history),
+        "chat_memory": storage.chat_history.get_stats(),
+        "response_cache": qbit_service.response_cache.get_stats(),
         "timestamp": datetime.utcnow().isoformat()
     }
 
@@ -4,14 +4,24 @@ Manages specialized agents with scoped permissions
 """
 
 import asyncio
-from typing import Dict, Any, List, Optional, Set
+from typing import AsyncIterator, Dict, Any, List, Optional, Set, Union
 from enum import Enum
+import copy
 import uuid
 import time
 import structlog
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import hashlib
 import json
+import numpy as np
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.services.agent_pool import AgentOverloaded, AgentPool, TaskPriority
+from app.services.agent_workers import AgentWorkerError, WorkerPool
+from app.services.graph_clustering import analyze_patterns
+from app.services.knowledge_base import KnowledgeBaseService
+from app.services.request_log import RequestLog
 
 logger = structlog.get_logger()
 
@@ -25,6 +35,15 @@ class AgentRole(Enum):
     GENERAL_ASSISTANT = "general_assistant"
     LEIDEN_ANALYZER = "leiden_analyzer"
 
+# Task fields that differ between otherwise identical requests
+VOLATILE_TASK_FIELDS = {"timestamp", "request_id"}
+
+# Scheduling class used when a caller doesn't specify one
+DEFAULT_ROLE_PRIORITY = {
+    AgentRole.DOCUMENT_ANALYZER: TaskPriority.BATCH,
+    AgentRole.LEIDEN_ANALYZER: TaskPriority.BATCH
+}
+
 @dataclass
 class AgentPermissions:
     """Defines agent permissions and access scope"""
@@ -35,6 +54,26 @@ class AgentPermissions:
     max_iterations: int = 10
     timeout_seconds: int = 30
 
+@dataclass
+class TaskNode:
+    """One step of a coordinated task
+    
+    inputs name outputs of other nodes that must finish first; their
+    values are passed to this node's agent as task["inputs"]. outputs
+    defaults to [node_id]; each name takes the matching field of the
+    agent's result, or the whole result when there is no such field.
+    """
+    node_id: str
+    agent_type: str
+    task: Dict[str, Any] = field(default_factory=dict)
+    inputs: List[str] = field(default_factory=list)
+    outputs: List[str] = field(default_factory=list)
+    priority: Optional[TaskPriority] = None
+
+    def __post_init__(self):
+        if not self.outputs:
+            self.outputs = [self.node_id]
+
 class Agent:
     """Base agent with security and scoping"""
     
@@ -68,8 +107,12 @@ class Agent:
             return resource in self.permissions.can_execute
         return False
     
-    async def process(self, task: Dict[str, Any]) -> Dict[str, Any]:
-        """Process task with security checks"""
+    async def process(self, task: Dict[str, Any], workers: Optional[WorkerPool] = None) -> Dict[str, Any]:
+        """Process task with security checks
+        
+        With workers, the task runs in a worker process instead of on the
+        event loop; the task must then be picklable.
+        """
         self.request_count += 1
         self.last_activity = time.time()
         
@@ -82,7 +125,10 @@ class Agent:
             }
         
         # Process based on role
-        result = await self._execute_task(task)
+        if workers is not None:
+            result = await workers.run(run_agent_task, type(self), self.agent_id, self.role, self.permissions, task)
+        else:
+            result = await self._execute_task(task)
         
         return {
             "agent_id": self.agent_id,
@@ -110,20 +156,49 @@ class Agent:
         await asyncio.sleep(0.1)  # Simulate processing
         return {"status": "completed"}
 
+# Worker-process copies of agents, built on first use
+_worker_agents: Dict[tuple, Agent] = {}
+
+def run_agent_task(
+    agent_class: type,
+    agent_id: str,
+    role: AgentRole,
+    permissions: AgentPermissions,
+    task: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Execute an agent task inside a worker process"""
+    key = (agent_class, agent_id)
+    agent = _worker_agents.get(key)
+    if agent is None:
+        agent = _worker_agents[key] = agent_class(agent_id=agent_id, role=role, permissions=permissions)
+    return asyncio.run(agent._execute_task(task))
+
 class ClaimsProcessorAgent(Agent):
     """Specialized agent for claims processing"""
     
+    # Evidence a claim needs before it is complete
+    REQUIRED_EVIDENCE = ("STR", "current_diagnosis", "nexus")
+    SEVERITY_RATINGS = {
+        "mild": 10,
+        "moderate": 30,
+        "severe": 50,
+        "total": 100
+    }
+    EVIDENCE_STATUSES = ("complete", "partial", "insufficient")
+    
     async def _execute_task(self, task: Dict[str, Any]) -> Dict[str, Any]:
         """Process claims-related tasks"""
         query = task.get("query", "")
         kb_results = task.get("kb_results", {})
         
         # Analyze claim requirements
+        exam_required = self._determine_exam_necessity(task)
+        evidence_status = self._check_evidence_completeness(task)
         analysis = {
-            "exam_required": self._determine_exam_necessity(task),
-            "evidence_status": self._check_evidence_completeness(task),
+            "exam_required": exam_required,
+            "evidence_status": evidence_status,
             "rating_recommendation": self._calculate_rating(task),
-            "next_steps": self._determine_next_steps(task)
+            "next_steps": self._determine_next_steps(exam_required, evidence_status)
         }
         
         response = self._generate_claims_response(analysis, kb_results)
@@ -148,36 +223,22 @@ class ClaimsProcessorAgent(Agent):
     def _check_evidence_completeness(self, task: Dict[str, Any]) -> str:
         """Check if evidence is complete"""
         evidence_types = task.get("evidence_types", [])
-        required = ["STR", "current_diagnosis", "nexus"]
-        missing = [req for req in required if req not in evidence_types]
-        
-        if not missing:
-            return "complete"
-        elif len(missing) == 1:
-            return "partial"
-        else:
-            return "insufficient"
+        missing = [req for req in self.REQUIRED_EVIDENCE if req not in evidence_types]
+        return self.EVIDENCE_STATUSES[min(len(missing), 2)]
     
     def _calculate_rating(self, task: Dict[str, Any]) -> int:
         """Calculate disability rating"""
         # Simplified - would use actual rating criteria
         severity = task.get("severity", "moderate")
-        ratings = {
-            "mild": 10,
-            "moderate": 30,
-            "severe": 50,
-            "total": 100
-        }
-        return ratings.get(severity, 0)
+        return self.SEVERITY_RATINGS.get(severity, 0)
     
-    def _determine_next_steps(self, task: Dict[str, Any]) -> List[str]:
+    def _determine_next_steps(self, exam_required: bool, evidence_status: str) -> List[str]:
         """Determine next steps in claims process"""
         steps = []
         
-        if self._determine_exam_necessity(task):
+        if exam_required:
             steps.append("Schedule C&P examination")
         
-        evidence_status = self._check_evidence_completeness(task)
         if evidence_status != "complete":
             steps.append("Gather additional evidence")
         
@@ -185,6 +246,96 @@ class ClaimsProcessorAgent(Agent):
         
         return steps
     
+    @staticmethod
+    def _claim_error(claim: Any) -> Optional[str]:
+        """Why a batch claim can't be triaged, or None if it can"""
+        if not isinstance(claim, dict):
+            return "claim must be an object"
+        evidence = claim.get("evidence")
+        if evidence is not None and not isinstance(evidence, dict):
+            return "evidence must be an object"
+        evidence_types = claim.get("evidence_types")
+        if evidence_types is not None and (
+            not isinstance(evidence_types, (list, tuple))
+            or not all(isinstance(item, str) for item in evidence_types)
+        ):
+            return "evidence_types must be a list of strings"
+        severity = claim.get("severity")
+        if severity is not None and not isinstance(severity, str):
+            return "severity must be a string"
+        return None
+    
+    def analyze_claims(self, claims: List[Any]) -> List[Dict[str, Any]]:
+        """Triage many claims at once
+        
+        Same rules as _execute_task's analysis. Claims are encoded into
+        batch arrays (evidence flags, sufficiency, rating), and exam
+        necessity, evidence status, missing evidence and next steps are
+        all computed over those arrays; the per-claim work left is
+        reading the fields and building the output dicts. A malformed
+        claim gets an {"error": ...} result instead of failing the batch.
+        """
+        errors = [self._claim_error(claim) for claim in claims]
+        valid = [claim for claim, error in zip(claims, errors) if error is None]
+        count = len(valid)
+        required_count = len(self.REQUIRED_EVIDENCE)
+        
+        # Encode
+        evidence_types = [set(claim.get("evidence_types") or ()) for claim in valid]
+        present = np.zeros((count, required_count), dtype=bool)
+        for column, required in enumerate(self.REQUIRED_EVIDENCE):
+            present[:, column] = np.fromiter((required in types for types in evidence_types), dtype=bool, count=count)
+        sufficient = np.fromiter(
+            (bool((claim.get("evidence") or {}).get("sufficient", False)) for claim in valid),
+            dtype=bool,
+            count=count
+        )
+        ratings = np.fromiter(
+            (self.SEVERITY_RATINGS.get(claim.get("severity", "moderate"), 0) for claim in valid),
+            dtype=np.int16,
+            count=count
+        )
+        
+        # Score over the batch
+        exam_required = ~sufficient
+        evidence_masks = present.astype(np.int64) @ (1 << np.arange(required_count))
+        status_codes = np.minimum(required_count - present.sum(axis=1), len(self.EVIDENCE_STATUSES) - 1)
+        step_codes = exam_required * len(self.EVIDENCE_STATUSES) + status_codes
+        
+        # Every output list comes from a small table indexed by those codes
+        missing_table = [
+            [required for bit, required in enumerate(self.REQUIRED_EVIDENCE) if not mask & (1 << bit)]
+            for mask in range(1 << required_count)
+        ]
+        step_table = [
+            self._determine_next_steps(exam, status)
+            for exam in (False, True) for status in self.EVIDENCE_STATUSES
+        ]
+        scored = iter(zip(
+            exam_required.tolist(),
+            status_codes.tolist(),
+            evidence_masks.tolist(),
+            step_codes.tolist(),
+            ratings.tolist()
+        ))
+        
+        results = []
+        for claim, error in zip(claims, errors):
+            claim_id = claim.get("claim_id", claim.get("id")) if isinstance(claim, dict) else None
+            if error is not None:
+                results.append({"claim_id": claim_id, "error": error})
+                continue
+            exam, status, mask, steps, rating = next(scored)
+            results.append({
+                "claim_id": claim_id,
+                "exam_required": exam,
+                "evidence_status": self.EVIDENCE_STATUSES[status],
+                "missing_evidence": list(missing_table[mask]),
+                "rating_recommendation": rating,
+                "next_steps": list(step_table[steps])
+            })
+        return results
+    
     def _generate_claims_response(self, analysis: Dict[str, Any], kb_results: Dict[str, Any]) -> str:
         """Generate response for claims query"""
         response = "Based on my analysis:\n\n"
@@ -213,48 +364,36 @@ class LeidenAnalyzerAgent(Agent):
     """Agent for Leiden clustering analysis"""
     
     async def _execute_task(self, task: Dict[str, Any]) -> Dict[str, Any]:
-        """Perform Leiden clustering analysis"""
+        """Perform Leiden clustering analysis
+        
+        task["data"] is a list of claim records (dicts) or feature vectors;
+        optional task["k"] and task["resolution"] tune the kNN graph and
+        community granularity.
+        """
         data = task.get("data", [])
         
-        # Perform clustering (simplified)
-        clusters = self._perform_leiden_clustering(data)
-        patterns = self._identify_patterns(clusters)
-        anomalies = self._detect_anomalies(data, clusters)
+        # CPU-bound; keep the event loop free
+        analysis = await asyncio.to_thread(
+            analyze_patterns,
+            data,
+            k=task.get("k", 15),
+            resolution=task.get("resolution", 1.0)
+        )
         
         return {
-            "clusters": clusters,
-            "patterns": patterns,
-            "anomalies": anomalies,
-            "insights": self._generate_insights(patterns, anomalies)
+            "clusters": analysis["clusters"],
+            "patterns": analysis["patterns"],
+            "anomalies": analysis["anomalies"],
+            "insights": self._generate_insights(analysis["patterns"], analysis["anomalies"]),
+            "timings_ms": analysis["timings_ms"]
         }
     
-    def _perform_leiden_clustering(self, data: List[Any]) -> Dict[str, Any]:
-        """Perform Leiden clustering algorithm"""
-        # Simplified clustering logic
-        return {
-            "num_clusters": 5,
-            "cluster_sizes": [20, 15, 30, 25, 10],
-            "modularity": 0.75
-        }
-    
-    def _identify_patterns(self, clusters: Dict[str, Any]) -> List[str]:
-        """Identify patterns in clusters"""
-        return [
-            "High correlation between PTSD and sleep disorders",
-            "Musculoskeletal conditions cluster with age 45+",
-            "Mental health claims show seasonal patterns"
-        ]
-    
-    def _detect_anomalies(self, data: List[Any], clusters: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Detect anomalies in data"""
-        return [
-            {"type": "outlier", "severity": "low", "description": "Unusual claim pattern detected"},
-            {"type": "fraud_risk", "severity": "medium", "description": "Potential duplicate claim"}
-        ]
-    
     def _generate_insights(self, patterns: List[str], anomalies: List[Dict[str, Any]]) -> str:
         """Generate insights from analysis"""
-        insights = "Leiden clustering analysis reveals:\n"
+        if not patterns and not anomalies:
+            return "Clustering analysis found no distinct patterns."
+        
+        insights = "Clustering analysis reveals:\n"
         
         for pattern in patterns[:3]:
             insights += f"• {pattern}\n"
@@ -267,10 +406,52 @@ class LeidenAnalyzerAgent(Agent):
 class AgentOrchestrator:
     """Orchestrates multiple agents with security and coordination"""
     
-    def __init__(self):
-        self.agents: Dict[str, Agent] = {}
+    def __init__(
+        self,
+        pool_size: Optional[int] = None,
+        pool_sizes: Optional[Dict[str, int]] = None,
+        queue_limit: Optional[int] = None,
+        queue_timeout_seconds: Optional[float] = None,
+        aging_seconds: Optional[float] = None,
+        request_log: Optional[RequestLog] = None,
+        cached_roles: Optional[List[str]] = None,
+        execution_backends: Optional[Dict[str, str]] = None,
+        process_workers: Optional[int] = None,
+        kb_service: Optional[KnowledgeBaseService] = None
+    ):
+        # Role -> pool of agent instances
+        self.agents: Dict[str, AgentPool] = {}
+        self.pool_size = pool_size if pool_size is not None else settings.AGENT_POOL_SIZE
+        self.pool_sizes = pool_sizes if pool_sizes is not None else settings.AGENT_POOL_SIZES
+        self.queue_limit = queue_limit if queue_limit is not None else settings.AGENT_QUEUE_LIMIT
+        self.queue_timeout_seconds = (
+            queue_timeout_seconds if queue_timeout_seconds is not None else settings.AGENT_QUEUE_TIMEOUT_SECONDS
+        )
+        self.aging_seconds = aging_seconds if aging_seconds is not None else settings.AGENT_PRIORITY_AGING_SECONDS
         self.agent_permissions = self._initialize_permissions()
-        self.request_log = []
+        # Opted-in role -> results keyed by (task digest, data version)
+        self.result_caches: Dict[str, TTLCache] = {
+            role: TTLCache(
+                max_size=settings.AGENT_RESULT_CACHE_SIZE,
+                ttl_seconds=settings.AGENT_RESULT_CACHE_TTL_SECONDS
+            )
+            for role in (cached_roles if cached_roles is not None else settings.AGENT_RESULT_CACHE_ROLES)
+        }
+        self.data_versions: Dict[str, int] = {}
+        # Cached results also expire when the knowledge base content changes
+        self.kb_service = kb_service
+        # Roles listed as "process" run in worker processes; the rest in the event loop
+        self.execution_backends = (
+            execution_backends if execution_backends is not None else settings.AGENT_EXECUTION_BACKENDS
+        )
+        self.workers = WorkerPool(
+            size=process_workers if process_workers is not None else settings.AGENT_PROCESS_WORKERS
+        )
+        self.request_log = request_log or RequestLog(
+            capacity=settings.AGENT_REQUEST_LOG_SIZE,
+            export_path=settings.AGENT_REQUEST_LOG_PATH,
+            flush_interval_seconds=settings.AGENT_REQUEST_LOG_FLUSH_SECONDS
+        )
         
     def _initialize_permissions(self) -> Dict[AgentRole, AgentPermissions]:
         """Initialize agent permissions"""
@@ -320,108 +501,359 @@ class AgentOrchestrator:
         }
     
     async def initialize(self):
-        """Initialize all agents"""
-        # Create specialized agents
-        self.agents[AgentRole.CLAIMS_PROCESSOR.value] = ClaimsProcessorAgent(
-            agent_id=str(uuid.uuid4()),
-            role=AgentRole.CLAIMS_PROCESSOR,
-            permissions=self.agent_permissions[AgentRole.CLAIMS_PROCESSOR]
-        )
-        
-        self.agents[AgentRole.LEIDEN_ANALYZER.value] = LeidenAnalyzerAgent(
-            agent_id=str(uuid.uuid4()),
-            role=AgentRole.LEIDEN_ANALYZER,
-            permissions=self.agent_permissions[AgentRole.LEIDEN_ANALYZER]
-        )
+        """Initialize a pool of agents per role"""
+        # Specialized agents; other roles use the base Agent class for now
+        agent_classes = {
+            AgentRole.CLAIMS_PROCESSOR: ClaimsProcessorAgent,
+            AgentRole.LEIDEN_ANALYZER: LeidenAnalyzerAgent
+        }
         
-        # Create other agents (using base Agent class for now)
-        for role in [AgentRole.MEDICAL_REVIEWER, AgentRole.QUALITY_AUDITOR,
-                    AgentRole.DOCUMENT_ANALYZER, AgentRole.NOTIFICATION_MANAGER,
-                    AgentRole.GENERAL_ASSISTANT]:
-            self.agents[role.value] = Agent(
-                agent_id=str(uuid.uuid4()),
-                role=role,
-                permissions=self.agent_permissions[role]
+        for role in AgentRole:
+            agent_class = agent_classes.get(role, Agent)
+            size = max(1, self.pool_sizes.get(role.value, self.pool_size))
+            self.agents[role.value] = AgentPool(
+                role.value,
+                [
+                    agent_class(
+                        agent_id=str(uuid.uuid4()),
+                        role=role,
+                        permissions=self.agent_permissions[role]
+                    )
+                    for _ in range(size)
+                ],
+                max_queue=self.queue_limit,
+                queue_timeout_seconds=self.queue_timeout_seconds,
+                aging_seconds=self.aging_seconds
             )
         
-        logger.info(f"Initialized {len(self.agents)} agents")
+        self.request_log.start()
+        if "process" in self.execution_backends.values():
+            self.workers.start()
+        
+        logger.info(
+            f"Initialized {len(self.agents)} agent pools",
+            agents=sum(pool.size for pool in self.agents.values())
+        )
+    
+    def bump_data_version(self, agent_type: Optional[str] = None) -> None:
+        """Invalidate cached results for one role (or all) after its source data changed"""
+        for role in ([agent_type] if agent_type else list(self.result_caches)):
+            self.data_versions[role] = self.data_versions.get(role, 0) + 1
+            if role in self.result_caches:
+                self.result_caches[role].clear()
+    
+    @staticmethod
+    def _canonical_task(task: Dict[str, Any]) -> Dict[str, Any]:
+        """Task reduced to what determines its result
+        
+        Volatile fields are dropped and a knowledge base response is
+        replaced by the ids of the documents it matched: within one
+        index generation those fully determine its content.
+        """
+        canonical = {}
+        for key, value in task.items():
+            if key in VOLATILE_TASK_FIELDS:
+                continue
+            if key == "kb_results" and isinstance(value, dict):
+                value = [
+                    (result.get("source"), result.get("section"))
+                    for result in value.get("results", [])
+                ]
+            canonical[key] = value
+        return canonical
+    
+    def _data_version(self, agent_type: str) -> tuple:
+        """Manual bumps for the role plus the knowledge base index version and generation"""
+        kb_version = (
+            (self.kb_service.index_version, self.kb_service.search_index.generation)
+            if self.kb_service is not None else None
+        )
+        return (self.data_versions.get(agent_type, 0), kb_version)
+    
+    def _result_key(self, agent_type: str, task: Dict[str, Any]) -> Optional[tuple]:
+        """Cache key for a task's result, or None if the task can't be keyed"""
+        try:
+            canonical = json.dumps(self._canonical_task(task), sort_keys=True, default=str)
+        except (TypeError, ValueError):
+            return None
+        digest = hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+        return (agent_type, digest, self._data_version(agent_type))
     
     async def process_with_agent(
         self,
         agent_type: str,
         task: Dict[str, Any],
-        user_id: str
+        user_id: str,
+        priority: Optional[TaskPriority] = None
     ) -> Dict[str, Any]:
-        """Process task with specified agent"""
+        """Process task with specified agent
+        
+        priority picks the scheduling class when the role's pool is busy
+        (defaults: batch for bulk analysis roles, normal otherwise).
+        """
         
         if agent_type not in self.agents:
             return {"error": f"Agent type {agent_type} not found"}
         
-        agent = self.agents[agent_type]
+        pool = self.agents[agent_type]
+        if priority is None:
+            priority = DEFAULT_ROLE_PRIORITY.get(AgentRole(agent_type), TaskPriority.NORMAL)
         
         # Log request
-        self.request_log.append({
-            "timestamp": time.time(),
-            "user_id": user_id,
-            "agent_type": agent_type,
-            "task_hash": hashlib.sha256(json.dumps(task, sort_keys=True).encode()).hexdigest()[:8]
-        })
-        
-        # Process with timeout
+        self.request_log.record(user_id, agent_type, task, priority.value)
+        
+        # Repeat of a recent task on unchanged data: skip the agent entirely
+        cache = self.result_caches.get(agent_type)
+        cache_key = self._result_key(agent_type, task) if cache is not None else None
+        if cache_key is not None:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return copy.deepcopy(cached)
+        
+        # Wait for a free instance (or shed load), then process with timeout
         try:
-            result = await asyncio.wait_for(
-                agent.process(task),
-                timeout=agent.permissions.timeout_seconds
-            )
+            workers = self.workers if self.execution_backends.get(agent_type) == "process" else None
+            async with pool.acquire(user_id, priority) as agent:
+                # Timeouts and cancellation also stop out-of-process work
+                result = await asyncio.wait_for(
+                    agent.process(task, workers=workers),
+                    timeout=agent.permissions.timeout_seconds
+                )
+            if cache_key is not None and "error" not in result:
+                cache.set(cache_key, copy.deepcopy(result))
             return result
+        except AgentOverloaded as e:
+            logger.warning("Agent request rejected", agent_type=agent_type, priority=priority.value, reason=e.reason)
+            return {
+                "error": "Agent is overloaded, please retry shortly",
+                "error_code": "AGENT_OVERLOADED"
+            }
         except asyncio.TimeoutError:
             logger.error(f"Agent {agent_type} timed out")
-            return {"error": "Processing timeout"}
+            return {"error": "Processing timeout", "error_code": "AGENT_TIMEOUT"}
+        except AgentWorkerError as e:
+            logger.error("Agent worker failed", agent_type=agent_type, error=str(e))
+            return {"error": "Agent execution failed", "error_code": "AGENT_FAILED"}
+
+    def record_coalesced(
+        self,
+        agent_type: str,
+        task: Dict[str, Any],
+        user_id: str,
+        priority: Optional[TaskPriority] = None
+    ):
+        """Audit a request answered by another caller's in-flight agent run"""
+        if agent_type not in self.agents:
+            return
+        if priority is None:
+            priority = DEFAULT_ROLE_PRIORITY.get(AgentRole(agent_type), TaskPriority.NORMAL)
+        self.request_log.record(user_id, agent_type, task, priority.value)
+        self.agents[agent_type].note_coalesced(user_id)
+
+    def _plan_graph(self, nodes: List[TaskNode]) -> Dict[str, List[str]]:
+        """Validate a task graph and map each node to the nodes it waits on"""
+        producers: Dict[str, str] = {}
+        node_ids: Set[str] = set()
+        for node in nodes:
+            if node.node_id in node_ids:
+                raise ValueError(f"Duplicate task node {node.node_id}")
+            node_ids.add(node.node_id)
+            for output in node.outputs:
+                if output in producers:
+                    raise ValueError(f"Output {output} produced by both {producers[output]} and {node.node_id}")
+                producers[output] = node.node_id
+        
+        upstream: Dict[str, List[str]] = {}
+        for node in nodes:
+            missing = [name for name in node.inputs if name not in producers]
+            if missing:
+                raise ValueError(f"Task node {node.node_id} needs unknown inputs: {', '.join(missing)}")
+            upstream[node.node_id] = list(dict.fromkeys(producers[name] for name in node.inputs))
+        
+        # Kahn's algorithm; anything left unvisited sits on a cycle
+        pending = {node_id: len(deps) for node_id, deps in upstream.items()}
+        ready = [node_id for node_id, count in pending.items() if not count]
+        visited = 0
+        while ready:
+            node_id = ready.pop()
+            visited += 1
+            for other, deps in upstream.items():
+                if node_id in deps:
+                    pending[other] -= 1
+                    if not pending[other]:
+                        ready.append(other)
+        if visited < len(nodes):
+            cyclic = sorted(node_id for node_id, count in pending.items() if count)
+            raise ValueError(f"Task graph has a cycle through: {', '.join(cyclic)}")
+        return upstream
     
-    async def coordinate_agents(
+    async def _run_node(
         self,
+        node: TaskNode,
         task: Dict[str, Any],
-        required_agents: List[str],
         user_id: str
     ) -> Dict[str, Any]:
-        """Coordinate multiple agents for complex tasks"""
-        
-        results = {}
+        """Run one graph node, queue wait included, within its role's timeout"""
+        if node.agent_type not in self.agents:
+            return {"error": f"Agent type {node.agent_type} not found"}
         
-        # Run agents in parallel where possible
-        tasks = []
-        for agent_type in required_agents:
-            if agent_type in self.agents:
-                tasks.append(self.process_with_agent(agent_type, task, user_id))
+        timeout = self.agent_permissions[AgentRole(node.agent_type)].timeout_seconds
+        try:
+            return await asyncio.wait_for(
+                self.process_with_agent(node.agent_type, task, user_id, priority=node.priority),
+                timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            logger.error("Task node timed out", node_id=node.node_id, agent_type=node.agent_type, timeout=timeout)
+            return {"error": "Processing timeout", "error_code": "AGENT_TIMEOUT"}
+    
+    async def coordinate_agents(
+        self,
+        task: Dict[str, Any],
+        required_agents: List[Union[str, TaskNode]],
+        user_id: str
+    ) -> Dict[str, Any]:
+        """Coordinate multiple agents for complex tasks
+        
+        required_agents is a task graph: plain role names are independent
+        nodes given the shared task, and TaskNodes may declare inputs from
+        other nodes. Each node starts as soon as everything it needs has
+        finished, so the whole graph takes critical-path time. A node whose
+        upstream failed is skipped rather than run on missing inputs.
+        Raises ValueError for unknown inputs, duplicate outputs or cycles.
+        """
+        
+        nodes = [
+            entry if isinstance(entry, TaskNode) else TaskNode(node_id=entry, agent_type=entry)
+            for entry in required_agents
+        ]
+        upstream = self._plan_graph(nodes)
+        by_id = {node.node_id: node for node in nodes}
+        
+        results: Dict[str, Dict[str, Any]] = {}
+        values: Dict[str, Any] = {}
+        timings: Dict[str, Dict[str, float]] = {}
+        running: Dict[asyncio.Task, str] = {}
+        started = time.perf_counter()
+        
+        def failed(node_id: str) -> bool:
+            return "error" in results[node_id]
+        
+        def schedule_ready():
+            for node in nodes:
+                node_id = node.node_id
+                if node_id in results or node_id in running.values():
+                    continue
+                deps = upstream[node_id]
+                if not all(dep in results for dep in deps):
+                    continue
+                broken = [dep for dep in deps if failed(dep)]
+                if broken:
+                    results[node_id] = {
+                        "error": f"Skipped: upstream {', '.join(broken)} failed",
+                        "error_code": "UPSTREAM_FAILED"
+                    }
+                    continue
+                node_task = {**task, **node.task}
+                if node.inputs:
+                    node_task["inputs"] = {name: values[name] for name in node.inputs}
+                timings[node_id] = {"start_ms": (time.perf_counter() - started) * 1000.0}
+                running[asyncio.create_task(self._run_node(node, node_task, user_id))] = node_id
+        
+        # Skips can make further nodes decidable, so repeat until stable
+        def advance():
+            while True:
+                before = len(results) + len(running)
+                schedule_ready()
+                if len(results) + len(running) == before:
+                    return
         
-        if tasks:
-            agent_results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            for agent_type, result in zip(required_agents, agent_results):
-                if isinstance(result, Exception):
-                    results[agent_type] = {"error": str(result)}
-                else:
-                    results[agent_type] = result
+        try:
+            advance()
+            while running:
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for finished in done:
+                    node_id = running.pop(finished)
+                    try:
+                        result = finished.result()
+                    except Exception as e:
+                        logger.error("Task node failed", node_id=node_id, error=str(e))
+                        result = {"error": str(e)}
+                    results[node_id] = result
+                    timings[node_id]["end_ms"] = (time.perf_counter() - started) * 1000.0
+                    if "error" not in result:
+                        payload = result.get("result", result)
+                        for output in by_id[node_id].outputs:
+                            values[output] = (
+                                payload[output] if isinstance(payload, dict) and output in payload else payload
+                            )
+                advance()
+        finally:
+            for pending in running:
+                pending.cancel()
         
         return {
-            "coordinated_results": results,
+            "coordinated_results": {node.node_id: results[node.node_id] for node in nodes},
+            "timings": {
+                node_id: {key: round(value, 3) for key, value in timing.items()}
+                for node_id, timing in timings.items()
+            },
+            "elapsed_ms": round((time.perf_counter() - started) * 1000.0, 3),
             "timestamp": time.time()
         }
     
+    async def analyze_claims_batch(
+        self,
+        claims: List[Any],
+        user_id: str,
+        chunk_size: int = 1000
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Triage claims in chunks, yielding one result per claim
+        
+        Holds one claims processor instance (batch priority) for the whole
+        run and yields to the event loop between chunks. Raises
+        AgentOverloaded before the first result if the pool is saturated.
+        """
+        pool = self.agents[AgentRole.CLAIMS_PROCESSOR.value]
+        self.request_log.record(
+            user_id,
+            AgentRole.CLAIMS_PROCESSOR.value,
+            {"batch_claims": len(claims), "chunk_size": chunk_size},
+            TaskPriority.BATCH.value
+        )
+        
+        async with pool.acquire(user_id, TaskPriority.BATCH) as agent:
+            agent.request_count += 1
+            for start in range(0, len(claims), chunk_size):
+                agent.last_activity = time.time()
+                for offset, result in enumerate(agent.analyze_claims(claims[start:start + chunk_size])):
+                    result["index"] = start + offset
+                    yield result
+                await asyncio.sleep(0)
+    
     async def shutdown(self):
         """Shutdown all agents"""
         logger.info("Shutting down agent orchestrator")
-        # Cleanup tasks
-        await asyncio.sleep(0.1)
+        await self.workers.shutdown()
+        await self.request_log.stop()
     
     def get_agent_stats(self) -> Dict[str, Any]:
         """Get statistics about agents"""
         stats = {}
-        for agent_type, agent in self.agents.items():
+        for agent_type, pool in self.agents.items():
             stats[agent_type] = {
-                "agent_id": agent.agent_id,
-                "request_count": agent.request_count,
-                "last_activity": agent.last_activity,
-                "uptime": time.time() - agent.created_at
+                # First instance, as before pooling; agent_ids lists every instance
+                "agent_id": pool.agents[0].agent_id,
+                "agent_ids": [agent.agent_id for agent in pool.agents],
+                "request_count": sum(agent.request_count for agent in pool.agents),
+                "last_activity": max(agent.last_activity for agent in pool.agents),
+                "uptime": time.time() - min(agent.created_at for agent in pool.agents),
+                "pool": pool.get_stats(),
+                "backend": self.execution_backends.get(agent_type, "inline"),
+                "workers": self.workers.get_stats() if self.execution_backends.get(agent_type) == "process" else None,
+                "result_cache": (
+                    {**self.result_caches[agent_type].get_stats(), "data_version": self._data_version(agent_type)}
+                    if agent_type in self.result_caches else None
+                )
             }
         return stats
\ No newline at end of file
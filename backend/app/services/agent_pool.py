@@ -0,0 +1,210 @@
+"""
+Agent worker pools
+Fixed-size pools of agent instances per role with priority scheduling and load shedding
+"""
+
+import asyncio
+import itertools
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from enum import Enum
+from typing import Any, AsyncIterator, Deque, Dict, List
+
+class TaskPriority(Enum):
+    """Scheduling classes, most urgent first"""
+    INTERACTIVE = "interactive"
+    NORMAL = "normal"
+    BATCH = "batch"
+
+PRIORITY_RANK = {
+    TaskPriority.INTERACTIVE: 0,
+    TaskPriority.NORMAL: 1,
+    TaskPriority.BATCH: 2
+}
+
+class AgentOverloaded(Exception):
+    """Raised when a role's pool can't take more work (queue full or wait timed out)"""
+
+    def __init__(self, role: str, reason: str):
+        super().__init__(f"Agent pool {role} overloaded: {reason}")
+        self.role = role
+        self.reason = reason
+
+class _Waiter:
+    __slots__ = ("future", "priority", "user_id", "enqueued_at", "sequence")
+
+    def __init__(self, future: "asyncio.Future", priority: TaskPriority, user_id: str, sequence: int):
+        self.future = future
+        self.priority = priority
+        self.user_id = user_id
+        self.enqueued_at = time.monotonic()
+        self.sequence = sequence
+
+class AgentPool:
+    """Agent instances for one role, handed out one task at a time
+
+    When every instance is busy, callers wait and each freed instance
+    goes to the waiter with the best score:
+
+    1. priority class, less one class per aging_seconds spent waiting,
+       so batch work is delayed under load but never starved;
+    2. instances the caller's user already holds, so one user's burst
+       doesn't crowd out everyone else in the same class;
+    3. arrival order.
+
+    Each class may have at most max_queue waiters; beyond that, and for
+    callers that wait longer than queue_timeout_seconds, AgentOverloaded
+    is raised straight away so a slow role sheds load instead of
+    accumulating coroutines. Per-class limits keep a batch backlog from
+    causing interactive rejections.
+    """
+
+    # Recent queue waits kept per class for percentile metrics
+    WAIT_SAMPLES = 1024
+
+    def __init__(
+        self,
+        role: str,
+        agents: List[Any],
+        max_queue: int = 32,
+        queue_timeout_seconds: float = 5.0,
+        aging_seconds: float = 2.0
+    ):
+        if not agents:
+            raise ValueError(f"Agent pool {role} needs at least one agent")
+        self.role = role
+        self.agents = agents
+        self.max_queue = max_queue
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.aging_seconds = aging_seconds
+        self._idle: List[Any] = list(agents)
+        self._waiters: List[_Waiter] = []
+        self._sequence = itertools.count()
+        self._user_in_use: Dict[str, int] = defaultdict(int)
+
+        self.in_use = 0
+        self.peak_waiting = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.queue_timeouts = 0
+        self.coalesced = 0
+        self._user_coalesced: Dict[str, int] = defaultdict(int)
+        self._waits: Dict[TaskPriority, Deque[float]] = {
+            priority: deque(maxlen=self.WAIT_SAMPLES) for priority in TaskPriority
+        }
+
+    @property
+    def size(self) -> int:
+        return len(self.agents)
+
+    @property
+    def queue_depth(self) -> int:
+        """Callers waiting for an instance"""
+        return len(self._waiters)
+
+    def _class_depth(self, priority: TaskPriority) -> int:
+        return sum(1 for waiter in self._waiters if waiter.priority is priority)
+
+    def _score(self, waiter: _Waiter, now: float):
+        # Whole classes only, so waiters within a class still tie on age
+        aged = PRIORITY_RANK[waiter.priority] - int((now - waiter.enqueued_at) / self.aging_seconds)
+        return (max(aged, 0), self._user_in_use.get(waiter.user_id, 0), waiter.sequence)
+
+    def _grant(self, agent: Any, user_id: str, priority: TaskPriority, waited: float) -> Any:
+        self.in_use += 1
+        self._user_in_use[user_id] += 1
+        self._waits[priority].append(waited)
+        return agent
+
+    def _release(self, agent: Any, user_id: str):
+        self.in_use -= 1
+        self._user_in_use[user_id] -= 1
+        if not self._user_in_use[user_id]:
+            del self._user_in_use[user_id]
+
+        now = time.monotonic()
+        while self._waiters:
+            waiter = min(self._waiters, key=lambda w: self._score(w, now))
+            self._waiters.remove(waiter)
+            if not waiter.future.done():
+                # Counted as in use from here so the waiter can't be scored twice
+                waiter.future.set_result(self._grant(agent, waiter.user_id, waiter.priority, now - waiter.enqueued_at))
+                return
+        self._idle.append(agent)
+
+    def note_coalesced(self, user_id: str):
+        """Count a request answered by another caller's in-flight task
+
+        It never holds an instance, but is still submitted work for the
+        role and for the user.
+        """
+        self.submitted += 1
+        self.coalesced += 1
+        self._user_coalesced[user_id] += 1
+
+    @asynccontextmanager
+    async def acquire(self, user_id: str = "anonymous", priority: TaskPriority = TaskPriority.NORMAL) -> AsyncIterator[Any]:
+        """Borrow an agent for the duration of the block"""
+        self.submitted += 1
+        if self._idle and not self._waiters:
+            agent = self._grant(self._idle.pop(), user_id, priority, 0.0)
+        else:
+            if self._class_depth(priority) >= self.max_queue:
+                self.rejected += 1
+                raise AgentOverloaded(self.role, f"{priority.value} queue full")
+
+            waiter = _Waiter(asyncio.get_running_loop().create_future(), priority, user_id, next(self._sequence))
+            self._waiters.append(waiter)
+            self.peak_waiting = max(self.peak_waiting, len(self._waiters))
+            try:
+                agent = await asyncio.wait_for(asyncio.shield(waiter.future), timeout=self.queue_timeout_seconds)
+            except BaseException as e:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                if waiter.future.done() and not waiter.future.cancelled():
+                    # Granted just as we gave up; hand the agent on
+                    self._release(waiter.future.result(), user_id)
+                else:
+                    waiter.future.cancel()
+                if isinstance(e, asyncio.TimeoutError):
+                    self.queue_timeouts += 1
+                    raise AgentOverloaded(self.role, "queue wait timed out")
+                raise
+
+        try:
+            yield agent
+        finally:
+            self._release(agent, user_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get pool occupancy, queue depth and wait-time metrics"""
+
+        def percentile(samples: List[float], fraction: float) -> float:
+            if not samples:
+                return 0.0
+            return round(samples[min(len(samples) - 1, int(fraction * len(samples)))] * 1000.0, 3)
+
+        classes = {}
+        for priority in TaskPriority:
+            waits = sorted(self._waits[priority])
+            classes[priority.value] = {
+                "queue_depth": self._class_depth(priority),
+                "wait_ms_p50": percentile(waits, 0.50),
+                "wait_ms_p99": percentile(waits, 0.99)
+            }
+
+        return {
+            "size": self.size,
+            "in_use": self.in_use,
+            "queue_depth": self.queue_depth,
+            "peak_queue_depth": self.peak_waiting,
+            "max_queue": self.max_queue,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "queue_timeouts": self.queue_timeouts,
+            "coalesced": self.coalesced,
+            "coalesced_users": len(self._user_coalesced),
+            "active_users": len(self._user_in_use),
+            "classes": classes
+        }
@@ -0,0 +1,173 @@
+"""
+Agent worker processes
+Out-of-process execution for CPU-heavy agents, with cancellation by worker replacement
+"""
+
+import asyncio
+import multiprocessing
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import structlog
+
+logger = structlog.get_logger()
+
+class AgentWorkerError(Exception):
+    """Raised when a job fails or its worker process dies"""
+
+def _worker_main(conn: Connection):
+    """Worker loop: run (fn, args) jobs until told to stop"""
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            return
+        if job is None:
+            return
+        fn, args = job
+        try:
+            conn.send((True, fn(*args)))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
+
+class _Worker:
+    __slots__ = ("process", "conn")
+
+    def __init__(self, process: multiprocessing.Process, conn: Connection):
+        self.process = process
+        self.conn = conn
+
+class WorkerPool:
+    """Fixed set of worker processes that run picklable jobs off the event loop
+
+    Each job's payload is pickled to an idle worker and the result is
+    pickled back. Both transfers happen in a thread, so neither the
+    computation nor (de)serialization blocks the loop. If the awaiting
+    task is cancelled, including by an asyncio.wait_for timeout, the
+    worker running the job is killed and replaced, so the CPU is freed
+    immediately rather than when the job would have finished.
+
+    Workers use the spawn start method; forking a process that is running
+    an event loop and threads is not safe.
+    """
+
+    def __init__(self, size: int = 2, name: str = "agent-worker"):
+        self.size = max(1, size)
+        self.name = name
+        self._context = multiprocessing.get_context("spawn")
+        self._workers: List[_Worker] = []
+        self._idle: Optional[asyncio.Queue] = None
+
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.restarts = 0
+
+    @property
+    def started(self) -> bool:
+        return self._idle is not None
+
+    def _spawn(self) -> _Worker:
+        parent, child = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(child,),
+            name=f"{self.name}-{len(self._workers)}",
+            daemon=True
+        )
+        process.start()
+        child.close()
+        worker = _Worker(process, parent)
+        self._workers.append(worker)
+        return worker
+
+    @staticmethod
+    def _reap(worker: _Worker):
+        worker.process.join()
+        worker.conn.close()
+
+    def _replace(self, worker: _Worker):
+        """Kill a worker (mid-job or dead) and return a fresh one to the idle queue"""
+        if worker.process.is_alive():
+            worker.process.kill()
+        # The pipe is closed once the process is gone and the job thread has seen EOF
+        asyncio.get_running_loop().run_in_executor(None, self._reap, worker)
+        self._workers.remove(worker)
+        self.restarts += 1
+        self._idle.put_nowait(self._spawn())
+
+    def start(self):
+        """Spawn the workers (idempotent)"""
+        if self.started:
+            return
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            self._idle.put_nowait(self._spawn())
+        logger.info("Agent worker pool started", name=self.name, workers=self.size)
+
+    @staticmethod
+    def _roundtrip(worker: _Worker, fn: Callable, args: Tuple) -> Tuple[bool, Any]:
+        worker.conn.send((fn, args))
+        return worker.conn.recv()
+
+    async def run(self, fn: Callable, *args: Any) -> Any:
+        """Run fn(*args) in a worker process; fn and args must be picklable"""
+        self.start()
+        worker = await self._idle.get()
+        try:
+            ok, payload = await asyncio.to_thread(self._roundtrip, worker, fn, args)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            self._replace(worker)
+            raise
+        except (EOFError, OSError) as e:
+            self.failed += 1
+            self._replace(worker)
+            raise AgentWorkerError(f"Worker process died: {e or type(e).__name__}")
+        except Exception as e:
+            # Payload couldn't be pickled; the worker never saw the job
+            self.failed += 1
+            self._idle.put_nowait(worker)
+            raise AgentWorkerError(f"Job could not be sent to a worker: {e}")
+
+        self._idle.put_nowait(worker)
+        if not ok:
+            self.failed += 1
+            raise AgentWorkerError(payload)
+        self.completed += 1
+        return payload
+
+    async def shutdown(self, timeout: float = 5.0):
+        """Ask workers to exit, killing any that don't within timeout"""
+        if not self.started:
+            return
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+
+        def join():
+            for worker in workers:
+                worker.process.join(timeout)
+                if worker.process.is_alive():
+                    worker.process.kill()
+                    worker.process.join()
+                worker.conn.close()
+
+        await asyncio.to_thread(join)
+        self._idle = None
+        logger.info("Agent worker pool stopped", name=self.name)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get worker counts and job outcomes"""
+        idle = self._idle.qsize() if self._idle is not None else 0
+        return {
+            "workers": len(self._workers),
+            "busy": len(self._workers) - idle if self.started else 0,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "restarts": self.restarts
+        }
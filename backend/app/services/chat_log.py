@@ -0,0 +1,152 @@
+"""
+Chat log
+Append-only SQLite log of chat turns with cursor pagination and tombstone deletes
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import structlog
+
+logger = structlog.get_logger()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_turns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    metadata TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chat_turns_session ON chat_turns (user_id, session_id, id);
+CREATE TABLE IF NOT EXISTS chat_tombstones (
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    cleared_through INTEGER NOT NULL,
+    cleared_at REAL NOT NULL,
+    PRIMARY KEY (user_id, session_id)
+);
+"""
+
+class ChatLog:
+    """Append-only store of chat turns
+
+    Turns are never updated in place. Clearing a session writes a
+    tombstone recording the last turn id it covers; reads skip
+    everything at or below it. Pages are read newest-first off the
+    (user_id, session_id, id) index, so a page costs O(limit) however
+    long the session has run. Cursors are turn ids.
+
+    One connection guarded by a lock; blocking calls run in a worker
+    thread via asyncio.to_thread.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        logger.info("Chat log opened", path=path)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _append(self, user_id: str, session_id: str, turns: List[Dict[str, Any]]) -> int:
+        rows = [
+            (
+                user_id,
+                session_id,
+                turn["role"],
+                turn["content"],
+                json.dumps(turn.get("metadata") or {}, default=str),
+                turn.get("timestamp", time.time())
+            )
+            for turn in turns
+        ]
+        with self._lock:
+            cursor = self._conn.executemany(
+                "INSERT INTO chat_turns (user_id, session_id, role, content, metadata, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            return cursor.rowcount
+
+    async def append(self, user_id: str, session_id: str, turns: List[Dict[str, Any]]) -> int:
+        """Append turns ({"role", "content", "metadata"?, "timestamp"?}) in one write"""
+        return await asyncio.to_thread(self._append, user_id, session_id, turns)
+
+    def _page(self, user_id: str, session_id: str, limit: int, before: Optional[int]) -> Dict[str, Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT cleared_through FROM chat_tombstones WHERE user_id = ? AND session_id = ?",
+                (user_id, session_id)
+            ).fetchone()
+            cleared_through = row[0] if row else 0
+            # One extra row tells us whether an older page exists
+            rows = self._conn.execute(
+                "SELECT id, role, content, metadata, created_at FROM chat_turns "
+                "WHERE user_id = ? AND session_id = ? AND id > ? AND id < ? "
+                "ORDER BY id DESC LIMIT ?",
+                (user_id, session_id, cleared_through, before if before is not None else 2 ** 63 - 1, limit + 1)
+            ).fetchall()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        messages = [
+            {
+                "id": turn_id,
+                "role": role,
+                "content": content,
+                "metadata": json.loads(metadata) if metadata else {},
+                "timestamp": created_at
+            }
+            for turn_id, role, content, metadata, created_at in reversed(rows)
+        ]
+        return {
+            "messages": messages,
+            "next_cursor": str(messages[0]["id"]) if has_more else None,
+            "has_more": has_more
+        }
+
+    async def page(
+        self,
+        user_id: str,
+        session_id: str,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """One page of turns, oldest first; pass next_cursor back for older turns"""
+        before = int(cursor) if cursor else None
+        return await asyncio.to_thread(self._page, user_id, session_id, limit, before)
+
+    def _clear(self, user_id: str, session_id: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MAX(id) FROM chat_turns WHERE user_id = ? AND session_id = ?",
+                (user_id, session_id)
+            ).fetchone()
+            cleared_through = row[0] or 0
+            self._conn.execute(
+                "INSERT INTO chat_tombstones (user_id, session_id, cleared_through, cleared_at) "
+                "VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (user_id, session_id) DO UPDATE SET "
+                "cleared_through = excluded.cleared_through, cleared_at = excluded.cleared_at",
+                (user_id, session_id, cleared_through, time.time())
+            )
+            return cleared_through
+
+    async def clear(self, user_id: str, session_id: str) -> int:
+        """Tombstone every turn logged so far for a session"""
+        return await asyncio.to_thread(self._clear, user_id, session_id)
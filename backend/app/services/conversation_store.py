@@ -0,0 +1,187 @@
+"""
+Conversation store
+Bounded, process-wide conversation history shared by every QBit request
+"""
+
+import sys
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+SessionKey = Tuple[str, str]
+
+def _approx_size(value: Any) -> int:
+    """Shallow byte estimate for a turn record (strings, numbers, small containers)"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += sys.getsizeof(key) + _approx_size(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            size += _approx_size(item)
+    return size
+
+class _Conversation:
+    """Ring buffer of recent turns plus a compact record of older ones"""
+
+    __slots__ = ("last_seen", "turns", "summary", "bytes")
+
+    def __init__(self, max_turns: int):
+        self.last_seen = time.monotonic()
+        self.turns: Deque[Dict[str, Any]] = deque(maxlen=max_turns)
+        self.summary: Optional[Dict[str, Any]] = None
+        self.bytes = 0
+
+class ConversationStore:
+    """Recent turns per (user_id, session_id)
+
+    Each conversation keeps its last max_turns turns in a ring buffer.
+    Turns pushed out of the buffer are compacted into a summary record
+    (turn count, time span, user intent counts) rather than kept, and
+    stored text is capped at max_content_chars. At most max_sessions
+    conversations are held, least recently active evicted first, and
+    conversations idle for longer than idle_seconds are dropped, so the
+    store's footprint is bounded however long the process runs.
+
+    Not thread-safe; intended for use from a single event loop.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 10000,
+        max_turns: int = 20,
+        idle_seconds: float = 3600.0,
+        max_content_chars: int = 2000
+    ):
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.idle_seconds = idle_seconds
+        self.max_content_chars = max_content_chars
+        # Ordered by last activity, oldest first
+        self._sessions: "OrderedDict[SessionKey, _Conversation]" = OrderedDict()
+        self.approx_bytes = 0
+        self.compacted_turns = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _live(self, key: SessionKey) -> Optional[_Conversation]:
+        conversation = self._sessions.get(key)
+        if conversation is None:
+            return None
+        if time.monotonic() - conversation.last_seen > self.idle_seconds:
+            self._drop(key)
+            self.expirations += 1
+            return None
+        return conversation
+
+    def _drop(self, key: SessionKey):
+        conversation = self._sessions.pop(key)
+        self.approx_bytes -= conversation.bytes
+
+    def _compact(self, conversation: _Conversation, turn: Dict[str, Any]):
+        """Fold a turn leaving the ring buffer into the conversation summary"""
+        summary = conversation.summary
+        if summary is None:
+            summary = conversation.summary = {
+                "turns": 0,
+                "first_timestamp": turn["timestamp"],
+                "last_timestamp": turn["timestamp"],
+                "intents": {}
+            }
+        before = _approx_size(summary)
+        summary["turns"] += 1
+        summary["last_timestamp"] = turn["timestamp"]
+        intent = turn.get("intent")
+        if intent:
+            summary["intents"][intent] = summary["intents"].get(intent, 0) + 1
+        conversation.bytes += _approx_size(summary) - before - turn["_bytes"]
+        self.compacted_turns += 1
+
+    def append(self, user_id: str, session_id: str, role: str, content: str, **metadata: Any):
+        """Record a turn, refreshing the conversation's idle timer"""
+        if self.max_sessions <= 0:
+            return
+        self.prune()
+
+        key = (user_id, session_id)
+        conversation = self._sessions.get(key)
+        if conversation is None:
+            conversation = self._sessions[key] = _Conversation(self.max_turns)
+        else:
+            self._sessions.move_to_end(key)
+        conversation.last_seen = time.monotonic()
+
+        turn = {
+            "role": role,
+            "content": content[:self.max_content_chars],
+            "timestamp": time.time(),
+            **metadata
+        }
+        turn["_bytes"] = _approx_size(turn)
+        total_before = conversation.bytes
+        if len(conversation.turns) == conversation.turns.maxlen:
+            self._compact(conversation, conversation.turns[0])
+        conversation.turns.append(turn)
+        conversation.bytes += turn["_bytes"]
+        self.approx_bytes += conversation.bytes - total_before
+
+        while len(self._sessions) > self.max_sessions:
+            self._drop(next(iter(self._sessions)))
+            self.evictions += 1
+
+    def history(self, user_id: str, session_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Most recent turns, oldest first"""
+        conversation = self._live((user_id, session_id))
+        if conversation is None:
+            return []
+        turns = list(conversation.turns)
+        if limit:
+            turns = turns[-limit:]
+        return [{k: v for k, v in turn.items() if k != "_bytes"} for turn in turns]
+
+    def summary(self, user_id: str, session_id: str) -> Optional[Dict[str, Any]]:
+        """Compact record of turns that have left the ring buffer"""
+        conversation = self._live((user_id, session_id))
+        if conversation is None or conversation.summary is None:
+            return None
+        summary = dict(conversation.summary)
+        summary["intents"] = dict(summary["intents"])
+        return summary
+
+    def clear(self, user_id: str, session_id: str) -> bool:
+        """Forget one conversation"""
+        key = (user_id, session_id)
+        if key not in self._sessions:
+            return False
+        self._drop(key)
+        return True
+
+    def prune(self) -> int:
+        """Drop every idle conversation (cheap: the oldest are at the front)"""
+        cutoff = time.monotonic() - self.idle_seconds
+        expired = 0
+        while self._sessions:
+            key, conversation = next(iter(self._sessions.items()))
+            if conversation.last_seen >= cutoff:
+                break
+            self._drop(key)
+            expired += 1
+        self.expirations += expired
+        return expired
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get store size, memory gauge and eviction counters"""
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "turns": sum(len(conversation.turns) for conversation in self._sessions.values()),
+            "max_turns": self.max_turns,
+            "compacted_turns": self.compacted_turns,
+            "approx_bytes": self.approx_bytes,
+            "idle_seconds": self.idle_seconds,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
@@ -0,0 +1,504 @@
+"""
+Graph clustering
+Sparse kNN graphs over claim feature vectors with Leiden / Louvain community detection
+"""
+
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import structlog
+
+try:
+    import igraph
+    import leidenalg
+except ImportError:
+    # Optional; the NumPy Louvain implementation below is used instead
+    igraph = None
+    leidenalg = None
+
+logger = structlog.get_logger()
+
+# Record fields that identify a claim rather than describe it
+ID_FIELDS = {"id", "claim_id", "veteran_id", "file_number", "ssn", "name"}
+# Most frequent values kept per categorical field
+MAX_CATEGORY_VALUES = 50
+# Above this many rows kNN search is restricted to nearby k-means cells
+EXACT_KNN_LIMIT = 20000
+# Upper bound on any one distance block, in bytes
+KNN_BLOCK_BYTES = 64 << 20
+OUTLIER_THRESHOLD = 2.0
+
+CSRGraph = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+def encode_records(records: Sequence[Any]) -> Tuple[np.ndarray, List[str], np.ndarray]:
+    """Feature matrix in raw units, column names and a mask of 0/1 flag columns
+
+    Records may be numeric vectors or dicts. In dicts, numbers become
+    numeric columns, while strings, booleans and lists of strings become
+    one flag column per value (field=value). Identifier fields are
+    ignored.
+    """
+    if not records:
+        return np.zeros((0, 0), dtype=np.float32), [], np.zeros(0, dtype=bool)
+
+    if not isinstance(records[0], dict):
+        matrix = np.asarray(records, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(-1, 1)
+        names = [f"feature_{i}" for i in range(matrix.shape[1])]
+        return matrix, names, np.zeros(matrix.shape[1], dtype=bool)
+
+    numeric: Dict[str, int] = {}
+    categories: Dict[str, Counter] = {}
+    for record in records:
+        for key, value in record.items():
+            if key in ID_FIELDS or value is None:
+                continue
+            if isinstance(value, bool):
+                categories.setdefault(key, Counter())[str(value).lower()] += 1
+            elif isinstance(value, (int, float)):
+                numeric.setdefault(key, len(numeric))
+            elif isinstance(value, (list, tuple, set)):
+                counter = categories.setdefault(key, Counter())
+                counter.update(str(item) for item in value)
+            else:
+                categories.setdefault(key, Counter())[str(value)] += 1
+
+    names = list(numeric)
+    columns: Dict[Tuple[str, str], int] = {}
+    for key, counter in categories.items():
+        for value, _ in counter.most_common(MAX_CATEGORY_VALUES):
+            columns[(key, value)] = len(names)
+            names.append(f"{key}={value}")
+
+    matrix = np.zeros((len(records), len(names)), dtype=np.float32)
+    seen = np.zeros((len(records), len(numeric)), dtype=bool)
+    for row, record in enumerate(records):
+        for key, value in record.items():
+            if key in ID_FIELDS or value is None:
+                continue
+            if isinstance(value, bool):
+                column = columns.get((key, str(value).lower()))
+            elif isinstance(value, (int, float)):
+                if key in numeric:
+                    matrix[row, numeric[key]] = value
+                    seen[row, numeric[key]] = True
+                continue
+            elif isinstance(value, (list, tuple, set)):
+                for item in value:
+                    column = columns.get((key, str(item)))
+                    if column is not None:
+                        matrix[row, column] = 1.0
+                continue
+            else:
+                column = columns.get((key, str(value)))
+            if column is not None:
+                matrix[row, column] = 1.0
+
+    # Missing numbers take the column mean so they don't pull rows together
+    for column in range(len(numeric)):
+        present = seen[:, column]
+        if present.any() and not present.all():
+            matrix[~present, column] = matrix[present, column].mean()
+
+    flags = np.zeros(len(names), dtype=bool)
+    flags[len(numeric):] = True
+    return matrix, names, flags
+
+def scale_features(matrix: np.ndarray, flags: np.ndarray) -> np.ndarray:
+    """Z-score numeric columns; flag columns stay 0/1"""
+    scaled = matrix.astype(np.float32, copy=True)
+    numeric = ~flags
+    if numeric.any():
+        mean = scaled[:, numeric].mean(axis=0)
+        std = scaled[:, numeric].std(axis=0)
+        std[std == 0] = 1.0
+        scaled[:, numeric] = (scaled[:, numeric] - mean) / std
+    return scaled
+
+def _block_knn(
+    vectors: np.ndarray,
+    norms: np.ndarray,
+    queries: np.ndarray,
+    candidates: np.ndarray,
+    k: int,
+    indices: np.ndarray,
+    distances: np.ndarray
+):
+    """Fill indices/distances rows for queries with their k nearest candidates"""
+    base = vectors[candidates]
+    base_norms = norms[candidates]
+    take = min(k, len(candidates) - 1)
+    if take <= 0:
+        return
+    step = max(1, KNN_BLOCK_BYTES // (4 * len(candidates)))
+    for start in range(0, len(queries), step):
+        rows = queries[start:start + step]
+        squared = norms[rows][:, None] - 2.0 * (vectors[rows] @ base.T) + base_norms[None, :]
+        squared[rows[:, None] == candidates[None, :]] = np.inf
+        nearest = np.argpartition(squared, take - 1, axis=1)[:, :take]
+        nearest_squared = np.take_along_axis(squared, nearest, axis=1)
+        order = np.argsort(nearest_squared, axis=1)
+        indices[rows, :take] = candidates[np.take_along_axis(nearest, order, axis=1)]
+        distances[rows, :take] = np.sqrt(np.maximum(np.take_along_axis(nearest_squared, order, axis=1), 0.0))
+
+def _kmeans(vectors: np.ndarray, clusters: int, rng: np.random.Generator, iterations: int = 10) -> np.ndarray:
+    """Cell assignment for every row, trained on a sample"""
+    sample = vectors[rng.choice(len(vectors), size=min(len(vectors), clusters * 64), replace=False)]
+    centroids = sample[rng.choice(len(sample), size=clusters, replace=False)].copy()
+
+    def assign(rows: np.ndarray) -> np.ndarray:
+        labels = np.empty(len(rows), dtype=np.int64)
+        centroid_norms = (centroids ** 2).sum(axis=1)
+        step = max(1, KNN_BLOCK_BYTES // (4 * clusters))
+        for start in range(0, len(rows), step):
+            block = rows[start:start + step]
+            labels[start:start + step] = np.argmin(centroid_norms[None, :] - 2.0 * (block @ centroids.T), axis=1)
+        return labels
+
+    for _ in range(iterations):
+        labels = assign(sample)
+        counts = np.bincount(labels, minlength=clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return assign(vectors)
+
+def knn(
+    vectors: np.ndarray,
+    k: int = 15,
+    nprobe: int = 8,
+    seed: int = 0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """k nearest neighbours of every row (self excluded), nearest first
+
+    Exact for up to EXACT_KNN_LIMIT rows. Beyond that, rows are bucketed
+    into ~sqrt(n) k-means cells, and each cell is searched against its
+    nprobe nearest cells only. Distance blocks are capped at
+    KNN_BLOCK_BYTES, so memory stays O(n * k) plus one block. Missing
+    neighbours (tiny inputs) are -1 with infinite distance.
+    """
+    count = len(vectors)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    norms = (vectors ** 2).sum(axis=1)
+    indices = np.full((count, k), -1, dtype=np.int64)
+    distances = np.full((count, k), np.inf, dtype=np.float32)
+
+    if count <= EXACT_KNN_LIMIT:
+        everything = np.arange(count)
+        _block_knn(vectors, norms, everything, everything, k, indices, distances)
+        return indices, distances
+
+    rng = np.random.default_rng(seed)
+    cells = int(np.sqrt(count))
+    labels = _kmeans(vectors, cells, rng)
+    members = [np.flatnonzero(labels == cell) for cell in range(cells)]
+    centroids = np.stack([
+        vectors[rows].mean(axis=0) if len(rows) else np.full(vectors.shape[1], np.inf, dtype=np.float32)
+        for rows in members
+    ])
+    finite = np.isfinite(centroids).all(axis=1)
+    centroids[~finite] = 0.0
+    gaps = ((centroids[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2)
+    gaps[:, ~finite] = np.inf
+    probe = np.argsort(gaps, axis=1)[:, :max(1, nprobe)]
+
+    for cell, rows in enumerate(members):
+        if len(rows):
+            candidates = np.concatenate([members[other] for other in probe[cell]])
+            _block_knn(vectors, norms, rows, candidates, k, indices, distances)
+    return indices, distances
+
+def knn_graph(indices: np.ndarray, distances: np.ndarray) -> CSRGraph:
+    """Symmetric weighted kNN graph as CSR (indptr, columns, weights)
+
+    Edge weights use locally scaled Gaussian similarity,
+    exp(-d^2 / (sigma_i * sigma_j)), where sigma is each node's distance
+    to its farthest neighbour. Dense and sparse regions therefore
+    contribute comparably. An edge found from either end is kept once.
+    """
+    count, k = indices.shape
+    valid = indices >= 0
+    finite = np.where(valid, distances, np.nan)
+    sigma = np.nanmax(finite, axis=1) if k else np.zeros(count)
+    sigma = np.where(np.isfinite(sigma) & (sigma > 0), sigma, 1.0)
+
+    rows = np.repeat(np.arange(count), k)[valid.ravel()]
+    cols = indices[valid]
+    squared = distances[valid].astype(np.float64) ** 2
+    weights = np.exp(-squared / (sigma[rows] * sigma[cols]))
+
+    rows, cols = np.concatenate([rows, cols]), np.concatenate([cols, rows])
+    weights = np.concatenate([weights, weights])
+    keys = rows * count + cols
+    order = np.argsort(keys, kind="stable")
+    keys, weights = keys[order], weights[order]
+    unique, starts = np.unique(keys, return_index=True)
+    weights = np.maximum.reduceat(weights, starts) if len(starts) else weights
+
+    rows, cols = unique // count, unique % count
+    indptr = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=count), out=indptr[1:])
+    return indptr, cols.astype(np.int64), weights
+
+def _rows(indptr: np.ndarray) -> np.ndarray:
+    return np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+
+def modularity(graph: CSRGraph, membership: np.ndarray, resolution: float = 1.0) -> float:
+    """Newman modularity of a partition of a symmetric weighted graph"""
+    indptr, cols, weights = graph
+    total = weights.sum()
+    if total <= 0:
+        return 0.0
+    rows = _rows(indptr)
+    internal = weights[membership[rows] == membership[cols]].sum()
+    degree = np.bincount(rows, weights=weights, minlength=len(indptr) - 1)
+    community_degree = np.bincount(membership, weights=degree)
+    return float(internal / total - resolution * ((community_degree / total) ** 2).sum())
+
+def _local_moving(
+    graph: CSRGraph,
+    resolution: float,
+    rng: np.random.Generator,
+    max_sweeps: int
+) -> Tuple[np.ndarray, bool]:
+    """Greedy Louvain phase: move nodes to the neighbouring community with the best gain"""
+    indptr, cols, weights = graph
+    count = len(indptr) - 1
+    degree = np.bincount(_rows(indptr), weights=weights, minlength=count)
+    total = degree.sum()
+    if total <= 0:
+        return np.arange(count), False
+
+    # Plain lists: per-node neighbourhoods are tiny and NumPy call overhead dominates
+    pointers, neighbours, edge_weights = indptr.tolist(), cols.tolist(), weights.tolist()
+    degrees = degree.tolist()
+    community = list(range(count))
+    community_degree = list(degrees)
+    scale = resolution / total
+    order = rng.permutation(count).tolist()
+
+    moved = False
+    for _ in range(max_sweeps):
+        moves = 0
+        for node in order:
+            current = community[node]
+            node_degree = degrees[node]
+            links: Dict[int, float] = {}
+            for position in range(pointers[node], pointers[node + 1]):
+                neighbour = neighbours[position]
+                if neighbour != node:
+                    target = community[neighbour]
+                    links[target] = links.get(target, 0.0) + edge_weights[position]
+
+            community_degree[current] -= node_degree
+            best = current
+            best_gain = links.get(current, 0.0) - community_degree[current] * node_degree * scale
+            for target, weight in links.items():
+                gain = weight - community_degree[target] * node_degree * scale
+                if gain > best_gain + 1e-12:
+                    best, best_gain = target, gain
+            community_degree[best] += node_degree
+            if best != current:
+                community[node] = best
+                moves += 1
+        if not moves:
+            break
+        moved = True
+
+    return np.unique(np.asarray(community), return_inverse=True)[1], moved
+
+def _aggregate(graph: CSRGraph, labels: np.ndarray) -> CSRGraph:
+    """Collapse each community into one node, summing edge weights"""
+    indptr, cols, weights = graph
+    communities = int(labels.max()) + 1
+    keys = labels[_rows(indptr)].astype(np.int64) * communities + labels[cols]
+    unique, inverse = np.unique(keys, return_inverse=True)
+    merged = np.bincount(inverse, weights=weights)
+    rows = unique // communities
+    new_indptr = np.zeros(communities + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=communities), out=new_indptr[1:])
+    return new_indptr, unique % communities, merged
+
+def louvain(
+    graph: CSRGraph,
+    resolution: float = 1.0,
+    seed: int = 0,
+    max_levels: int = 10,
+    max_sweeps: int = 20
+) -> np.ndarray:
+    """Community label per node by multi-level Louvain modularity optimization"""
+    rng = np.random.default_rng(seed)
+    membership = np.arange(len(graph[0]) - 1)
+    for _ in range(max_levels):
+        labels, moved = _local_moving(graph, resolution, rng, max_sweeps)
+        if not moved:
+            break
+        membership = labels[membership]
+        graph = _aggregate(graph, labels)
+    return membership
+
+def leiden(graph: CSRGraph, resolution: float = 1.0, seed: int = 0) -> Optional[np.ndarray]:
+    """Community label per node via leidenalg, or None when it isn't installed"""
+    if leidenalg is None:
+        return None
+    indptr, cols, weights = graph
+    rows = _rows(indptr)
+    upper = rows < cols
+    network = igraph.Graph(n=len(indptr) - 1, edges=list(zip(rows[upper].tolist(), cols[upper].tolist())))
+    partition = leidenalg.find_partition(
+        network,
+        leidenalg.RBConfigurationVertexPartition,
+        weights=weights[upper].tolist(),
+        resolution_parameter=resolution,
+        seed=seed
+    )
+    return np.asarray(partition.membership, dtype=np.int64)
+
+def outlier_scores(indices: np.ndarray, distances: np.ndarray) -> np.ndarray:
+    """Mean kNN distance relative to the neighbours' own (about 1 inside a cluster)"""
+    valid = indices >= 0
+    spread = np.where(valid, distances, 0.0).sum(axis=1) / np.maximum(valid.sum(axis=1), 1)
+    neighbour_spread = np.where(valid, spread[np.where(valid, indices, 0)], 0.0).sum(axis=1)
+    neighbour_spread /= np.maximum(valid.sum(axis=1), 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scores = np.where(neighbour_spread > 0, spread / neighbour_spread, 1.0)
+    return np.where(spread > 0, scores, 1.0).astype(np.float32)
+
+def _describe_clusters(
+    matrix: np.ndarray,
+    names: List[str],
+    flags: np.ndarray,
+    membership: np.ndarray,
+    max_clusters: int = 5
+) -> List[str]:
+    """Distinguishing features of the largest clusters, in words"""
+    count = len(membership)
+    sizes = np.bincount(membership)
+    order = np.argsort(membership, kind="stable")
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    means = np.add.reduceat(matrix[order].astype(np.float64), starts, axis=0) / sizes[:, None]
+    overall = matrix.mean(axis=0, dtype=np.float64)
+    spread = matrix.std(axis=0, dtype=np.float64)
+    spread[spread == 0] = 1.0
+
+    patterns = []
+    for rank, cluster in enumerate(np.argsort(-sizes)[:max_clusters], start=1):
+        if sizes[cluster] < 2:
+            break
+        traits = []
+        lift = np.where(flags & (overall > 0), means[cluster] / np.where(overall > 0, overall, 1.0), 0.0)
+        for column in np.argsort(-lift)[:3]:
+            if lift[column] >= 1.5 and means[cluster, column] >= 0.5:
+                traits.append(
+                    f"{names[column]} {means[cluster, column]:.0%} vs {overall[column]:.0%} overall"
+                )
+        shift = np.where(~flags, (means[cluster] - overall) / spread, 0.0)
+        for column in np.argsort(-np.abs(shift))[:2]:
+            if abs(shift[column]) >= 1.0:
+                direction = "higher" if shift[column] > 0 else "lower"
+                traits.append(
+                    f"{direction} {names[column]} ({means[cluster, column]:.1f} vs {overall[column]:.1f})"
+                )
+        share = sizes[cluster] / count
+        description = "; ".join(traits) if traits else "no single distinguishing feature"
+        patterns.append(f"Cluster {rank} ({sizes[cluster]:,} claims, {share:.0%}): {description}")
+    return patterns
+
+def analyze_patterns(
+    records: Sequence[Any],
+    k: int = 15,
+    resolution: float = 1.0,
+    seed: int = 0,
+    max_anomalies: int = 20
+) -> Dict[str, Any]:
+    """Cluster records on a kNN graph and report clusters, patterns and outliers
+
+    Uses Leiden when igraph and leidenalg are installed, Louvain otherwise.
+    """
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+    matrix, names, flags = encode_records(records)
+    count = len(matrix)
+    timings["encode_ms"] = (time.perf_counter() - started) * 1000.0
+
+    algorithm = "leiden" if leidenalg is not None else "louvain"
+    if count < 3 or not names:
+        return {
+            "clusters": {
+                "algorithm": algorithm,
+                "num_clusters": 1 if count else 0,
+                "cluster_sizes": [count] if count else [],
+                "modularity": 0.0,
+                "nodes": count,
+                "edges": 0,
+                "membership": [0] * count
+            },
+            "patterns": [],
+            "anomalies": [],
+            "features": names,
+            "timings_ms": timings
+        }
+
+    stage = time.perf_counter()
+    indices, distances = knn(scale_features(matrix, flags), k=min(k, count - 1), seed=seed)
+    graph = knn_graph(indices, distances)
+    timings["graph_ms"] = (time.perf_counter() - stage) * 1000.0
+
+    stage = time.perf_counter()
+    membership = leiden(graph, resolution, seed)
+    if membership is None:
+        membership = louvain(graph, resolution, seed)
+    # Largest cluster first
+    sizes = np.bincount(membership)
+    relabel = np.empty_like(sizes)
+    relabel[np.argsort(-sizes, kind="stable")] = np.arange(len(sizes))
+    membership = relabel[membership]
+    sizes = np.bincount(membership)
+    timings["cluster_ms"] = (time.perf_counter() - stage) * 1000.0
+
+    scores = outlier_scores(indices, distances)
+    anomalies = []
+    for node in np.argsort(-scores)[:max_anomalies]:
+        score = float(scores[node])
+        if score < OUTLIER_THRESHOLD:
+            break
+        record = records[node]
+        anomalies.append({
+            "type": "outlier",
+            "severity": "high" if score >= 3.0 else "medium" if score >= 2.5 else "low",
+            "description": f"Claim is {score:.1f}x farther from its nearest neighbours than they are from theirs",
+            "index": int(node),
+            "claim_id": record.get("claim_id", record.get("id")) if isinstance(record, dict) else None,
+            "cluster": int(membership[node]),
+            "score": round(score, 3)
+        })
+
+    timings["total_ms"] = (time.perf_counter() - started) * 1000.0
+    result = {
+        "clusters": {
+            "algorithm": algorithm,
+            "num_clusters": int(len(sizes)),
+            "cluster_sizes": sizes.tolist(),
+            "modularity": round(modularity(graph, membership, resolution), 4),
+            "nodes": count,
+            "edges": int(len(graph[1]) // 2),
+            "membership": membership.tolist()
+        },
+        "patterns": _describe_clusters(matrix, names, flags, membership),
+        "anomalies": anomalies,
+        "features": names,
+        "timings_ms": {name: round(value, 3) for name, value in timings.items()}
+    }
+    logger.info(
+        "Pattern analysis completed",
+        algorithm=algorithm,
+        nodes=count,
+        clusters=len(sizes),
+        modularity=result["clusters"]["modularity"],
+        elapsed_ms=round(timings["total_ms"], 1)
+    )
+    return result
@@ -0,0 +1,644 @@
+"""
+Versioned on-disk snapshots of the knowledge base index
+Memory-mapped so every worker process shares the same pages
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Mapping, MutableMapping
+from typing import Dict, Any, List, Optional, Tuple, Iterator, Hashable
+import numpy as np
+import structlog
+
+from app.services.search_index import FacetField, InvertedIndex, Segment, merge_segments
+from app.services.vector_index import VectorIndex
+
+logger = structlog.get_logger()
+
+SNAPSHOT_MAGIC = b"QBITKB\x00\x01"
+# Bump when the layout, tokenizer or field weighting changes
+SNAPSHOT_FORMAT = 5
+_PREAMBLE = struct.Struct("<8sII")
+_ALIGN = 8
+
+_HEADER_FIELDS = (
+    "index_version", "fingerprint", "byteorder", "k1", "b", "documents",
+    "total_length", "sources", "facets", "vectors", "sections"
+)
+_SECTIONS = (
+    "term_offsets", "term_blob", "post_offsets", "doc_ids", "freqs", "pos_offsets",
+    "pos_ends", "positions", "doc_lengths", "doc_offsets", "doc_blob",
+    "key_offsets", "key_blob", "key_order", "vectors", "vector_docs", "centroids"
+)
+
+class SnapshotError(Exception):
+    """Raised when a snapshot is missing, corrupt or incompatible"""
+
+def snapshot_path(directory: str, index_version: str) -> str:
+    """Snapshot file location for an index version"""
+    safe_version = "".join(c if c.isalnum() or c in ".-_" else "_" for c in index_version)
+    return os.path.join(directory, f"kb-index-{safe_version}.bin")
+
+def _encode_key(doc_key: Tuple[str, str]) -> bytes:
+    """Byte form of a (source, key) pair; sorts grouped by source"""
+    source, key = doc_key
+    return source.encode("utf-8") + b"\x00" + key.encode("utf-8")
+
+def write_snapshot(
+    path: str,
+    index: InvertedIndex,
+    knowledge_store: Dict[str, Dict[str, Dict[str, Any]]],
+    index_version: str,
+    vectors: Optional[VectorIndex] = None,
+    embedder_name: Optional[str] = None,
+    fingerprint: Optional[str] = None
+) -> Dict[str, Any]:
+    """Serialize live documents, term dictionary, postings and vectors to path
+
+    Doc IDs are renumbered densely so tombstoned documents take no space.
+    fingerprint identifies the content the index was built from, so a
+    reader can reject a snapshot left over from older seed documents.
+    The file is written next to its destination and renamed into place, so
+    concurrent workers never observe a partial snapshot.
+    """
+    merged = merge_segments(index.segments, index.tombstones)
+    live_ids = sorted(index.key_to_id.values())
+    remap = {old_id: new_id for new_id, old_id in enumerate(live_ids)}
+
+    terms = sorted(merged.postings)
+    term_offsets = array("Q", [0])
+    term_blob = bytearray()
+    post_offsets = array("Q", [0])
+    doc_ids = array("I")
+    freqs = array("I")
+    pos_offsets = array("Q", [0])
+    pos_ends = array("I")
+    positions = array("I")
+    for term in terms:
+        term_blob += term.encode("utf-8")
+        term_offsets.append(len(term_blob))
+        ids, tfs, ends, term_positions = merged.postings[term]
+        doc_ids.extend(remap[doc_id] for doc_id in ids)
+        freqs.extend(tfs)
+        post_offsets.append(len(doc_ids))
+        # pos_ends stay relative to the term's own run of positions
+        pos_ends.extend(ends)
+        positions.extend(term_positions)
+        pos_offsets.append(len(positions))
+
+    doc_lengths = array("I", (index.doc_lengths[doc_id] for doc_id in live_ids))
+    keys = [index.doc_keys[doc_id] for doc_id in live_ids]
+    doc_offsets = array("Q", [0])
+    doc_blob = bytearray()
+    key_offsets = array("Q", [0])
+    key_blob = bytearray()
+    for source, key in keys:
+        doc_blob += json.dumps(knowledge_store[source][key], separators=(",", ":")).encode("utf-8")
+        doc_offsets.append(len(doc_blob))
+        key_blob += _encode_key((source, key))
+        key_offsets.append(len(key_blob))
+    # Binary-searchable key -> doc ID lookup; each source is one contiguous run
+    key_order = array("I", sorted(range(len(keys)), key=lambda doc_id: _encode_key(keys[doc_id])))
+
+    matrix = np.empty((0, 0), dtype=np.float32)
+    vector_docs = array("I")
+    centroids = None
+    if vectors is not None:
+        matrix, vector_keys, centroids = vectors.export_arrays()
+        vector_docs.extend(remap[index.key_to_id[tuple(doc_key)]] for doc_key in vector_keys)
+    if centroids is None:
+        centroids = np.empty((0, matrix.shape[1] if matrix.size else 0), dtype=np.float32)
+
+    facet_sections = [
+        (
+            f"facet:{name}",
+            array("I", (field.ordinals[doc_id] for doc_id in live_ids)).tobytes()
+        )
+        for name, field in index.facets.items()
+    ]
+
+    sections = facet_sections + [
+        ("term_offsets", term_offsets.tobytes()),
+        ("term_blob", bytes(term_blob)),
+        ("post_offsets", post_offsets.tobytes()),
+        ("doc_ids", doc_ids.tobytes()),
+        ("freqs", freqs.tobytes()),
+        ("pos_offsets", pos_offsets.tobytes()),
+        ("pos_ends", pos_ends.tobytes()),
+        ("positions", positions.tobytes()),
+        ("doc_lengths", doc_lengths.tobytes()),
+        ("doc_offsets", doc_offsets.tobytes()),
+        ("doc_blob", bytes(doc_blob)),
+        ("key_offsets", key_offsets.tobytes()),
+        ("key_blob", bytes(key_blob)),
+        ("key_order", key_order.tobytes()),
+        ("vectors", np.ascontiguousarray(matrix, dtype=np.float32).tobytes()),
+        ("vector_docs", vector_docs.tobytes()),
+        ("centroids", np.ascontiguousarray(centroids, dtype=np.float32).tobytes())
+    ]
+
+    header = {
+        "index_version": index_version,
+        "fingerprint": fingerprint,
+        "byteorder": sys.byteorder,
+        "k1": index.k1,
+        "b": index.b,
+        "documents": len(live_ids),
+        "terms": len(terms),
+        "postings": len(doc_ids),
+        "positions": len(positions),
+        "total_length": index.total_length,
+        "sources": sorted({source for source, _ in keys}),
+        "facets": {name: field.values for name, field in index.facets.items()},
+        "vectors": {
+            "rows": int(matrix.shape[0]),
+            "dimension": vectors.dimension if vectors is not None else 0,
+            "nlist": int(centroids.shape[0]),
+            "embedder": embedder_name
+        },
+        "sections": {}
+    }
+
+    # Section offsets depend on the header's own size; lay out until stable
+    header_bytes = b""
+    while True:
+        offset = _align(_PREAMBLE.size + len(header_bytes))
+        for name, payload in sections:
+            header["sections"][name] = [offset, len(payload)]
+            offset = _align(offset + len(payload))
+        encoded = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        if len(encoded) == len(header_bytes):
+            header_bytes = encoded
+            break
+        header_bytes = encoded
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREAMBLE.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, len(header_bytes)))
+        f.write(header_bytes)
+        for name, payload in sections:
+            start, _ = header["sections"][name]
+            f.write(b"\x00" * (start - f.tell()))
+            f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+    logger.info(
+        "Knowledge index snapshot written",
+        path=path,
+        documents=header["documents"],
+        terms=header["terms"],
+        bytes=os.path.getsize(path)
+    )
+    return header
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+class MappedPostings(Mapping):
+    """Read-only term -> (doc_ids, freqs, pos_ends, positions) view over a mapped snapshot
+
+    Terms are sorted, so lookup is a binary search over the term blob and
+    postings come back as zero-copy memoryview slices.
+    """
+
+    def __init__(self, snapshot: "IndexSnapshot"):
+        self._buf = snapshot.buffer
+        self._term_offsets = snapshot.section("term_offsets", "Q")
+        self._term_base = snapshot.header["sections"]["term_blob"][0]
+        self._post_offsets = snapshot.section("post_offsets", "Q")
+        self._doc_ids = snapshot.section("doc_ids", "I")
+        self._freqs = snapshot.section("freqs", "I")
+        self._pos_offsets = snapshot.section("pos_offsets", "Q")
+        self._pos_ends = snapshot.section("pos_ends", "I")
+        self._positions = snapshot.section("positions", "I")
+        self._count = len(self._term_offsets) - 1
+
+    def term_at(self, position: int) -> bytes:
+        base = self._term_base
+        return self._buf[base + self._term_offsets[position]:base + self._term_offsets[position + 1]]
+
+    def find(self, term: str) -> int:
+        """Position of term in the sorted dictionary, or -1"""
+        target = term.encode("utf-8")
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.term_at(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count and self.term_at(lo) == target:
+            return lo
+        return -1
+
+    def postings_at(self, position: int) -> Tuple[memoryview, memoryview, memoryview, memoryview]:
+        start = self._post_offsets[position]
+        end = self._post_offsets[position + 1]
+        pos_start = self._pos_offsets[position]
+        pos_end = self._pos_offsets[position + 1]
+        return (
+            self._doc_ids[start:end],
+            self._freqs[start:end],
+            self._pos_ends[start:end],
+            self._positions[pos_start:pos_end]
+        )
+
+    def __getitem__(self, term: str) -> Tuple[memoryview, memoryview, memoryview, memoryview]:
+        position = self.find(term)
+        if position < 0:
+            raise KeyError(term)
+        return self.postings_at(position)
+
+    def __contains__(self, term: object) -> bool:
+        return isinstance(term, str) and self.find(term) >= 0
+
+    def items(self) -> Iterator[Tuple[str, Tuple[memoryview, memoryview, memoryview, memoryview]]]:
+        """Walk the dictionary in order without a binary search per term"""
+        for position in range(self._count):
+            yield self.term_at(position).decode("utf-8"), self.postings_at(position)
+
+    def __iter__(self) -> Iterator[str]:
+        for position in range(self._count):
+            yield self.term_at(position).decode("utf-8")
+
+    def __len__(self) -> int:
+        return self._count
+
+class MappedSegment(Segment):
+    """Sealed segment whose postings live in a memory-mapped snapshot"""
+
+    def __init__(self, snapshot: "IndexSnapshot"):
+        super().__init__()
+        self.postings = MappedPostings(snapshot)
+        self.doc_count = snapshot.header["documents"]
+        self.sealed = True
+
+    def postings_count(self) -> int:
+        return len(self.postings._doc_ids)
+
+class MappedArray:
+    """Append-only integer array whose prefix is a mapped snapshot section
+
+    Reads of snapshot documents go straight to the shared pages; only
+    values appended after the restore live in process memory.
+    """
+
+    def __init__(self, base: memoryview, typecode: str = "I"):
+        self._base = base
+        self._tail = array(typecode)
+
+    def __len__(self) -> int:
+        return len(self._base) + len(self._tail)
+
+    def __getitem__(self, position: int) -> int:
+        if position < len(self._base):
+            return self._base[position]
+        return self._tail[position - len(self._base)]
+
+    def __iter__(self) -> Iterator[int]:
+        yield from self._base
+        yield from self._tail
+
+    def append(self, value: int):
+        self._tail.append(value)
+
+class MappedDocKeys:
+    """doc ID -> (source, key) list backed by the snapshot's key table
+
+    Keys are decoded on access. Deleted snapshot documents are cleared to
+    None in a small overlay; documents added later are held in a tail list.
+    """
+
+    def __init__(self, snapshot: "IndexSnapshot"):
+        self._snapshot = snapshot
+        self._count = snapshot.doc_count
+        self._cleared = set()
+        self._tail: List[Optional[Hashable]] = []
+
+    def __len__(self) -> int:
+        return self._count + len(self._tail)
+
+    def __getitem__(self, doc_id: int) -> Optional[Hashable]:
+        if doc_id >= self._count:
+            return self._tail[doc_id - self._count]
+        if doc_id in self._cleared:
+            return None
+        return self._snapshot.doc_key(doc_id)
+
+    def __setitem__(self, doc_id: int, doc_key: Optional[Hashable]):
+        if doc_id >= self._count:
+            self._tail[doc_id - self._count] = doc_key
+        elif doc_key is None:
+            self._cleared.add(doc_id)
+        else:
+            raise ValueError("Snapshot documents can only be cleared")
+
+    def __iter__(self) -> Iterator[Optional[Hashable]]:
+        for doc_id in range(len(self)):
+            yield self[doc_id]
+
+    def append(self, doc_key: Hashable):
+        self._tail.append(doc_key)
+
+class MappedKeyIndex(MutableMapping):
+    """(source, key) -> doc ID mapping backed by the snapshot's sorted key table
+
+    Lookups binary-search the mapped table. Removals and keys added after
+    the restore are kept in overlays, like SnapshotDocuments.
+    """
+
+    def __init__(self, snapshot: "IndexSnapshot"):
+        self._snapshot = snapshot
+        self._added: Dict[Hashable, int] = {}
+        self._removed: Dict[Hashable, int] = {}
+
+    def _base_id(self, doc_key: Hashable) -> int:
+        if doc_key in self._removed:
+            return -1
+        return self._snapshot.find_doc(doc_key)
+
+    def __getitem__(self, doc_key: Hashable) -> int:
+        if doc_key in self._added:
+            return self._added[doc_key]
+        doc_id = self._base_id(doc_key)
+        if doc_id < 0:
+            raise KeyError(doc_key)
+        return doc_id
+
+    def __setitem__(self, doc_key: Hashable, doc_id: int):
+        if doc_key not in self._added:
+            base_id = self._base_id(doc_key)
+            if base_id >= 0:
+                self._removed[doc_key] = base_id
+        self._added[doc_key] = doc_id
+
+    def __delitem__(self, doc_key: Hashable):
+        if doc_key in self._added:
+            del self._added[doc_key]
+            return
+        doc_id = self._base_id(doc_key)
+        if doc_id < 0:
+            raise KeyError(doc_key)
+        self._removed[doc_key] = doc_id
+
+    def __contains__(self, doc_key: object) -> bool:
+        return doc_key in self._added or self._base_id(doc_key) >= 0
+
+    def __iter__(self) -> Iterator[Hashable]:
+        removed = set(self._removed.values())
+        for doc_id in range(self._snapshot.doc_count):
+            if doc_id not in removed:
+                yield self._snapshot.doc_key(doc_id)
+        yield from self._added
+
+    def __len__(self) -> int:
+        return self._snapshot.doc_count - len(self._removed) + len(self._added)
+
+    def values(self) -> Iterator[int]:
+        """Live doc IDs, without decoding any keys"""
+        removed = set(self._removed.values())
+        for doc_id in range(self._snapshot.doc_count):
+            if doc_id not in removed:
+                yield doc_id
+        yield from self._added.values()
+
+class SnapshotDocuments(MutableMapping):
+    """Documents of one source, decoded from the snapshot on access
+
+    Writes and deletes are kept in a small overlay so live updates work on
+    top of the shared, read-only mapping.
+    """
+
+    def __init__(self, snapshot: "IndexSnapshot", source: str):
+        self._snapshot = snapshot
+        self._source = source
+        self._overlay: Dict[str, Dict[str, Any]] = {}
+        self._deleted = set()
+
+    def _base_keys(self) -> Iterator[str]:
+        for doc_id in self._snapshot.source_docs(self._source):
+            yield self._snapshot.doc_key(doc_id)[1]
+
+    def _base_id(self, key: object) -> int:
+        if not isinstance(key, str):
+            return -1
+        return self._snapshot.find_doc((self._source, key))
+
+    def __getitem__(self, key: str) -> Dict[str, Any]:
+        if key in self._overlay:
+            return self._overlay[key]
+        doc_id = -1 if key in self._deleted else self._base_id(key)
+        if doc_id < 0:
+            raise KeyError(key)
+        return self._snapshot.document(doc_id)
+
+    def __setitem__(self, key: str, value: Dict[str, Any]):
+        self._overlay[key] = value
+        self._deleted.discard(key)
+
+    def __delitem__(self, key: str):
+        if key not in self:
+            raise KeyError(key)
+        self._overlay.pop(key, None)
+        if self._base_id(key) >= 0:
+            self._deleted.add(key)
+
+    def __contains__(self, key: object) -> bool:
+        if key in self._overlay:
+            return True
+        return key not in self._deleted and self._base_id(key) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        for key in self._base_keys():
+            if key not in self._deleted and key not in self._overlay:
+                yield key
+        yield from self._overlay
+
+    def __len__(self) -> int:
+        base = sum(1 for key in self._base_keys() if key not in self._deleted and key not in self._overlay)
+        return base + len(self._overlay)
+
+    def copy(self) -> "SnapshotDocuments":
+        """Point-in-time copy that shares the mapped base"""
+        clone = SnapshotDocuments(self._snapshot, self._source)
+        clone._overlay = dict(self._overlay)
+        clone._deleted = set(self._deleted)
+        return clone
+
+class IndexSnapshot:
+    """A memory-mapped snapshot file"""
+
+    def __init__(
+        self,
+        path: str,
+        expected_version: Optional[str] = None,
+        expected_fingerprint: Optional[str] = None
+    ):
+        self.path = path
+        try:
+            with open(path, "rb") as f:
+                self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            raise SnapshotError(f"Cannot map snapshot {path}: {e}") from e
+
+        if len(self.buffer) < _PREAMBLE.size:
+            raise SnapshotError(f"Truncated snapshot {path}")
+        magic, fmt, header_len = _PREAMBLE.unpack_from(self.buffer, 0)
+        if magic != SNAPSHOT_MAGIC or fmt != SNAPSHOT_FORMAT:
+            raise SnapshotError(f"Unsupported snapshot format in {path}")
+
+        try:
+            self.header = json.loads(self.buffer[_PREAMBLE.size:_PREAMBLE.size + header_len])
+            self._validate(expected_version, expected_fingerprint)
+        except (KeyError, TypeError, ValueError) as e:
+            raise SnapshotError(f"Corrupt snapshot header in {path}: {e!r}") from e
+
+    def _validate(self, expected_version: Optional[str], expected_fingerprint: Optional[str]):
+        """Check the header against this build and map the per-document sections
+
+        Malformed field values surface as KeyError/TypeError/ValueError,
+        which the caller reports as a corrupt header.
+        """
+        path = self.path
+        if not isinstance(self.header, dict):
+            raise SnapshotError(f"Corrupt snapshot header in {path}")
+        missing = [field for field in _HEADER_FIELDS if field not in self.header]
+        if missing:
+            raise SnapshotError(f"Snapshot {path} header is missing {', '.join(missing)}")
+        if self.header["byteorder"] != sys.byteorder:
+            raise SnapshotError(f"Snapshot {path} was written on a different byte order")
+        if expected_version is not None and self.header["index_version"] != expected_version:
+            raise SnapshotError(
+                f"Snapshot {path} is version {self.header['index_version']}, expected {expected_version}"
+            )
+        if expected_fingerprint is not None and self.header["fingerprint"] != expected_fingerprint:
+            raise SnapshotError(f"Snapshot {path} was built from different content")
+        sections = self.header["sections"]
+        required = list(_SECTIONS) + [f"facet:{name}" for name in self.header["facets"]]
+        missing = [name for name in required if name not in sections]
+        if missing:
+            raise SnapshotError(f"Snapshot {path} is missing sections {', '.join(missing)}")
+        end = max(start + size for start, size in sections.values())
+        if end > len(self.buffer):
+            raise SnapshotError(f"Truncated snapshot {path}")
+
+        self._view = memoryview(self.buffer)
+        self.doc_count = self.header["documents"]
+        self._doc_offsets = self.section("doc_offsets", "Q")
+        self._doc_base = self.header["sections"]["doc_blob"][0]
+        self._key_offsets = self.section("key_offsets", "Q")
+        self._key_base = self.header["sections"]["key_blob"][0]
+        self._key_order = self.section("key_order", "I")
+
+    def section(self, name: str, typecode: str) -> memoryview:
+        """Zero-copy typed view of a section"""
+        start, size = self.header["sections"][name]
+        return self._view[start:start + size].cast(typecode)
+
+    def document(self, doc_id: int) -> Dict[str, Any]:
+        base = self._doc_base
+        start = base + self._doc_offsets[doc_id]
+        end = base + self._doc_offsets[doc_id + 1]
+        return json.loads(self.buffer[start:end])
+
+    def _key_bytes(self, doc_id: int) -> bytes:
+        base = self._key_base
+        return self.buffer[base + self._key_offsets[doc_id]:base + self._key_offsets[doc_id + 1]]
+
+    def doc_key(self, doc_id: int) -> Tuple[str, str]:
+        source, key = self._key_bytes(doc_id).decode("utf-8").split("\x00", 1)
+        return source, key
+
+    def _lower_bound(self, target: bytes) -> int:
+        """First position in key order whose key is not below target"""
+        lo, hi = 0, self.doc_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_bytes(self._key_order[mid]) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find_doc(self, doc_key: object) -> int:
+        """Doc ID of a (source, key) pair, or -1"""
+        if not (isinstance(doc_key, tuple) and len(doc_key) == 2
+                and all(isinstance(part, str) for part in doc_key)):
+            return -1
+        target = _encode_key(doc_key)
+        position = self._lower_bound(target)
+        if position < self.doc_count and self._key_bytes(self._key_order[position]) == target:
+            return self._key_order[position]
+        return -1
+
+    def source_docs(self, source: str) -> memoryview:
+        """Doc IDs of one source, in key order"""
+        prefix = source.encode("utf-8")
+        lo = self._lower_bound(prefix + b"\x00")
+        hi = self._lower_bound(prefix + b"\x01")
+        return self._key_order[lo:hi]
+
+    def _matrix(self, name: str, rows: int, dimension: int) -> np.ndarray:
+        start, _ = self.header["sections"][name]
+        return np.frombuffer(
+            self.buffer, dtype=np.float32, count=rows * dimension, offset=start
+        ).reshape(rows, dimension)
+
+    def restore_vectors(self, embedder_name: str, dimension: int, **kwargs) -> Optional[VectorIndex]:
+        """Vector index over the mapped embedding matrix
+
+        Returns None when the snapshot holds no vectors or they were produced
+        by a different embedder, in which case the caller must re-embed.
+        """
+        meta = self.header["vectors"]
+        if meta["rows"] == 0 or meta["embedder"] != embedder_name or meta["dimension"] != dimension:
+            return None
+        doc_keys = [self.doc_key(doc_id) for doc_id in self.section("vector_docs", "I")]
+        matrix = self._matrix("vectors", meta["rows"], dimension)
+        centroids = self._matrix("centroids", meta["nlist"], dimension) if meta["nlist"] else None
+        return VectorIndex.from_arrays(matrix, doc_keys, centroids, **kwargs)
+
+    def restore(self) -> Tuple[InvertedIndex, Dict[str, SnapshotDocuments]]:
+        """Rebuild a live index and knowledge store backed by this snapshot
+
+        Per-document bookkeeping (keys, lengths, facet ordinals) stays in
+        the mapping, so restoring costs the same however large the corpus.
+        """
+        header = self.header
+        index = InvertedIndex(k1=header["k1"], b=header["b"])
+
+        index.segments = [MappedSegment(self), Segment()]
+        index.doc_keys = MappedDocKeys(self)
+        index.key_to_id = MappedKeyIndex(self)
+        index.doc_lengths = MappedArray(self.section("doc_lengths", "I"))
+        index.total_length = header["total_length"]
+        for name, values in header["facets"].items():
+            field = FacetField()
+            field.values = values
+            field.value_ids = {value: ordinal for ordinal, value in enumerate(values) if ordinal}
+            ordinals = self.section(f"facet:{name}", "I")
+            field.ordinals = MappedArray(ordinals)
+            field.counts = array("I", np.bincount(
+                np.frombuffer(ordinals, dtype=np.uint32), minlength=len(values)
+            ).tolist())
+            index.facets[name] = field
+
+        store = {source: SnapshotDocuments(self, source) for source in header["sources"]}
+        return index, store
+
+def load_snapshot(
+    path: str,
+    expected_version: Optional[str] = None,
+    expected_fingerprint: Optional[str] = None
+) -> IndexSnapshot:
+    """Map a snapshot file, validating format, version and content fingerprint"""
+    if not os.path.exists(path):
+        raise SnapshotError(f"No snapshot at {path}")
+    return IndexSnapshot(path, expected_version=expected_version, expected_fingerprint=expected_fingerprint)
@@ -0,0 +1,342 @@
+"""
+Bulk regulation ingestion for M21-1 and 38 CFR exports
+Streams HTML, XML or plain-text sources section by section into the index
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import re
+import time
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from typing import Dict, Any, List, Optional, Tuple, Iterator, Iterable
+import numpy as np
+import structlog
+
+from app.core.config import settings
+from app.services.knowledge_base import KnowledgeBaseService, document_fields, document_passages
+from app.services.search_index import analyze
+from app.services.vector_index import create_embedder
+
+logger = structlog.get_logger()
+
+# "§ 3.303 Principles ..." or "III.iv.4.C.3 Rating ..." (optionally "M21-1, III.iv...")
+CITATION_PATTERN = re.compile(
+    r"^\s*(?:§+\s*(?P<cfr>\d+\.\d+[a-z]?)"
+    r"|(?:M21-1[,\s]*)?(?P<m21>[IVX]+\.[ivx]+\.\d+\.[A-Z](?:\.\d+)?))"
+    r"[\s.:\-]*(?P<title>.*)$"
+)
+
+HTML_HEADINGS = frozenset({"h1", "h2", "h3", "h4"})
+HTML_SKIPPED = frozenset({"script", "style", "nav", "header", "footer"})
+HTML_BREAKS = frozenset({"p", "div", "li", "br", "tr", "table", "ul", "ol"})
+XML_SECTIONS = frozenset({"DIV8", "SECTION"})
+XML_HEADINGS = frozenset({"HEAD", "SUBJECT"})
+
+READ_SIZE = 1 << 20
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")[:80] or "section"
+
+def make_section(heading: str, body: str, category: str) -> Optional[Dict[str, Any]]:
+    """Knowledge base document for one parsed section (None if empty)"""
+    heading = _normalize(heading)
+    content = _normalize(body)
+    if not heading or not content:
+        return None
+
+    match = CITATION_PATTERN.match(heading)
+    citation = match and (match.group("cfr") or match.group("m21"))
+    if citation:
+        key = citation
+        title = match.group("title").rstrip(".") or heading
+    else:
+        key = _slug(heading)
+        title = heading
+
+    return {
+        "key": key,
+        "title": title,
+        "content": content,
+        "category": category,
+        "tags": [citation] if citation else []
+    }
+
+class _HTMLSectionParser(HTMLParser):
+    """Splits an HTML export into sections at h1-h4 headings"""
+
+    def __init__(self, category: str):
+        super().__init__(convert_charrefs=True)
+        self.category = category
+        self.sections: List[Dict[str, Any]] = []
+        self._heading: Optional[List[str]] = None
+        self._title = ""
+        self._body: List[str] = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in HTML_SKIPPED:
+            self._skip += 1
+        elif tag in HTML_HEADINGS:
+            self.flush()
+            self._heading = []
+        elif tag in HTML_BREAKS:
+            self._body.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag in HTML_SKIPPED:
+            self._skip = max(0, self._skip - 1)
+        elif tag in HTML_HEADINGS and self._heading is not None:
+            self._title = "".join(self._heading)
+            self._heading = None
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        if self._heading is not None:
+            self._heading.append(data)
+        else:
+            self._body.append(data)
+
+    def flush(self):
+        """Emit the section collected so far"""
+        section = make_section(self._title, "".join(self._body), self.category)
+        if section:
+            self.sections.append(section)
+        self._title = ""
+        self._body = []
+
+def parse_html(path: str, category: str) -> Iterator[Dict[str, Any]]:
+    """Stream sections from an HTML export, READ_SIZE characters at a time"""
+    parser = _HTMLSectionParser(category)
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        while True:
+            data = f.read(READ_SIZE)
+            if not data:
+                break
+            parser.feed(data)
+            yield from parser.sections
+            parser.sections.clear()
+    parser.close()
+    parser.flush()
+    yield from parser.sections
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+def parse_xml(path: str, category: str) -> Iterator[Dict[str, Any]]:
+    """Stream sections from an eCFR / GPO bulk XML export
+
+    Section elements are cleared once emitted, so memory stays flat
+    regardless of file size.
+    """
+    for _, elem in ET.iterparse(path, events=("end",)):
+        if _local_name(elem.tag) not in XML_SECTIONS:
+            continue
+        heading_parts = []
+        body_parts = []
+        for child in elem:
+            name = _local_name(child.tag)
+            text = " ".join(child.itertext())
+            if name == "SECTNO" or name in XML_HEADINGS:
+                heading_parts.append(text)
+            else:
+                body_parts.append(text)
+        elem.clear()
+        section = make_section(" ".join(heading_parts), " ".join(body_parts), category)
+        if section:
+            yield section
+
+def parse_text(path: str, category: str) -> Iterator[Dict[str, Any]]:
+    """Stream sections from plain text, starting one at each citation line"""
+    heading = ""
+    body: List[str] = []
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            # Headings start at column 0; indented citations are body text
+            if not line[:1].isspace() and CITATION_PATTERN.match(line):
+                section = make_section(heading, "".join(body), category)
+                if section:
+                    yield section
+                heading, body = line, []
+            else:
+                body.append(line)
+    section = make_section(heading, "".join(body), category)
+    if section:
+        yield section
+
+PARSERS = {
+    ".html": parse_html,
+    ".htm": parse_html,
+    ".xml": parse_xml
+}
+
+def iter_sections(paths: Iterable[str], category: str) -> Iterator[Dict[str, Any]]:
+    """Sections from every file, with duplicate keys made unique per file"""
+    for path in paths:
+        parser = PARSERS.get(os.path.splitext(path)[1].lower(), parse_text)
+        seen: Dict[str, int] = {}
+        for section in parser(path, category):
+            key = section["key"]
+            seen[key] = seen.get(key, 0) + 1
+            if seen[key] > 1:
+                section["key"] = f"{key}-{seen[key]}"
+            yield section
+
+def iter_batches(sections: Iterator[Dict[str, Any]], batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    batch = []
+    for section in sections:
+        batch.append(section)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+_worker_embedder = None
+
+def analyze_batch(
+    sections: List[Dict[str, Any]],
+    embedder_name: str,
+    dimension: int
+) -> List[Tuple[Dict[str, int], int, Dict[str, List[int]], Optional[np.ndarray]]]:
+    """Tokenize and embed a batch of sections (runs in a worker process)"""
+    global _worker_embedder
+    if _worker_embedder is None or _worker_embedder.name != embedder_name:
+        _worker_embedder = create_embedder(embedder_name, dimension)
+
+    analyzed = []
+    for section in sections:
+        term_freqs, length, term_positions = analyze(document_fields(section))
+        passages = document_passages(section)
+        vectors = _worker_embedder.embed(passages) if passages else None
+        analyzed.append((term_freqs, length, term_positions, vectors))
+    return analyzed
+
+class IngestionPipeline:
+    """Streams source files through a process pool into a knowledge base
+
+    Parsing runs on a helper thread one batch at a time, tokenizing and
+    embedding run in worker processes, and at most max_pending batches
+    are in flight, so working memory is bounded by batch size rather than
+    by the size of the source files.
+    """
+
+    def __init__(
+        self,
+        kb_service: KnowledgeBaseService,
+        workers: int = settings.KB_INGEST_WORKERS,
+        batch_size: int = settings.KB_INGEST_BATCH_SIZE,
+        max_pending: int = settings.KB_INGEST_MAX_PENDING_BATCHES
+    ):
+        self.kb_service = kb_service
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_pending = max(1, max_pending)
+
+    async def run(
+        self,
+        paths: List[str],
+        source: str,
+        category: str = "regulation"
+    ) -> Dict[str, Any]:
+        """Ingest paths under source and return a throughput report"""
+        kb = self.kb_service
+        if not kb.initialized:
+            await kb.initialize()
+
+        missing = [path for path in paths if not os.path.isfile(path)]
+        if missing:
+            raise FileNotFoundError(f"Source files not found: {', '.join(missing)}")
+
+        started = time.perf_counter()
+        total_bytes = sum(os.path.getsize(path) for path in paths)
+        embedder = kb.embedder
+        loop = asyncio.get_running_loop()
+        pool = None
+        if self.workers > 1:
+            pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+
+        batches = iter_batches(iter_sections(paths, category), self.batch_size)
+        pending: deque = deque()
+        sections = 0
+
+        def apply(batch: List[Dict[str, Any]], analyzed) -> int:
+            for section, (term_freqs, length, term_positions, vectors) in zip(batch, analyzed):
+                document = {field: section[field] for field in ("title", "content", "category", "tags")}
+                kb.add_analyzed(
+                    source, section["key"], document, term_freqs, length, term_positions, vectors
+                )
+            return len(batch)
+
+        try:
+            while True:
+                batch = await asyncio.to_thread(next, batches, None)
+                if batch is None:
+                    break
+                future = loop.run_in_executor(
+                    pool, analyze_batch, batch, embedder.name, embedder.dimension
+                )
+                pending.append((batch, future))
+                # Apply in submission order so later duplicates win
+                while len(pending) >= self.max_pending:
+                    done_batch, done_future = pending.popleft()
+                    sections += apply(done_batch, await done_future)
+            while pending:
+                done_batch, done_future = pending.popleft()
+                sections += apply(done_batch, await done_future)
+        finally:
+            for _, future in pending:
+                future.cancel()
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+        indexed = time.perf_counter()
+        snapshot = await kb.optimize()
+        elapsed = time.perf_counter() - started
+
+        report = {
+            "source": source,
+            "files": len(paths),
+            "sections": sections,
+            "bytes": total_bytes,
+            "parse_index_seconds": round(indexed - started, 3),
+            "total_seconds": round(elapsed, 3),
+            "sections_per_second": round(sections / elapsed, 1) if elapsed else 0.0,
+            "mb_per_second": round(total_bytes / 1e6 / elapsed, 2) if elapsed else 0.0,
+            "snapshot": snapshot
+        }
+        logger.info("Knowledge base ingestion complete", **report)
+        return report
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Ingest M21-1 / 38 CFR exports into the knowledge base")
+    parser.add_argument("paths", nargs="+", help="HTML, XML or text export files")
+    parser.add_argument("--source", required=True, help='Source name, e.g. "M21-1" or "38CFR"')
+    parser.add_argument("--category", default="regulation")
+    parser.add_argument("--workers", type=int, default=settings.KB_INGEST_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=settings.KB_INGEST_BATCH_SIZE)
+    parser.add_argument("--snapshot-dir", default=settings.KB_SNAPSHOT_DIR)
+    args = parser.parse_args(argv)
+
+    async def run() -> Dict[str, Any]:
+        kb = KnowledgeBaseService(snapshot_dir=args.snapshot_dir)
+        pipeline = IngestionPipeline(kb, workers=args.workers, batch_size=args.batch_size)
+        return await pipeline.run(args.paths, source=args.source, category=args.category)
+
+    report = asyncio.run(run())
+    for name, value in report.items():
+        print(f"{name:>22}: {value}")
+
+if __name__ == "__main__":
+    main()
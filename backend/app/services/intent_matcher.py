@@ -0,0 +1,112 @@
+"""
+Intent matcher
+Aho-Corasick automaton over keyword pattern tables for one-pass intent routing
+"""
+
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+IntentTable = Sequence[Tuple[str, float, Sequence[str]]]
+
+class IntentMatcher:
+    """Finds every pattern occurring in a message in a single scan
+
+    Built once from a table of (intent, weight, patterns) rows. Matching
+    is case-insensitive substring matching, as with `pattern in message`,
+    but costs O(len(message)) however many patterns the table holds.
+
+    Results are ranked by weight; rows with equal weight keep table order,
+    so a table written as an if/elif chain keeps its precedence.
+    """
+
+    def __init__(self, table: IntentTable):
+        self.intents: List[str] = []
+        self.weights: List[float] = []
+        self.patterns: List[str] = []
+        self._pattern_intents: List[int] = []
+
+        # Trie edges; later turned into full DFA transitions
+        self._delta: List[Dict[str, int]] = [{}]
+        self._outputs: List[Tuple[int, ...]] = [()]
+
+        for intent, weight, patterns in table:
+            intent_id = len(self.intents)
+            self.intents.append(intent)
+            self.weights.append(weight)
+            for pattern in patterns:
+                pattern = pattern.lower()
+                if not pattern:
+                    continue
+                self._insert(pattern, len(self.patterns))
+                self.patterns.append(pattern)
+                self._pattern_intents.append(intent_id)
+
+        self._build()
+        # Tie-break by table order
+        self._rank = sorted(range(len(self.intents)), key=lambda i: (-self.weights[i], i))
+
+    def _insert(self, pattern: str, pattern_id: int):
+        state = 0
+        for char in pattern:
+            next_state = self._delta[state].get(char)
+            if next_state is None:
+                next_state = len(self._delta)
+                self._delta[state][char] = next_state
+                self._delta.append({})
+                self._outputs.append(())
+            state = next_state
+        self._outputs[state] += (pattern_id,)
+
+    def _build(self):
+        """Compute failure links and fold them into the transition tables"""
+        trie = self._delta
+        fail = [0] * len(trie)
+        order: List[int] = []
+        queue = deque(trie[0].values())
+        while queue:
+            state = queue.popleft()
+            order.append(state)
+            for char, child in trie[state].items():
+                queue.append(child)
+                if state:
+                    target = fail[state]
+                    while target and char not in trie[target]:
+                        target = fail[target]
+                    fail[child] = trie[target].get(char, 0)
+                self._outputs[child] += self._outputs[fail[child]]
+
+        # Breadth-first order guarantees a state's failure state is complete
+        delta = [dict(edges) for edges in trie]
+        for state in order:
+            delta[state] = {**delta[fail[state]], **trie[state]}
+        self._delta = delta
+
+    def scan(self, text: str) -> List[int]:
+        """Ids of every pattern occurring in text (with repeats)"""
+        delta = self._delta
+        outputs = self._outputs
+        state = 0
+        found: List[int] = []
+        for char in text.lower():
+            state = delta[state].get(char, 0)
+            if outputs[state]:
+                found.extend(outputs[state])
+        return found
+
+    def match(self, text: str) -> List[Dict[str, object]]:
+        """Every matched intent with its weight and patterns, best first"""
+        hits: Dict[int, List[str]] = {}
+        for pattern_id in self.scan(text):
+            matched = hits.setdefault(self._pattern_intents[pattern_id], [])
+            pattern = self.patterns[pattern_id]
+            if pattern not in matched:
+                matched.append(pattern)
+        return [
+            {"intent": self.intents[i], "weight": self.weights[i], "patterns": hits[i]}
+            for i in self._rank if i in hits
+        ]
+
+    def best(self, text: str) -> Optional[Dict[str, object]]:
+        """Highest-ranked matched intent, or None"""
+        matches = self.match(text)
+        return matches[0] if matches else None
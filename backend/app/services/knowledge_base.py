@@ -4,23 +4,68 @@ Secure, indexed knowledge retrieval system
 """
 
 import asyncio
-from typing import Dict, Any, List, Optional
+import re
+from typing import Dict, Any, List, Optional, Tuple
 import json
 import hashlib
 import numpy as np
 from datetime import datetime
 import structlog
 
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.services.search_index import (
+    InvertedIndex, ParsedQuery, merge_segments, parse_query, tokenize
+)
+from app.services.vector_index import VectorIndex, chunk_text, create_embedder
+from app.services.index_snapshot import (
+    SnapshotDocuments, SnapshotError, load_snapshot, snapshot_path, write_snapshot
+)
+
 logger = structlog.get_logger()
 
+# Term frequency multipliers per field (title matches outrank body matches)
+FIELD_WEIGHTS = {"title": 2, "tags": 2, "content": 1}
+
+# Trailing word still being typed (nothing once the user types a space)
+PARTIAL_TERM_PATTERN = re.compile(r"([a-z0-9][a-z0-9&.\-']*)$")
+
+def document_fields(item: Dict[str, Any]) -> List[Tuple[str, int]]:
+    """Weighted text fields indexed for a document"""
+    return [
+        (item["title"], FIELD_WEIGHTS["title"]),
+        (" ".join(item.get("tags", [])), FIELD_WEIGHTS["tags"]),
+        (item["content"], FIELD_WEIGHTS["content"])
+    ]
+
+def document_passages(item: Dict[str, Any]) -> List[str]:
+    """Overlapping passages of a document that are embedded for vector search"""
+    return chunk_text(
+        f"{item['title']}. {item['content']}",
+        settings.KB_CHUNK_SIZE,
+        settings.KB_CHUNK_OVERLAP
+    )
+
 class KnowledgeBaseService:
     """Service for managing and querying VA knowledge base"""
     
-    def __init__(self):
+    def __init__(self, snapshot_dir: Optional[str] = settings.KB_SNAPSHOT_DIR):
         self.knowledge_store = {}
-        self.embeddings = {}
+        self.embedder = create_embedder(settings.KB_EMBEDDER, settings.KB_LOCAL_EMBEDDING_DIMENSION)
+        self.vector_index = self._new_vector_index()
+        self.search_index = InvertedIndex()
+        self.query_cache = TTLCache(
+            max_size=settings.KB_QUERY_CACHE_SIZE,
+            ttl_seconds=settings.KB_QUERY_CACHE_TTL_SECONDS
+        )
         self.index_version = "1.0.0"
+        self.content_fingerprint: Optional[str] = None
         self.initialized = False
+        self.snapshot_dir = snapshot_dir
+        self.snapshot = None
+        self._compaction_task: Optional[asyncio.Task] = None
+        # Held by optimize() and background compaction so merges never overlap
+        self._compaction_lock = asyncio.Lock()
         
     async def initialize(self):
         """Initialize knowledge base with M21/CFR content"""
@@ -35,9 +80,20 @@ class KnowledgeBaseService:
         # Load VA procedures
         await self._load_va_procedures()
         
+        self.content_fingerprint = self._content_fingerprint()
+        
+        # Fast path: map a prebuilt snapshot shared by all worker processes
+        if self._load_snapshot():
+            self.initialized = True
+            logger.info("Knowledge base loaded from snapshot", path=self.snapshot.path)
+            return
+        
         # Build search index
         await self._build_search_index()
         
+        # Persist so the next worker start skips the rebuild
+        await self.save_snapshot()
+        
         self.initialized = True
         logger.info("Knowledge base initialized successfully")
     
@@ -141,123 +197,356 @@ class KnowledgeBaseService:
         }
     
     async def _build_search_index(self):
-        """Build search index for efficient retrieval"""
-        # In production, this would use vector embeddings
-        # For now, we'll create a simple inverted index
-        self.search_index = {}
+        """Build BM25 inverted index and vector index for efficient retrieval"""
+        self.search_index = InvertedIndex()
+        self.vector_index = self._new_vector_index()
+        self.query_cache.clear()
         
         for source, content in self.knowledge_store.items():
             for key, item in content.items():
-                # Index by tags
-                for tag in item.get("tags", []):
-                    if tag not in self.search_index:
-                        self.search_index[tag] = []
-                    self.search_index[tag].append({
-                        "source": source,
-                        "key": key,
-                        "title": item["title"]
-                    })
-                
-                # Index by words in title and content
-                words = (item["title"] + " " + item["content"]).lower().split()
-                for word in set(words):
-                    if len(word) > 3:  # Only index words longer than 3 chars
-                        if word not in self.search_index:
-                            self.search_index[word] = []
-                        self.search_index[word].append({
-                            "source": source,
-                            "key": key,
-                            "title": item["title"]
-                        })
+                self.search_index.add_document(
+                    (source, key),
+                    document_fields(item),
+                    facets=self._document_facets(source, item)
+                )
+                self._index_vectors((source, key), item)
+        
+        # A full build ends as a single merged segment
+        self.search_index.compact()
+        self.vector_index.maintain()
+        logger.info("Search index built", **self.search_index.get_stats())
+        logger.info("Vector index built", **self.vector_index.get_stats())
+    
+    def _new_vector_index(self) -> VectorIndex:
+        return VectorIndex(
+            dimension=self.embedder.dimension,
+            nprobe=settings.KB_VECTOR_NPROBE
+        )
+    
+    def _index_vectors(self, doc_key: Tuple[str, str], item: Dict[str, Any]):
+        """Chunk, embed and (re)index one document's passages"""
+        self.vector_index.remove(doc_key)
+        chunks = document_passages(item)
+        if chunks:
+            self.vector_index.add(doc_key, self.embedder.embed(chunks))
+    
+    def _content_fingerprint(self) -> str:
+        """Hash of the seed documents and the settings that shape the index"""
+        build = {
+            "documents": self.knowledge_store,
+            "field_weights": FIELD_WEIGHTS,
+            "chunking": [settings.KB_CHUNK_SIZE, settings.KB_CHUNK_OVERLAP]
+        }
+        return hashlib.blake2b(
+            json.dumps(build, sort_keys=True).encode("utf-8"), digest_size=16
+        ).hexdigest()
+    
+    def _load_snapshot(self) -> bool:
+        """Restore the index and documents from the snapshot for index_version
+        
+        A snapshot built from different seed content is stale and rejected,
+        so the caller rebuilds and overwrites it.
+        """
+        if not self.snapshot_dir:
+            return False
+        
+        path = snapshot_path(self.snapshot_dir, self.index_version)
+        try:
+            snapshot = load_snapshot(
+                path,
+                expected_version=self.index_version,
+                expected_fingerprint=self.content_fingerprint
+            )
+            self.search_index, self.knowledge_store = snapshot.restore()
+        except SnapshotError as e:
+            logger.info(f"No usable index snapshot: {e}")
+            return False
+        self.query_cache.clear()
+        
+        vector_index = snapshot.restore_vectors(
+            self.embedder.name,
+            self.embedder.dimension,
+            nprobe=settings.KB_VECTOR_NPROBE
+        )
+        if vector_index is None:
+            # Embedder changed since the snapshot was written; re-embed
+            logger.warning("Snapshot vectors unusable, re-embedding documents")
+            vector_index = self._new_vector_index()
+            self.vector_index = vector_index
+            for source, docs in self.knowledge_store.items():
+                for key, item in docs.items():
+                    self._index_vectors((source, key), item)
+            vector_index.maintain()
+        self.vector_index = vector_index
+        
+        self.snapshot = snapshot
+        return True
+    
+    async def save_snapshot(self) -> Optional[str]:
+        """Write the current index to a versioned snapshot file"""
+        if not self.snapshot_dir:
+            return None
+        
+        path = snapshot_path(self.snapshot_dir, self.index_version)
+        index = self.search_index.frozen_copy()
+        store = {
+            source: docs.copy() if isinstance(docs, SnapshotDocuments) else dict(docs)
+            for source, docs in self.knowledge_store.items()
+        }
+        try:
+            await asyncio.to_thread(
+                write_snapshot, path, index, store, self.index_version,
+                vectors=self.vector_index, embedder_name=self.embedder.name,
+                fingerprint=self.content_fingerprint
+            )
+        except OSError as e:
+            logger.warning(f"Could not write index snapshot: {e}")
+            return None
+        return path
+    
+    @staticmethod
+    def _document_facets(source: str, item: Dict[str, Any]) -> Dict[str, str]:
+        """Facet values a document is partitioned by"""
+        return {"source": source, "category": item["category"]}
     
     async def query(
         self,
         query: str,
         categories: Optional[List[str]] = None,
-        top_k: int = 5
+        top_k: int = 5,
+        mode: Optional[str] = None
     ) -> Dict[str, Any]:
-        """Query knowledge base with security and relevance ranking"""
+        """Query knowledge base with security and relevance ranking
+        
+        mode is "keyword" (BM25), "vector" (embedding similarity) or
+        "hybrid" (both, blended by KB_HYBRID_KEYWORD_WEIGHT). Keyword
+        matching understands "exact phrases", "near words"~N and +required
+        terms; in hybrid mode those constraints also filter vector hits.
+        """
         
         if not self.initialized:
             await self.initialize()
         
-        query_lower = query.lower()
-        query_words = query_lower.split()
-        
-        # Find matching documents
-        matches = []
-        seen = set()
-        
-        for word in query_words:
-            if word in self.search_index:
-                for match in self.search_index[word]:
-                    match_key = f"{match['source']}:{match['key']}"
-                    if match_key not in seen:
-                        seen.add(match_key)
-                        
-                        # Get full content
-                        content = self.knowledge_store[match["source"]][match["key"]]
-                        
-                        # Check category filter
-                        if categories and content["category"] not in categories:
-                            continue
-                        
-                        # Calculate relevance score (simplified)
-                        score = self._calculate_relevance(query_lower, content)
-                        
-                        matches.append({
-                            "source": f"{match['source']} {match['key']}",
-                            "title": content["title"],
-                            "content": content["content"],
-                            "category": content["category"],
-                            "tags": content["tags"],
-                            "score": score,
-                            "section": match["key"]
-                        })
-        
-        # Sort by relevance and return top K
-        matches.sort(key=lambda x: x["score"], reverse=True)
-        top_matches = matches[:top_k]
+        mode = mode or settings.KB_SEARCH_MODE
+        parsed = parse_query(query)
+        
+        # Hot questions repeat constantly; serve them without re-scoring
+        cache_key = (
+            self.search_index.generation,
+            parsed.key(),
+            tuple(sorted(set(categories))) if categories else None,
+            top_k,
+            mode
+        )
+        cached = self.query_cache.get(cache_key)
+        if cached is not None:
+            return self._query_response(query, *cached)
+        
+        # Misspelled words that match nothing are swapped for the closest term
+        corrections = self._correct_terms(parsed)
+        if corrections:
+            parsed = parsed.rewrite(corrections)
+        
+        facet_filter = self._category_filter(categories)
+        
+        if mode == "keyword":
+            # Rank with BM25; only the top K documents are ever materialized
+            hits, total_found = self.search_index.search_query(
+                parsed,
+                top_k=top_k,
+                facet_filter=facet_filter
+            )
+        else:
+            depth = max(top_k * 4, 20)
+            accept = self.search_index.partition_filter(facet_filter)
+            vector_hits = self._vector_search([query], depth, accept)[0]
+            if mode == "vector":
+                hits, total_found = vector_hits[:top_k], len(vector_hits)
+            else:
+                keyword_hits, keyword_total = self.search_index.search_query(
+                    parsed,
+                    top_k=depth,
+                    facet_filter=facet_filter
+                )
+                if parsed.constrained:
+                    matched = {doc_id for doc_id, _ in keyword_hits}
+                    vector_hits = [hit for hit in vector_hits if hit[0] in matched]
+                hits = self._fuse(keyword_hits, vector_hits, top_k)
+                vector_only = {doc_id for doc_id, _ in vector_hits} - {doc_id for doc_id, _ in keyword_hits}
+                total_found = keyword_total + len(vector_only)
+        
+        top_matches = []
+        for doc_id, score in hits:
+            source, key = self.search_index.doc_keys[doc_id]
+            content = self.knowledge_store[source][key]
+            top_matches.append({
+                "source": f"{source} {key}",
+                "title": content["title"],
+                "content": content["content"],
+                "category": content["category"],
+                "tags": content["tags"],
+                "score": round(score, 4),
+                "section": key
+            })
         
         # Generate summary if matches found
         summary = ""
         if top_matches:
-            summary = f"Found {len(matches)} relevant regulations. "
+            summary = f"Found {total_found} relevant regulations. "
             summary += f"Top result: {top_matches[0]['title']} from {top_matches[0]['source']}."
         
+        self.query_cache.set(cache_key, (top_matches, total_found, summary, mode, corrections))
+        return self._query_response(query, top_matches, total_found, summary, mode, corrections)
+    
+    @staticmethod
+    def _query_response(
+        query: str,
+        matches: List[Dict[str, Any]],
+        total_found: int,
+        summary: str,
+        mode: str,
+        corrections: Dict[str, str]
+    ) -> Dict[str, Any]:
+        """Build a query response; result dicts are copied so callers can't alter the cache"""
         return {
-            "results": top_matches,
-            "total_found": len(matches),
+            "results": [dict(match) for match in matches],
+            "total_found": total_found,
             "summary": summary,
             "query": query,
+            "corrections": dict(corrections),
+            "search_mode": mode,
             "timestamp": datetime.utcnow().isoformat()
         }
     
-    def _calculate_relevance(self, query: str, content: Dict[str, Any]) -> float:
-        """Calculate relevance score for content"""
-        score = 0.0
-        query_words = set(query.split())
-        
-        # Title match
-        title_words = set(content["title"].lower().split())
-        title_overlap = len(query_words & title_words)
-        score += title_overlap * 2.0
-        
-        # Content match
-        content_words = set(content["content"].lower().split())
-        content_overlap = len(query_words & content_words)
-        score += content_overlap * 1.0
-        
-        # Tag match
-        for tag in content["tags"]:
-            if any(word in tag.lower() for word in query_words):
-                score += 1.5
-        
-        # Normalize by query length
-        if len(query_words) > 0:
-            score = score / len(query_words)
-        
-        return min(score, 10.0)  # Cap at 10
+    @staticmethod
+    def _fuzzy_distance(term: str) -> int:
+        """Edits allowed when correcting term (citations and short words are exact)"""
+        if len(term) < 3 or any(char.isdigit() for char in term):
+            return 0
+        return min(settings.KB_FUZZY_MAX_EDITS, 1 if len(term) <= 5 else 2)
+    
+    def _correct_terms(self, parsed: ParsedQuery) -> Dict[str, str]:
+        """Spelling corrections for query terms that have no postings"""
+        corrections = {}
+        for term in parsed.terms:
+            correction = self.search_index.correct(term, self._fuzzy_distance(term))
+            if correction:
+                corrections[term] = correction
+        return corrections
+    
+    async def suggest(self, text: str, limit: int = 8) -> Dict[str, Any]:
+        """Typeahead completions for the word currently being typed"""
+        
+        if not self.initialized:
+            await self.initialize()
+        
+        match = PARTIAL_TERM_PATTERN.search(text.lower())
+        completions = []
+        if match:
+            partial = match.group(1)
+            completions = self.search_index.complete(partial, limit)
+            if not completions:
+                correction = self.search_index.correct(partial, self._fuzzy_distance(partial))
+                completions = [correction] if correction else []
+        head = text[:match.start(1)] if match else text
+        
+        return {
+            "query": text,
+            "completions": completions,
+            "suggestions": [f"{head}{completion}" for completion in completions]
+        }
+    
+    @staticmethod
+    def _category_filter(categories: Optional[List[str]]) -> Optional[Dict[str, List[str]]]:
+        """Facet filter for a category list (None when unfiltered)
+        
+        Callers mix source names ("M21-1", "38CFR") with categories, so a
+        document matches on either its category or its source.
+        """
+        if not categories:
+            return None
+        return {"category": categories, "source": categories}
+    
+    def _vector_search(
+        self,
+        queries: List[str],
+        top_k: int,
+        accept=None
+    ) -> List[List[Tuple[int, float]]]:
+        """Batch semantic search returning (doc_id, cosine) per query
+        
+        Chunk hits are collapsed to their best-scoring document.
+        """
+        if not queries:
+            return []
+        
+        # Over-fetch chunks: several may belong to the same document
+        chunk_hits = self.vector_index.search(
+            self.embedder.embed(queries),
+            top_k=top_k * 3
+        )
+        key_to_id = self.search_index.key_to_id
+        row_keys = self.vector_index.row_keys
+        
+        min_score = settings.KB_VECTOR_MIN_SCORE
+        results = []
+        for hits in chunk_hits:
+            best: Dict[int, float] = {}
+            for row, score in hits:
+                if score < min_score:
+                    break
+                doc_id = key_to_id.get(row_keys[row])
+                if doc_id is None or doc_id in best:
+                    continue
+                if accept is not None and not accept(doc_id):
+                    continue
+                best[doc_id] = score
+            results.append(list(best.items())[:top_k])
+        return results
+    
+    async def semantic_search(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        categories: Optional[List[str]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Embedding search for a batch of queries in one scoring pass"""
+        
+        if not self.initialized:
+            await self.initialize()
+        
+        accept = self.search_index.partition_filter(self._category_filter(categories))
+        batches = self._vector_search(queries, top_k, accept)
+        results = []
+        for hits in batches:
+            matches = []
+            for doc_id, score in hits:
+                source, key = self.search_index.doc_keys[doc_id]
+                matches.append({
+                    "source": f"{source} {key}",
+                    "title": self.knowledge_store[source][key]["title"],
+                    "section": key,
+                    "score": round(score, 4)
+                })
+            results.append(matches)
+        return results
+    
+    @staticmethod
+    def _fuse(
+        keyword_hits: List[Tuple[int, float]],
+        vector_hits: List[Tuple[int, float]],
+        top_k: int
+    ) -> List[Tuple[int, float]]:
+        """Blend max-normalized keyword and vector scores into one ranking"""
+        weight = settings.KB_HYBRID_KEYWORD_WEIGHT
+        fused: Dict[int, float] = {}
+        for hits, share in ((keyword_hits, weight), (vector_hits, 1.0 - weight)):
+            if not hits:
+                continue
+            top_score = hits[0][1] or 1.0
+            for doc_id, score in hits:
+                fused[doc_id] = fused.get(doc_id, 0.0) + share * score / top_score
+        return sorted(fused.items(), key=lambda item: (-item[1], item[0]))[:top_k]
     
     async def add_document(
         self,
@@ -265,7 +554,11 @@ class KnowledgeBaseService:
         key: str,
         document: Dict[str, Any]
     ) -> bool:
-        """Add new document to knowledge base"""
+        """Add or replace a document in the knowledge base
+        
+        Indexing is incremental: only the new document is tokenized, and a
+        replaced version is tombstoned so it can no longer match.
+        """
         
         # Validate document structure
         required_fields = ["title", "content", "category", "tags"]
@@ -277,28 +570,147 @@ class KnowledgeBaseService:
         if source not in self.knowledge_store:
             self.knowledge_store[source] = {}
         
+        replaced = key in self.knowledge_store[source]
         self.knowledge_store[source][key] = document
         
-        # Update search index
-        for tag in document["tags"]:
-            if tag not in self.search_index:
-                self.search_index[tag] = []
-            self.search_index[tag].append({
-                "source": source,
-                "key": key,
-                "title": document["title"]
-            })
+        # Update search index (replaces any previous version of the key)
+        self.search_index.add_document(
+            (source, key),
+            document_fields(document),
+            facets=self._document_facets(source, document)
+        )
+        self._index_vectors((source, key), document)
+        self.query_cache.clear()
+        self._schedule_compaction()
+        
+        logger.info(f"{'Updated' if replaced else 'Added'} document {source}:{key}")
+        return True
+    
+    async def delete_document(self, source: str, key: str) -> bool:
+        """Remove a document from the knowledge base"""
+        
+        if key not in self.knowledge_store.get(source, {}):
+            return False
+        
+        self.search_index.delete_document((source, key))
+        self.vector_index.remove((source, key))
+        del self.knowledge_store[source][key]
+        if not self.knowledge_store[source]:
+            del self.knowledge_store[source]
+        self.query_cache.clear()
+        self._schedule_compaction()
+        
+        logger.info(f"Deleted document {source}:{key}")
+        return True
+    
+    def add_analyzed(
+        self,
+        source: str,
+        key: str,
+        document: Dict[str, Any],
+        term_freqs: Dict[str, int],
+        length: int,
+        term_positions: Dict[str, List[int]],
+        vectors: Optional[np.ndarray] = None
+    ):
+        """Insert a document tokenized and embedded elsewhere (bulk ingestion)
+        
+        Skips compaction and cache invalidation; call optimize() when the
+        batch load is finished.
+        """
+        if source not in self.knowledge_store:
+            self.knowledge_store[source] = {}
+        self.knowledge_store[source][key] = document
+        self.search_index.add_analyzed(
+            (source, key),
+            term_freqs,
+            length,
+            term_positions,
+            facets=self._document_facets(source, document)
+        )
+        self.vector_index.remove((source, key))
+        if vectors is not None and len(vectors):
+            self.vector_index.add((source, key), vectors)
+    
+    async def optimize(self) -> Optional[str]:
+        """Fully merge the index, repartition vectors and write a snapshot
+        
+        Waits for any background compaction to finish first.
+        """
+        self.query_cache.clear()
+        
+        async with self._compaction_lock:
+            await self._merge_index(self.search_index)
+            await asyncio.to_thread(self.vector_index.maintain)
+        self.query_cache.clear()
+        
+        return await self.save_snapshot()
+    
+    async def _merge_index(self, index: InvertedIndex) -> bool:
+        """Merge all sealed segments off the event loop; caller holds _compaction_lock"""
+        plan = index.begin_compaction()
+        if plan.empty:
+            return False
+        try:
+            merged = await asyncio.to_thread(merge_segments, plan.segments, plan.tombstones)
+        except Exception:
+            index.abort_compaction(plan)
+            raise
         
-        logger.info(f"Added document {source}:{key}")
+        # The index may have been rebuilt while the merge ran
+        if index is not self.search_index:
+            return False
+        if not index.finish_compaction(plan, merged):
+            logger.warning("Stale index compaction discarded")
+            return False
         return True
     
+    def _schedule_compaction(self):
+        """Start background index maintenance if either index needs it"""
+        if self._compaction_task and not self._compaction_task.done():
+            return
+        if self.search_index.needs_compaction() or self.vector_index.needs_maintenance():
+            self._compaction_task = asyncio.create_task(self._compact_index())
+    
+    async def _compact_index(self):
+        """Merge sealed segments and repartition vectors off the event loop"""
+        async with self._compaction_lock:
+            if self.vector_index.needs_maintenance():
+                await asyncio.to_thread(self.vector_index.maintain)
+            
+            index = self.search_index
+            if not index.needs_compaction():
+                return
+            try:
+                compacted = await self._merge_index(index)
+            except Exception as e:
+                logger.error(f"Index compaction failed: {e}")
+                return
+            if compacted:
+                logger.info("Search index compacted", **index.get_stats())
+    
     def get_categories(self) -> List[str]:
         """Get all available categories"""
-        categories = set()
-        for source in self.knowledge_store.values():
-            for item in source.values():
-                categories.add(item["category"])
-        return sorted(list(categories))
+        return sorted(self.search_index.facet_counts(["category"]).get("category", {}))
+    
+    async def get_facets(
+        self,
+        query: Optional[str] = None,
+        categories: Optional[List[str]] = None
+    ) -> Dict[str, Dict[str, int]]:
+        """Document counts per source and category
+        
+        With a query, only documents matching any query term are counted.
+        """
+        
+        if not self.initialized:
+            await self.initialize()
+        
+        return self.search_index.facet_counts(
+            ["source", "category"],
+            terms=tokenize(query) if query is not None else None,
+            facet_filter=self._category_filter(categories)
+        )
     
     def get_stats(self) -> Dict[str, Any]:
         """Get knowledge base statistics"""
@@ -311,5 +723,8 @@ class KnowledgeBaseService:
             "sources": list(self.knowledge_store.keys()),
             "categories": self.get_categories(),
             "index_size": len(self.search_index),
+            "index": self.search_index.get_stats(),
+            "vectors": self.vector_index.get_stats(),
+            "query_cache": self.query_cache.get_stats(),
             "version": self.index_version
         }
\ No newline at end of file
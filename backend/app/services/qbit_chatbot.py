@@ -6,14 +6,20 @@ Secure chatbot with M21/CFR knowledge and navigation capabilities
 import asyncio
 import json
 import hashlib
-from typing import Dict, Any, List, Optional, Tuple
+import uuid
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
 from datetime import datetime
 import structlog
 from enum import Enum
 
+from app.core.cache import SingleFlight, TTLCache
 from app.core.security import input_sanitizer
 from app.services.knowledge_base import KnowledgeBaseService
 from app.services.agent_orchestrator import AgentOrchestrator
+from app.services.agent_pool import TaskPriority
+from app.services.chat_log import ChatLog
+from app.services.conversation_store import ConversationStore
+from app.services.intent_matcher import IntentMatcher
 
 logger = structlog.get_logger()
 
@@ -26,13 +32,106 @@ class MessageType(Enum):
     NOTIFICATION = "notification"
     SYSTEM = "system"
 
+def _chunk(kind: str, content: Any) -> Dict[str, Any]:
+    """Partial response frame yielded by streaming handlers"""
+    return {"type": "chunk", "kind": kind, "content": content}
+
+async def _collect(handler: AsyncIterator[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Run a handler to completion, keeping every item it yields"""
+    return [item async for item in handler]
+
+async def _replay(items: List[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+    """Yield copies of memoized handler output so callers can't alter the cache"""
+    for item in items:
+        yield dict(item)
+
+# Reply when the general assistant has nothing specific to say
+GENERAL_CHAT_FALLBACK = (
+    "I'm QBit, your assistant for the NOVA platform. I can help with claims, "
+    "M21-1 and 38 CFR guidance, and finding your way around. How can I help?"
+)
+
+# Replies when an agent sheds load or fails, by the orchestrator's error_code
+AGENT_ERROR_MESSAGES = {
+    "AGENT_OVERLOADED": "QBit is handling a lot of requests right now. Please try again in a few seconds.",
+    "AGENT_TIMEOUT": "That took longer than expected to analyze. Please try again."
+}
+AGENT_ERROR_FALLBACK = "I couldn't complete that analysis. Please try again."
+
+def _agent_error(agent_response: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Error response for a failed agent call, or None if it succeeded"""
+    if "error" not in agent_response:
+        return None
+    error_code = agent_response.get("error_code", "AGENT_ERROR")
+    return {
+        "type": "error",
+        "message": AGENT_ERROR_MESSAGES.get(error_code, AGENT_ERROR_FALLBACK),
+        "error_code": error_code
+    }
+
+# Handlers whose output depends only on the message and the knowledge base
+MEMOIZED_INTENTS = {"navigation", "knowledge"}
+
+# Handlers that call an agent, by the agent role they use
+AGENT_INTENT_ROLES = {"claim_query": "claims_processor", "general": "general_assistant"}
+
+# Intent patterns, highest precedence first: (intent, confidence, patterns)
+INTENT_PATTERNS = (
+    ("navigation", 0.9, [
+        "take me to", "navigate to", "go to", "open",
+        "show me", "where is", "how do i get to"
+    ]),
+    ("claim_query", 0.85, [
+        "claim", "rating", "disability", "compensation",
+        "c&p", "exam", "evidence", "nexus", "service connection"
+    ]),
+    ("knowledge", 0.8, [
+        "what is", "explain", "tell me about", "how does",
+        "m21", "cfr", "regulation", "policy", "procedure"
+    ])
+)
+
+# Navigation mappings
+NAVIGATION_MAP = {
+    "claims": "/claims",
+    "dashboard": "/",
+    "appeals": "/appeals",
+    "quality": "/quality",
+    "metrics": "/metrics",
+    "ai orchestration": "/ai-orchestration",
+    "documents": "/documents",
+    "efolder": "/efolder",
+    "veterans": "/veterans",
+    "settings": "/settings",
+    "help": "/help",
+    "reports": "/reports"
+}
+
+# Compiled once; each message is scanned a single time
+INTENT_MATCHER = IntentMatcher(INTENT_PATTERNS)
+NAVIGATION_MATCHER = IntentMatcher([(key, 1.0, [key]) for key in NAVIGATION_MAP])
+
 class QBitChatbot:
-    """Main QBit chatbot with security and knowledge integration"""
+    """Main QBit chatbot with security and knowledge integration
+
+    One instance serves the whole process (created in the application
+    lifespan); per-conversation state lives in the shared store.
+    """
     
-    def __init__(self, kb_service: KnowledgeBaseService, orchestrator: AgentOrchestrator):
+    def __init__(
+        self,
+        kb_service: KnowledgeBaseService,
+        orchestrator: AgentOrchestrator,
+        conversations: Optional[ConversationStore] = None,
+        chat_log: Optional[ChatLog] = None,
+        response_cache: Optional[TTLCache] = None
+    ):
         self.kb_service = kb_service
         self.orchestrator = orchestrator
-        self.conversation_cache = {}
+        self.conversations = conversations if conversations is not None else ConversationStore()
+        self.chat_log = chat_log
+        self.response_cache = response_cache if response_cache is not None else TTLCache()
+        self.in_flight = SingleFlight()
         
     async def process_message(
         self,
@@ -42,7 +141,35 @@ class QBitChatbot:
         message_type: MessageType = MessageType.CHAT,
         context: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
-        """Process user message with security and context awareness"""
+        """Process user message with security and context awareness
+        
+        Identical requests arriving while one is already being handled
+        share its result instead of querying the knowledge base and
+        agents again.
+        """
+        
+        response = None
+        async for frame in self.stream_message(user_id, session_id, message, message_type, context, coalesce=True):
+            if frame["type"] == "final":
+                response = frame["response"]
+        return response
+    
+    async def stream_message(
+        self,
+        user_id: str,
+        session_id: str,
+        message: str,
+        message_type: MessageType = MessageType.CHAT,
+        context: Optional[Dict[str, Any]] = None,
+        coalesce: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Process user message, yielding chunk frames as they become available
+        
+        Every stream ends with one "final" frame carrying the complete
+        response (the same dict process_message returns). With coalesce,
+        the handler runs to completion (shared with identical in-flight
+        requests) before its chunks are forwarded.
+        """
         
         # Sanitize input
         sanitized_message = input_sanitizer.sanitize_string(message, max_length=2000)
@@ -57,19 +184,51 @@ class QBitChatbot:
             message_hash=message_hash
         )
         
+        stream_id = uuid.uuid4().hex
+        sequence = 0
         try:
             # Determine intent and route appropriately
             intent = await self._analyze_intent(sanitized_message, context)
             
+            # Deterministic handlers are served from cache when possible
+            memo_key = self._memo_key(intent["type"], sanitized_message)
+            cached = self.response_cache.get(memo_key) if memo_key is not None else None
+            produced: List[Dict[str, Any]] = []
+            
             # Process based on intent
-            if intent["type"] == "navigation":
-                response = await self._handle_navigation(sanitized_message, context)
-            elif intent["type"] == "claim_query":
-                response = await self._handle_claim_query(sanitized_message, user_id, context)
-            elif intent["type"] == "knowledge":
-                response = await self._handle_knowledge_query(sanitized_message, context)
+            if cached is not None:
+                handler = _replay(cached)
+            elif coalesce:
+                flight_key = self._flight_key(intent["type"], sanitized_message, user_id, session_id, context)
+                role = AGENT_INTENT_ROLES.get(intent["type"])
+                if role is not None and flight_key in self.in_flight:
+                    # Answered by another request's agent run; still audited per user
+                    self.orchestrator.record_coalesced(
+                        role,
+                        {"query": sanitized_message, "user_context": context},
+                        user_id,
+                        priority=TaskPriority.INTERACTIVE
+                    )
+                items = await self.in_flight.do(
+                    flight_key,
+                    lambda: _collect(self._route(intent["type"], sanitized_message, user_id, session_id, context))
+                )
+                handler = _replay(items)
             else:
-                response = await self._handle_general_chat(sanitized_message, user_id, session_id, context)
+                handler = self._route(intent["type"], sanitized_message, user_id, session_id, context)
+            
+            # Forward chunks; the handler's last item is the full response
+            async for item in handler:
+                if memo_key is not None and cached is None:
+                    produced.append(dict(item))
+                if item["type"] != "chunk":
+                    response = item
+                    continue
+                yield {**item, "stream_id": stream_id, "sequence": sequence}
+                sequence += 1
+            
+            if memo_key is not None and cached is None:
+                self.response_cache.set(memo_key, produced)
             
             # Add security metadata
             response["metadata"] = {
@@ -78,7 +237,9 @@ class QBitChatbot:
                 "confidence": intent["confidence"]
             }
             
-            return response
+            self.conversations.append(user_id, session_id, "user", sanitized_message, intent=intent["type"])
+            self.conversations.append(user_id, session_id, "assistant", response.get("message", ""), type=response.get("type"))
+            await self._log_turns(user_id, session_id, sanitized_message, intent, response)
             
         except Exception as e:
             logger.error(
@@ -87,85 +248,121 @@ class QBitChatbot:
                 user_id=user_id
             )
             
-            return {
+            response = {
                 "type": "error",
                 "message": "I encountered an issue processing your request. Please try again.",
                 "error_code": "PROCESSING_ERROR"
             }
-    
-    async def _analyze_intent(self, message: str, context: Optional[Dict[str, Any]]) -> Dict[str, Any]:
-        """Analyze user intent from message"""
-        message_lower = message.lower()
-        
-        # Navigation intent patterns
-        navigation_patterns = [
-            "take me to", "navigate to", "go to", "open",
-            "show me", "where is", "how do i get to"
-        ]
         
-        # Claim-related patterns
-        claim_patterns = [
-            "claim", "rating", "disability", "compensation",
-            "c&p", "exam", "evidence", "nexus", "service connection"
-        ]
+        yield {
+            "type": "final",
+            "stream_id": stream_id,
+            "chunks": sequence,
+            "response": response
+        }
+    
+    def _route(
+        self,
+        intent: str,
+        message: str,
+        user_id: str,
+        session_id: str,
+        context: Optional[Dict[str, Any]]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Handler for an intent"""
+        if intent == "navigation":
+            return self._handle_navigation(message, context)
+        elif intent == "claim_query":
+            return self._handle_claim_query(message, user_id, context)
+        elif intent == "knowledge":
+            return self._handle_knowledge_query(message, context)
+        return self._handle_general_chat(message, user_id, session_id, context)
+    
+    def _flight_key(
+        self,
+        intent: str,
+        message: str,
+        user_id: str,
+        session_id: str,
+        context: Optional[Dict[str, Any]]
+    ) -> Tuple:
+        """Key under which identical concurrent requests are coalesced
         
-        # Knowledge query patterns
-        knowledge_patterns = [
-            "what is", "explain", "tell me about", "how does",
-            "m21", "cfr", "regulation", "policy", "procedure"
-        ]
+        General chat reads the caller's conversation history, so it is
+        only shared within a session; other intents are shared across users.
+        """
+        scope = (user_id, session_id) if intent == "general" else None
+        fingerprint = json.dumps(context or {}, sort_keys=True, default=str)
+        return (intent, message, fingerprint, scope, self.kb_service.search_index.generation)
+    
+    def _memo_key(self, intent: str, message: str) -> Optional[Tuple]:
+        """Cache key for a deterministic handler, or None if the intent isn't memoized
         
-        # Check patterns
-        if any(pattern in message_lower for pattern in navigation_patterns):
-            return {"type": "navigation", "confidence": 0.9}
-        elif any(pattern in message_lower for pattern in claim_patterns):
-            return {"type": "claim_query", "confidence": 0.85}
-        elif any(pattern in message_lower for pattern in knowledge_patterns):
-            return {"type": "knowledge", "confidence": 0.8}
-        else:
-            return {"type": "general", "confidence": 0.7}
+        Includes the index generation so any knowledge base change
+        invalidates cached answers.
+        """
+        if intent not in MEMOIZED_INTENTS:
+            return None
+        normalized = " ".join(message.lower().split()).rstrip("?!.")
+        return (intent, normalized, self.kb_service.index_version, self.kb_service.search_index.generation)
     
-    async def _handle_navigation(self, message: str, context: Optional[Dict[str, Any]]) -> Dict[str, Any]:
-        """Handle navigation requests"""
+    async def _log_turns(
+        self,
+        user_id: str,
+        session_id: str,
+        message: str,
+        intent: Dict[str, Any],
+        response: Dict[str, Any]
+    ):
+        """Persist the exchange; a logging failure never fails the reply"""
+        if self.chat_log is None:
+            return
+        try:
+            await self.chat_log.append(user_id, session_id, [
+                {"role": "user", "content": message, "metadata": {"intent": intent["type"]}},
+                {"role": "assistant", "content": response.get("message", ""), "metadata": {"type": response.get("type")}}
+            ])
+        except Exception as e:
+            logger.warning("Failed to write chat log", error=str(e), user_id=user_id)
+    
+    async def _analyze_intent(self, message: str, context: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Analyze user intent from message"""
+        matches = INTENT_MATCHER.match(message)
+        if not matches:
+            return {"type": "general", "confidence": 0.7, "matches": []}
         
-        # Navigation mappings
-        navigation_map = {
-            "claims": "/claims",
-            "dashboard": "/",
-            "appeals": "/appeals",
-            "quality": "/quality",
-            "metrics": "/metrics",
-            "ai orchestration": "/ai-orchestration",
-            "documents": "/documents",
-            "efolder": "/efolder",
-            "veterans": "/veterans",
-            "settings": "/settings",
-            "help": "/help",
-            "reports": "/reports"
+        return {
+            "type": matches[0]["intent"],
+            "confidence": matches[0]["weight"],
+            "matches": matches
         }
-        
-        message_lower = message.lower()
+    
+    async def _handle_navigation(self, message: str, context: Optional[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+        """Handle navigation requests"""
         
         # Find matching navigation
-        for key, path in navigation_map.items():
-            if key in message_lower:
-                return {
-                    "type": "navigation",
-                    "action": "navigate",
+        match = NAVIGATION_MATCHER.best(message)
+        if match:
+            key = match["intent"]
+            path = NAVIGATION_MAP[key]
+            yield {
+                "type": "navigation",
+                "action": "navigate",
+                "path": path,
+                "message": f"I'll take you to the {key.title()} section.",
+                "navigation_data": {
                     "path": path,
-                    "message": f"I'll take you to the {key.title()} section.",
-                    "navigation_data": {
-                        "path": path,
-                        "name": key.title(),
-                        "description": self._get_section_description(key)
-                    }
+                    "name": key.title(),
+                    "description": self._get_section_description(key)
                 }
+            }
+            return
         
-        return {
+        yield {
             "type": "navigation",
             "action": "suggest",
             "message": "I'm not sure which section you want to navigate to. Here are the available options:",
-            "suggestions": list(navigation_map.keys())
+            "suggestions": list(NAVIGATION_MAP.keys())
         }
     
     async def _handle_claim_query(
@@ -173,7 +370,7 @@ class QBitChatbot:
         message: str,
         user_id: str,
         context: Optional[Dict[str, Any]]
-    ) -> Dict[str, Any]:
+    ) -> AsyncIterator[Dict[str, Any]]:
         """Handle claim-related queries with M21/CFR knowledge"""
         
         # Query knowledge base for relevant information
@@ -183,6 +380,14 @@ class QBitChatbot:
             top_k=3
         )
         
+        # References are ready long before the agent's analysis
+        for result in kb_results.get("results", []):
+            yield _chunk("reference", {
+                "source": result.get("source", "Unknown"),
+                "section": result.get("section", ""),
+                "title": result.get("title", "")
+            })
+        
         # Use appropriate agent for claim assistance
         agent_response = await self.orchestrator.process_with_agent(
             agent_type="claims_processor",
@@ -191,10 +396,22 @@ class QBitChatbot:
                 "kb_results": kb_results,
                 "user_context": context
             },
-            user_id=user_id
+            user_id=user_id,
+            priority=TaskPriority.INTERACTIVE
         )
+        # Shed load and timeouts come back as results, after references were sent
+        error = _agent_error(agent_response)
+        if error is not None:
+            yield {**error, "references": kb_results.get("references", [])}
+            return
+        # Agent.process wraps the agent's own output in "result"
+        agent_response = agent_response.get("result", agent_response)
         
-        return {
+        for line in agent_response["response"].splitlines():
+            if line.strip():
+                yield _chunk("analysis", line)
+        
+        yield {
             "type": "claim_assistance",
             "message": agent_response["response"],
             "references": kb_results.get("references", []),
@@ -206,7 +423,7 @@ class QBitChatbot:
         self,
         message: str,
         context: Optional[Dict[str, Any]]
-    ) -> Dict[str, Any]:
+    ) -> AsyncIterator[Dict[str, Any]]:
         """Handle knowledge base queries"""
         
         # Query all relevant knowledge categories
@@ -217,16 +434,22 @@ class QBitChatbot:
         )
         
         if not kb_results.get("results"):
-            return {
+            yield {
                 "type": "knowledge",
                 "message": "I couldn't find specific information about that topic. Could you please rephrase or provide more details?",
                 "suggestions": self._get_related_topics(message)
             }
+            return
         
         # Format response with citations
         response = self._format_knowledge_response(kb_results)
         
-        return {
+        for result in kb_results["results"][:3]:
+            yield _chunk("snippet", result["content"])
+        for citation in response["citations"]:
+            yield _chunk("citation", citation)
+        
+        yield {
             "type": "knowledge",
             "message": response["text"],
             "citations": response["citations"],
@@ -239,7 +462,7 @@ class QBitChatbot:
         user_id: str,
         session_id: str,
         context: Optional[Dict[str, Any]]
-    ) -> Dict[str, Any]:
+    ) -> AsyncIterator[Dict[str, Any]]:
         """Handle general conversation"""
         
         # Use general purpose agent
@@ -248,14 +471,25 @@ class QBitChatbot:
             task={
                 "message": message,
                 "context": context,
-                "session_id": session_id
+                "session_id": session_id,
+                "history": self.conversations.history(user_id, session_id, limit=10)
             },
-            user_id=user_id
+            user_id=user_id,
+            priority=TaskPriority.INTERACTIVE
         )
+        error = _agent_error(agent_response)
+        if error is not None:
+            yield error
+            return
+        # Agent.process wraps the agent's own output in "result"
+        agent_response = agent_response.get("result", agent_response)
+        reply = agent_response.get("response") or GENERAL_CHAT_FALLBACK
         
-        return {
+        yield _chunk("message", reply)
+        
+        yield {
             "type": "chat",
-            "message": agent_response["response"],
+            "message": reply,
             "follow_up_suggestions": agent_response.get("suggestions", [])
         }
     
@@ -0,0 +1,206 @@
+"""
+Agent request log
+Fixed-capacity audit ring buffer with cheap task fingerprints and JSONL export
+"""
+
+import asyncio
+import hashlib
+import heapq
+import json
+import os
+import time
+from collections import deque
+from itertools import islice
+from typing import Any, Deque, Dict, List, Optional
+
+import structlog
+
+logger = structlog.get_logger()
+
+# Scalar values longer than this only contribute their prefix and length
+FINGERPRINT_VALUE_CHARS = 256
+
+# Values (scalars and containers) hashed per top-level field; the rest only count toward sizes
+FINGERPRINT_NESTED_VALUES = 64
+
+def _hash_value(digest, value: Any, budget: List[int]):
+    """Feed value into digest, walking nested containers depth-first until budget runs out"""
+    budget[0] -= 1
+    if value is None or isinstance(value, (str, int, float, bool)):
+        text = str(value)
+        digest.update(b"=%d:" % len(text))
+        digest.update(text[:FINGERPRINT_VALUE_CHARS].encode())
+    elif isinstance(value, dict):
+        digest.update(b"{%d:" % len(value))
+        for nested in heapq.nsmallest(max(budget[0], 0), value, key=str):
+            if budget[0] <= 0:
+                break
+            digest.update(str(nested)[:FINGERPRINT_VALUE_CHARS].encode())
+            _hash_value(digest, value[nested], budget)
+        digest.update(b"}")
+    elif isinstance(value, (list, tuple)):
+        digest.update(b"[%d" % len(value))
+        for item in islice(value, max(budget[0], 0)):
+            if budget[0] <= 0:
+                break
+            _hash_value(digest, item, budget)
+        digest.update(b"]")
+    elif isinstance(value, (set, frozenset)):
+        digest.update(b"(%d" % len(value))
+    else:
+        digest.update(b"<" + type(value).__name__.encode())
+
+def task_fingerprint(task: Dict[str, Any]) -> str:
+    """Short hash of a task's fields and a bounded sample of their contents
+
+    Fed straight into the hash, with no intermediate JSON. Each top-level
+    field contributes at most FINGERPRINT_NESTED_VALUES values: nested
+    containers (e.g. kb_results) are walked depth-first, dict keys in
+    sorted order, and every container also contributes its size. The cost
+    therefore depends on the number of top-level fields, not on payload size.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for key in sorted(task, key=str):
+        digest.update(str(key).encode())
+        _hash_value(digest, task[key], [FINGERPRINT_NESTED_VALUES])
+        digest.update(b";")
+    return digest.hexdigest()
+
+class _RequestRecord:
+    __slots__ = ("sequence", "timestamp", "user_id", "agent_type", "priority", "task_hash")
+
+    def __init__(self, sequence: int, user_id: str, agent_type: str, priority: str, task_hash: str):
+        self.sequence = sequence
+        self.timestamp = time.time()
+        self.user_id = user_id
+        self.agent_type = agent_type
+        self.priority = priority
+        self.task_hash = task_hash
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "sequence": self.sequence,
+            "timestamp": self.timestamp,
+            "user_id": self.user_id,
+            "agent_type": self.agent_type,
+            "priority": self.priority,
+            "task_hash": self.task_hash
+        }
+
+class RequestLog:
+    """Most recent agent requests, optionally exported to a JSONL file
+
+    Holds at most capacity records. The oldest record is overwritten
+    first, so recording a request costs O(1) time and memory however
+    long the process runs. With export_path set, start() launches a
+    background task. Every flush_interval_seconds it appends records
+    logged since the last flush to the file, one JSON object per line,
+    in a worker thread. Records overwritten before they were flushed
+    are counted in export_dropped.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 10000,
+        export_path: Optional[str] = None,
+        flush_interval_seconds: float = 5.0
+    ):
+        self.capacity = capacity
+        self.export_path = export_path
+        self.flush_interval_seconds = flush_interval_seconds
+        self._records: Deque[_RequestRecord] = deque(maxlen=max(1, capacity))
+        self._sequence = 0
+        self._exported_through = 0
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._exporter: Optional[asyncio.Task] = None
+
+        self.exported = 0
+        self.export_dropped = 0
+        self.export_errors = 0
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def record(self, user_id: str, agent_type: str, task: Dict[str, Any], priority: str = "normal"):
+        """Log one agent request"""
+        self._sequence += 1
+        self._records.append(
+            _RequestRecord(self._sequence, user_id, agent_type, priority, task_fingerprint(task))
+        )
+
+    def recent(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Most recent records, oldest first"""
+        records = list(self._records)
+        if limit:
+            records = records[-limit:]
+        return [record.to_dict() for record in records]
+
+    def _write(self, lines: List[str]):
+        os.makedirs(os.path.dirname(os.path.abspath(self.export_path)), exist_ok=True)
+        with open(self.export_path, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+
+    async def flush(self) -> int:
+        """Append records logged since the last flush to the export file"""
+        if not self.export_path:
+            return 0
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            # Only records newer than the last flush; they sit at the end of the buffer
+            pending: List[_RequestRecord] = []
+            for record in reversed(self._records):
+                if record.sequence <= self._exported_through:
+                    break
+                pending.append(record)
+            if not pending:
+                return 0
+            pending.reverse()
+
+            dropped = pending[0].sequence - self._exported_through - 1
+            lines = [json.dumps(record.to_dict()) + "\n" for record in pending]
+            try:
+                await asyncio.to_thread(self._write, lines)
+            except OSError as e:
+                self.export_errors += 1
+                logger.error("Request log export failed", path=self.export_path, error=str(e))
+                return 0
+
+            self._exported_through = pending[-1].sequence
+            self.export_dropped += dropped
+            self.exported += len(pending)
+            return len(pending)
+
+    async def _export_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval_seconds)
+            await self.flush()
+
+    def start(self):
+        """Start the background exporter (no-op without an export path)"""
+        if self.export_path and self._exporter is None:
+            self._exporter = asyncio.create_task(self._export_loop())
+
+    async def stop(self):
+        """Stop the exporter and flush what's left"""
+        if self._exporter is not None:
+            self._exporter.cancel()
+            try:
+                await self._exporter
+            except asyncio.CancelledError:
+                pass
+            self._exporter = None
+        await self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get buffer occupancy and export counters"""
+        return {
+            "records": len(self._records),
+            "capacity": self.capacity,
+            "logged": self._sequence,
+            "export_path": self.export_path,
+            "exported": self.exported,
+            "export_dropped": self.export_dropped,
+            "export_errors": self.export_errors
+        }
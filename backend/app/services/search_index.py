@@ -0,0 +1,952 @@
+"""
+Inverted index engine for knowledge base retrieval
+Integer document IDs, compact positional postings and BM25 ranking
+"""
+
+import heapq
+import math
+import re
+from array import array
+from bisect import bisect_left
+from typing import Dict, Any, List, Optional, Tuple, Iterable, Iterator, Callable, Hashable, Set, Sequence
+
+from app.services.term_dictionary import TermDictionary
+
+# Keeps citation-style tokens intact: "c&p", "3.303", "4.71a", "m21-1"
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[&.\-'][a-z0-9]+)*")
+
+STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has",
+    "in", "is", "it", "of", "on", "or", "that", "the", "to", "was", "were",
+    "with", "what", "when", "how", "do", "does", "i", "me", "my", "about"
+})
+
+# Position gap between fields so phrases never span title and body
+POSITION_GAP = 100
+
+# Score bonus (in units of the pair's mean IDF) for query words found adjacent
+PROXIMITY_BOOST = 0.5
+
+# "exact phrase", "near words"~3, +required or plain word
+QUERY_CLAUSE_PATTERN = re.compile(r'"([^"]*)"(?:~(\d+))?|(\+?)([^\s"]+)')
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase and split text into index terms"""
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower())
+        if token not in STOPWORDS
+    ]
+
+def tokenize_positions(text: str, start: int = 0) -> Tuple[List[Tuple[str, int]], int]:
+    """Index terms with token positions, and the next free position
+
+    Stopwords are dropped but still occupy a position, so "line of duty"
+    only matches text where the two words are one word apart.
+    """
+    terms = []
+    position = start
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token not in STOPWORDS:
+            terms.append((token, position))
+        position += 1
+    return terms, position
+
+def analyze(fields: Iterable[Tuple[str, int]]) -> Tuple[Dict[str, int], int, Dict[str, List[int]]]:
+    """Weighted term frequencies, length and term positions for (text, weight) fields
+
+    Pure function of its input, so bulk loads can run it in worker processes.
+    """
+    term_freqs: Dict[str, int] = {}
+    term_positions: Dict[str, List[int]] = {}
+    length = 0
+    position = 0
+    for text, weight in fields:
+        terms, position = tokenize_positions(text, position)
+        for term, term_position in terms:
+            term_freqs[term] = term_freqs.get(term, 0) + weight
+            positions = term_positions.get(term)
+            if positions is None:
+                term_positions[term] = [term_position]
+            else:
+                positions.append(term_position)
+            length += weight
+        position += POSITION_GAP
+    return term_freqs, length, term_positions
+
+class PhraseClause:
+    """Query terms that must occur together in a document
+
+    With slop 0 the terms must appear in order at their query offsets;
+    with slop N they may appear in any order with at most N other words
+    between them.
+    """
+
+    def __init__(self, terms: List[str], offsets: List[int], slop: int = 0):
+        self.terms = terms
+        self.offsets = offsets
+        self.slop = slop
+        self.unique_terms = list(dict.fromkeys(terms))
+
+    def key(self) -> Tuple:
+        return (tuple(self.terms), tuple(self.offsets), self.slop)
+
+    def matches(self, positions: Dict[str, Sequence[int]]) -> bool:
+        """Whether per-term positions within one document satisfy the clause"""
+        if self.slop == 0:
+            if len(self.terms) == 2:
+                offset = self.offsets[1]
+                return not set(positions[self.terms[0]]).isdisjoint(
+                    [position - offset for position in positions[self.terms[1]]]
+                )
+            # Candidate phrase starts implied by each term; all must agree
+            starts: Optional[Set[int]] = None
+            for term, offset in zip(self.terms, self.offsets):
+                implied = {position - offset for position in positions[term]}
+                starts = implied if starts is None else starts & implied
+                if not starts:
+                    return False
+            return True
+
+        unique = self.unique_terms
+        return _min_span([positions[term] for term in unique]) <= self.slop + len(unique) - 1
+
+def _min_span(position_lists: List[Sequence[int]]) -> float:
+    """Smallest window (last - first position) containing every list"""
+    if len(position_lists) == 2:
+        first, second = position_lists
+        i = j = 0
+        best = math.inf
+        while i < len(first) and j < len(second):
+            gap = first[i] - second[j]
+            best = min(best, abs(gap))
+            if gap < 0:
+                i += 1
+            else:
+                j += 1
+        return best
+
+    events = list(heapq.merge(*(
+        [(position, index) for position in positions]
+        for index, positions in enumerate(position_lists)
+    )))
+    needed = len(position_lists)
+    counts = [0] * needed
+    covered = 0
+    best = math.inf
+    left = 0
+    for position, index in events:
+        if counts[index] == 0:
+            covered += 1
+        counts[index] += 1
+        while covered == needed:
+            start, start_index = events[left]
+            best = min(best, position - start)
+            counts[start_index] -= 1
+            if counts[start_index] == 0:
+                covered -= 1
+            left += 1
+    return best
+
+class ParsedQuery:
+    """A query split into scoring terms, required terms and phrase clauses"""
+
+    def __init__(self):
+        self.terms: List[str] = []
+        self.required: List[str] = []
+        self.phrases: List[PhraseClause] = []
+        # Adjacent bare words as (first, second, distance) for proximity boosting
+        self.pairs: List[Tuple[str, str, int]] = []
+
+    @property
+    def constrained(self) -> bool:
+        """Whether matches must satisfy required terms or phrases"""
+        return bool(self.required or self.phrases)
+
+    def rewrite(self, replacements: Dict[str, str]) -> "ParsedQuery":
+        """Copy of the query with terms substituted (e.g. spelling corrections)"""
+        def swap(term: str) -> str:
+            return replacements.get(term, term)
+
+        rewritten = ParsedQuery()
+        rewritten.terms = list(dict.fromkeys(swap(term) for term in self.terms))
+        rewritten.required = list(dict.fromkeys(swap(term) for term in self.required))
+        rewritten.phrases = [
+            PhraseClause([swap(term) for term in phrase.terms], phrase.offsets, phrase.slop)
+            for phrase in self.phrases
+        ]
+        rewritten.pairs = [
+            (swap(first), swap(second), distance)
+            for first, second, distance in self.pairs
+            if swap(first) != swap(second)
+        ]
+        return rewritten
+
+    def key(self) -> Tuple:
+        return (
+            tuple(self.terms),
+            tuple(self.required),
+            tuple(phrase.key() for phrase in self.phrases),
+            tuple(self.pairs)
+        )
+
+def parse_query(text: str) -> ParsedQuery:
+    """Parse "quoted phrases", "proximity"~N and +required terms
+
+    Anything else is a plain word that scores but is not required.
+    """
+    parsed = ParsedQuery()
+    bare_words = []
+    for match in QUERY_CLAUSE_PATTERN.finditer(text):
+        phrase, slop, plus, word = match.groups()
+        if phrase is not None:
+            tokens, _ = tokenize_positions(phrase)
+            if not tokens:
+                continue
+            terms = [term for term, _ in tokens]
+            parsed.terms.extend(terms)
+            if len(terms) == 1:
+                parsed.required.append(terms[0])
+            else:
+                first = tokens[0][1]
+                offsets = [position - first for _, position in tokens]
+                parsed.phrases.append(PhraseClause(terms, offsets, int(slop) if slop else 0))
+        else:
+            terms = tokenize(word)
+            parsed.terms.extend(terms)
+            if plus:
+                parsed.required.extend(terms)
+            bare_words.append(word)
+
+    parsed.terms = list(dict.fromkeys(parsed.terms))
+    parsed.required = list(dict.fromkeys(parsed.required))
+    tokens, _ = tokenize_positions(" ".join(bare_words))
+    parsed.pairs = [
+        (first, second, second_position - first_position)
+        for (first, first_position), (second, second_position) in zip(tokens, tokens[1:])
+        if first != second
+    ]
+    return parsed
+
+def _positions(entry: Tuple, index: int) -> Sequence[int]:
+    """Positions of the index-th posting in a (doc_ids, freqs, pos_ends, positions) entry"""
+    pos_ends = entry[2]
+    return entry[3][pos_ends[index - 1] if index else 0:pos_ends[index]]
+
+def _intersect(entries: List[Tuple]) -> Iterator[Tuple[int, List[int]]]:
+    """Doc IDs present in every postings entry, with each entry's index
+
+    Leapfrogs from the shortest list using binary search and stops as soon
+    as any list is exhausted, so long lists of common words are skipped
+    rather than scanned.
+    """
+    order = sorted(range(len(entries)), key=lambda i: len(entries[i][0]))
+    lists = [entries[i][0] for i in order]
+    driver = lists[0]
+    cursors = [0] * len(lists)
+    index = 0
+    while index < len(driver):
+        target = driver[index]
+        matched = True
+        for j in range(1, len(lists)):
+            doc_ids = lists[j]
+            cursor = bisect_left(doc_ids, target, cursors[j])
+            if cursor == len(doc_ids):
+                return
+            cursors[j] = cursor
+            if doc_ids[cursor] != target:
+                target = doc_ids[cursor]
+                matched = False
+                break
+        if matched:
+            cursors[0] = index
+            indexes = [0] * len(lists)
+            for j, original in enumerate(order):
+                indexes[original] = cursors[j]
+            yield target, indexes
+            index += 1
+        else:
+            index = bisect_left(driver, target, index + 1)
+
+class Segment:
+    """Postings for a contiguous run of doc IDs
+
+    The active segment receives appends; once sealed it is never mutated
+    again, which lets compaction read it from a worker thread.
+    """
+
+    def __init__(self):
+        # term -> (doc_ids, freqs, pos_ends, positions); pos_ends[i] is the
+        # end of posting i's run in positions, which start where i-1 ended
+        self.postings: Dict[str, Tuple[array, array, array, array]] = {}
+        self.doc_count = 0
+        self.sealed = False
+
+    def add(self, doc_id: int, term_freqs: Dict[str, int], term_positions: Dict[str, List[int]]):
+        """Append one document's postings (doc IDs arrive in ascending order)"""
+        for term, freq in term_freqs.items():
+            entry = self.postings.get(term)
+            if entry is None:
+                entry = (array("I"), array("I"), array("I"), array("I"))
+                self.postings[term] = entry
+            entry[0].append(doc_id)
+            entry[1].append(freq)
+            entry[3].extend(term_positions.get(term, ()))
+            entry[2].append(len(entry[3]))
+        self.doc_count += 1
+
+    def postings_count(self) -> int:
+        return sum(len(entry[0]) for entry in self.postings.values())
+
+def merge_segments(segments: List[Segment], tombstones: Set[int]) -> Segment:
+    """Merge sealed segments into one, dropping tombstoned documents
+
+    Segments must be given in doc ID order so merged postings stay sorted.
+    Safe to run off the event loop: inputs are sealed and never mutated.
+    """
+    merged = Segment()
+    live_docs: Set[int] = set()
+
+    for segment in segments:
+        for term, (doc_ids, freqs, pos_ends, positions) in segment.postings.items():
+            entry = merged.postings.get(term)
+            if entry is None:
+                entry = (array("I"), array("I"), array("I"), array("I"))
+                merged.postings[term] = entry
+            out_ids, out_freqs, out_ends, out_positions = entry
+            if tombstones:
+                start = 0
+                for doc_id, freq, end in zip(doc_ids, freqs, pos_ends):
+                    if doc_id not in tombstones:
+                        out_ids.append(doc_id)
+                        out_freqs.append(freq)
+                        out_positions.extend(positions[start:end])
+                        out_ends.append(len(out_positions))
+                    start = end
+            else:
+                base = len(out_positions)
+                out_ids.extend(doc_ids)
+                out_freqs.extend(freqs)
+                out_positions.extend(positions)
+                if base:
+                    out_ends.extend(end + base for end in pos_ends)
+                else:
+                    out_ends.extend(pos_ends)
+            live_docs.update(out_ids)
+
+    # Terms whose only documents were deleted disappear entirely
+    merged.postings = {
+        term: entry for term, entry in merged.postings.items() if entry[0]
+    }
+    merged.doc_count = len(live_docs)
+    merged.sealed = True
+    return merged
+
+class CompactionPlan:
+    """Snapshot of what a compaction run will merge"""
+
+    def __init__(self, segments: List[Segment], tombstones: Set[int]):
+        self.segments = segments
+        self.tombstones = tombstones
+
+    @property
+    def empty(self) -> bool:
+        return not self.segments
+
+class FacetField:
+    """Categorical field stored as one ordinal per doc ID
+
+    Ordinal 0 is reserved for documents without a value. Live document
+    counts per ordinal are maintained on every add and delete, so facet
+    totals never require a scan.
+    """
+
+    def __init__(self):
+        self.values: List[Optional[str]] = [None]
+        self.value_ids: Dict[str, int] = {}
+        self.ordinals = array("I")
+        self.counts = array("I", [0])
+
+    def ordinal(self, value: Optional[str]) -> int:
+        """Ordinal for value, assigning a new one on first sight"""
+        if value is None:
+            return 0
+        ordinal = self.value_ids.get(value)
+        if ordinal is None:
+            ordinal = len(self.values)
+            self.values.append(value)
+            self.value_ids[value] = ordinal
+            self.counts.append(0)
+        return ordinal
+
+    def mask(self, allowed: Iterable[str]) -> bytes:
+        """Per-ordinal lookup table: 1 where the value is allowed"""
+        table = bytearray(len(self.values))
+        for value in allowed:
+            ordinal = self.value_ids.get(value)
+            if ordinal is not None:
+                table[ordinal] = 1
+        return bytes(table)
+
+    def live_counts(self) -> Dict[str, int]:
+        return {
+            self.values[ordinal]: count
+            for ordinal, count in enumerate(self.counts)
+            if ordinal and count
+        }
+
+    def copy(self) -> "FacetField":
+        clone = FacetField()
+        clone.values = list(self.values)
+        clone.value_ids = dict(self.value_ids)
+        clone.ordinals = array("I", self.ordinals)
+        clone.counts = array("I", self.counts)
+        return clone
+
+class InvertedIndex:
+    """BM25-ranked, incrementally updatable inverted index
+
+    Each term maps to parallel arrays per segment: ascending doc IDs, the
+    field-weighted term frequency in that document, and the token positions
+    used by phrase and proximity matching. Document lengths are stored once,
+    so scoring never touches document text.
+
+    Updates append to an active segment; deletes and replacements leave a
+    tombstone that search skips until compaction merges segments and purges
+    the dead postings. Document frequencies include tombstoned postings until
+    they are merged away, the same trade-off Lucene makes.
+
+    Documents may also carry facet values (e.g. category). Each facet is a
+    per-document ordinal array, so filters are checked while postings are
+    traversed and rejected documents are never scored.
+    """
+
+    def __init__(
+        self,
+        k1: float = 1.2,
+        b: float = 0.75,
+        segment_size: int = 1024,
+        max_segments: int = 8,
+        max_deleted_ratio: float = 0.2
+    ):
+        self.k1 = k1
+        self.b = b
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self.max_deleted_ratio = max_deleted_ratio
+        self.segments: List[Segment] = [Segment()]
+        self.doc_keys: List[Optional[Hashable]] = []
+        self.key_to_id: Dict[Hashable, int] = {}
+        self.doc_lengths = array("I")
+        self.tombstones: Set[int] = set()
+        self.total_length = 0
+        self.generation = 0
+        self.facets: Dict[str, FacetField] = {}
+        self._vocabulary: Optional[TermDictionary] = None
+        self._compaction: Optional[CompactionPlan] = None
+
+    def __len__(self) -> int:
+        """Number of distinct terms in the index"""
+        populated = [segment for segment in self.segments if segment.doc_count]
+        if len(populated) <= 1:
+            return len(populated[0].postings) if populated else 0
+        terms = set()
+        for segment in populated:
+            terms.update(segment.postings)
+        return len(terms)
+
+    def __contains__(self, doc_key: Hashable) -> bool:
+        return doc_key in self.key_to_id
+
+    @property
+    def doc_count(self) -> int:
+        """Number of live (non-deleted) documents"""
+        return len(self.key_to_id)
+
+    @property
+    def avg_doc_length(self) -> float:
+        if not self.key_to_id:
+            return 0.0
+        return self.total_length / len(self.key_to_id)
+
+    @property
+    def active_segment(self) -> Segment:
+        return self.segments[-1]
+
+    def add_document(
+        self,
+        doc_key: Hashable,
+        fields: Iterable[Tuple[str, int]],
+        facets: Optional[Dict[str, str]] = None
+    ) -> int:
+        """Index a document given (text, weight) fields and return its doc ID
+
+        Re-adding an existing key replaces it. Cost is O(document length).
+        """
+        term_freqs, length, term_positions = analyze(fields)
+        return self.add_analyzed(doc_key, term_freqs, length, term_positions, facets)
+
+    def add_analyzed(
+        self,
+        doc_key: Hashable,
+        term_freqs: Dict[str, int],
+        length: int,
+        term_positions: Dict[str, List[int]],
+        facets: Optional[Dict[str, str]] = None
+    ) -> int:
+        """Index a document whose terms were already counted by analyze()"""
+        if doc_key in self.key_to_id:
+            self.delete_document(doc_key)
+
+        doc_id = len(self.doc_keys)
+        self.doc_keys.append(doc_key)
+        self.key_to_id[doc_key] = doc_id
+        self.doc_lengths.append(length)
+        self.total_length += length
+        self._add_facets(doc_id, facets or {})
+        if self._vocabulary is not None:
+            for term in term_freqs:
+                self._vocabulary.add(term)
+
+        segment = self.active_segment
+        segment.add(doc_id, term_freqs, term_positions)
+        if segment.doc_count >= self.segment_size:
+            self.seal_active_segment()
+
+        self.generation += 1
+        return doc_id
+
+    def _add_facets(self, doc_id: int, facets: Dict[str, str]):
+        for name in facets:
+            if name not in self.facets:
+                # Earlier documents have no value for a new field
+                field = FacetField()
+                field.ordinals = array("I", bytes(4 * doc_id))
+                field.counts[0] = self.doc_count - 1
+                self.facets[name] = field
+        for name, field in self.facets.items():
+            ordinal = field.ordinal(facets.get(name))
+            field.ordinals.append(ordinal)
+            field.counts[ordinal] += 1
+
+    def delete_document(self, doc_key: Hashable) -> bool:
+        """Tombstone a document so it no longer matches"""
+        doc_id = self.key_to_id.pop(doc_key, None)
+        if doc_id is None:
+            return False
+
+        self.doc_keys[doc_id] = None
+        self.tombstones.add(doc_id)
+        self.total_length -= self.doc_lengths[doc_id]
+        for field in self.facets.values():
+            field.counts[field.ordinals[doc_id]] -= 1
+        self.generation += 1
+        return True
+
+    def seal_active_segment(self):
+        """Freeze the active segment and start a new one"""
+        if self.active_segment.doc_count == 0:
+            return
+        self.active_segment.sealed = True
+        self.segments.append(Segment())
+
+    def frozen_copy(self) -> "InvertedIndex":
+        """Point-in-time copy that is safe to read from another thread
+
+        Seals the active segment so every shared segment is immutable; only
+        the per-document bookkeeping is copied, never the postings.
+        """
+        self.seal_active_segment()
+        clone = InvertedIndex(k1=self.k1, b=self.b)
+        clone.segments = [segment for segment in self.segments if segment.sealed]
+        clone.doc_keys = list(self.doc_keys)
+        clone.key_to_id = dict(self.key_to_id)
+        clone.doc_lengths = array("I", self.doc_lengths)
+        clone.tombstones = set(self.tombstones)
+        clone.total_length = self.total_length
+        clone.generation = self.generation
+        clone.facets = {name: field.copy() for name, field in self.facets.items()}
+        return clone
+
+    def needs_compaction(self) -> bool:
+        """Whether segment count or deleted ratio warrant a merge"""
+        sealed = len(self.segments) - 1
+        if sealed > self.max_segments:
+            return True
+        indexed = len(self.doc_keys)
+        return indexed > 0 and len(self.tombstones) / indexed > self.max_deleted_ratio
+
+    def begin_compaction(self) -> CompactionPlan:
+        """Seal the active segment and snapshot the inputs for a merge
+
+        Only one plan may be open at a time; while one is, an empty plan is
+        returned, so overlapping merges never both see the same segments.
+        """
+        if self._compaction is not None:
+            return CompactionPlan(segments=[], tombstones=set())
+        self.seal_active_segment()
+        plan = CompactionPlan(
+            segments=[segment for segment in self.segments if segment.sealed],
+            tombstones=set(self.tombstones)
+        )
+        if not plan.empty:
+            self._compaction = plan
+        return plan
+
+    def abort_compaction(self, plan: CompactionPlan):
+        """Close an open plan without applying it (e.g. the merge failed)"""
+        if plan is self._compaction:
+            self._compaction = None
+
+    def finish_compaction(self, plan: CompactionPlan, merged: Segment) -> bool:
+        """Swap merged output in for its inputs, returning whether it was applied
+
+        Documents added or deleted while the merge ran are untouched: new
+        documents live in segments outside the plan and their tombstones
+        were not in the snapshot, so they stay in the tombstone set.
+
+        Empty plans, plans that are not the open one and plans whose input
+        segments are no longer all in the index are rejected, since applying
+        them would duplicate postings.
+        """
+        if plan.empty or plan is not self._compaction:
+            return False
+        self._compaction = None
+        current = {id(segment) for segment in self.segments}
+        if any(id(segment) not in current for segment in plan.segments):
+            return False
+
+        merged_ids = {id(segment) for segment in plan.segments}
+        remaining = [segment for segment in self.segments if id(segment) not in merged_ids]
+        self.segments = ([merged] if merged.doc_count else []) + remaining
+        if not self.segments or self.segments[-1].sealed:
+            self.segments.append(Segment())
+        self.tombstones -= plan.tombstones
+        # Rebuilt on next use with fresh frequencies and without purged terms
+        self._vocabulary = None
+        self.generation += 1
+        return True
+
+    def compact(self) -> bool:
+        """Merge all segments synchronously (a no-op while a merge is in flight)"""
+        plan = self.begin_compaction()
+        if plan.empty:
+            return False
+        return self.finish_compaction(plan, merge_segments(plan.segments, plan.tombstones))
+
+    def _term_postings(self, term: str) -> List[Tuple[array, array, array, array]]:
+        found = []
+        for segment in self.segments:
+            entry = segment.postings.get(term)
+            if entry is not None:
+                found.append(entry)
+        return found
+
+    def _idf(self, df: int) -> float:
+        return math.log(1.0 + (self.doc_count - df + 0.5) / (df + 0.5))
+
+    def doc_frequency(self, term: str) -> int:
+        return sum(len(entry[0]) for entry in self._term_postings(term))
+
+    def idf(self, term: str) -> float:
+        """BM25 inverse document frequency (always positive)"""
+        df = self.doc_frequency(term)
+        return self._idf(df) if df else 0.0
+
+    @property
+    def vocabulary(self) -> TermDictionary:
+        """Sorted term dictionary, built on first use"""
+        if self._vocabulary is None:
+            frequencies: Dict[str, int] = {}
+            for segment in self.segments:
+                for term, entry in segment.postings.items():
+                    frequencies[term] = frequencies.get(term, 0) + len(entry[0])
+            self._vocabulary = TermDictionary(frequencies)
+        return self._vocabulary
+
+    def complete(self, prefix: str, limit: int = 8) -> List[str]:
+        """Most frequent index terms starting with prefix"""
+        return self.vocabulary.complete(prefix.lower(), limit)
+
+    def correct(self, term: str, max_distance: int) -> Optional[str]:
+        """Closest indexed term for a term with no postings (None if none in reach)
+
+        Ties on edit distance go to the term found in more documents.
+        """
+        if max_distance <= 0 or self.doc_frequency(term):
+            return None
+        candidates = [
+            (distance, -self.doc_frequency(candidate), candidate)
+            for candidate, distance in self.vocabulary.fuzzy(term, max_distance)
+        ]
+        candidates = [candidate for candidate in candidates if candidate[1]]
+        return min(candidates)[2] if candidates else None
+
+    def _partition_masks(
+        self,
+        facet_filter: Optional[Dict[str, Iterable[str]]]
+    ) -> Optional[List[Tuple[array, bytes]]]:
+        """(ordinals, mask) pairs for a filter; empty when nothing can match"""
+        if not facet_filter:
+            return None
+        partitions = []
+        for name, allowed in facet_filter.items():
+            field = self.facets.get(name)
+            if field is None:
+                continue
+            mask = field.mask(allowed)
+            if any(field.counts[ordinal] for ordinal, hit in enumerate(mask) if hit):
+                partitions.append((field.ordinals, mask))
+        return partitions
+
+    def partition_filter(
+        self,
+        facet_filter: Optional[Dict[str, Iterable[str]]]
+    ) -> Optional[Callable[[int], bool]]:
+        """Doc ID predicate for a facet filter (None when unfiltered)
+
+        A document passes if its value for any listed field is allowed.
+        """
+        partitions = self._partition_masks(facet_filter)
+        if partitions is None:
+            return None
+
+        def accept(doc_id: int) -> bool:
+            return any(mask[ordinals[doc_id]] for ordinals, mask in partitions)
+
+        return accept
+
+    def facet_counts(
+        self,
+        names: Optional[Iterable[str]] = None,
+        terms: Optional[List[str]] = None,
+        facet_filter: Optional[Dict[str, Iterable[str]]] = None
+    ) -> Dict[str, Dict[str, int]]:
+        """Live document counts per facet value
+
+        Without terms or a filter the maintained counts are returned as-is;
+        otherwise only documents matching any term (and the filter) count.
+        """
+        fields = {
+            name: self.facets[name]
+            for name in (self.facets if names is None else names)
+            if name in self.facets
+        }
+        if terms is None and not facet_filter:
+            return {name: field.live_counts() for name, field in fields.items()}
+
+        if terms is None:
+            candidates: Iterable[int] = self.key_to_id.values()
+        else:
+            matched: Set[int] = set()
+            for term in dict.fromkeys(terms):
+                for entry in self._term_postings(term):
+                    matched.update(entry[0])
+            candidates = matched - self.tombstones
+        accept = self.partition_filter(facet_filter)
+
+        counts = {name: array("I", bytes(4 * len(field.values))) for name, field in fields.items()}
+        for doc_id in candidates:
+            if accept is not None and not accept(doc_id):
+                continue
+            for name, field in fields.items():
+                counts[name][field.ordinals[doc_id]] += 1
+        return {
+            name: {
+                field.values[ordinal]: count
+                for ordinal, count in enumerate(counts[name])
+                if ordinal and count
+            }
+            for name, field in fields.items()
+        }
+
+    def search(
+        self,
+        terms: List[str],
+        top_k: int = 5,
+        accept: Optional[Callable[[int], bool]] = None,
+        facet_filter: Optional[Dict[str, Iterable[str]]] = None
+    ) -> Tuple[List[Tuple[int, float]], int]:
+        """Score documents matching any term
+
+        Returns the top_k (doc_id, score) pairs, best first, and the total
+        number of matching documents. Work is proportional to the summed
+        postings length of the query terms. facet_filter restricts matches
+        to documents whose value for any listed field is allowed.
+        """
+        partitions = self._partition_masks(facet_filter)
+        if partitions is not None and not partitions:
+            # No live document carries an allowed value
+            return [], 0
+
+        avgdl = self.avg_doc_length or 1.0
+        k1_plus_1 = self.k1 + 1.0
+        norm_base = self.k1 * (1.0 - self.b)
+        norm_scale = self.k1 * self.b / avgdl
+        doc_lengths = self.doc_lengths
+        tombstones = self.tombstones
+        scores: Dict[int, float] = {}
+        rejected = set()
+
+        for term in dict.fromkeys(terms):
+            term_postings = self._term_postings(term)
+            if not term_postings:
+                continue
+            idf = self._idf(sum(len(entry[0]) for entry in term_postings))
+            for entry in term_postings:
+                for doc_id, freq in zip(entry[0], entry[1]):
+                    if doc_id not in scores:
+                        if doc_id in tombstones or doc_id in rejected:
+                            continue
+                        if partitions is not None and not any(
+                            mask[ordinals[doc_id]] for ordinals, mask in partitions
+                        ):
+                            rejected.add(doc_id)
+                            continue
+                        if accept is not None and not accept(doc_id):
+                            rejected.add(doc_id)
+                            continue
+                    norm = norm_base + norm_scale * doc_lengths[doc_id]
+                    scores[doc_id] = scores.get(doc_id, 0.0) + (
+                        idf * freq * k1_plus_1 / (freq + norm)
+                    )
+
+        # Ties resolve toward the lower doc ID so rankings are stable
+        top = heapq.nsmallest(
+            top_k,
+            ((-score, doc_id) for doc_id, score in scores.items())
+        ) if top_k > 0 else []
+
+        return [(doc_id, -neg_score) for neg_score, doc_id in top], len(scores)
+
+    def search_query(
+        self,
+        query: ParsedQuery,
+        top_k: int = 5,
+        accept: Optional[Callable[[int], bool]] = None,
+        facet_filter: Optional[Dict[str, Iterable[str]]] = None
+    ) -> Tuple[List[Tuple[int, float]], int]:
+        """Score a parsed query
+
+        Queries with phrases or required terms only consider documents that
+        contain every required term (found by postings intersection). Plain
+        multi-word queries are ranked by BM25 and the leading candidates get
+        a bonus where query words appear next to each other.
+        """
+        if query.constrained:
+            return self._search_constrained(query, top_k, accept, facet_filter)
+
+        if not query.pairs:
+            return self.search(query.terms, top_k, accept, facet_filter)
+
+        depth = max(top_k * 4, 20)
+        hits, total = self.search(query.terms, depth, accept, facet_filter)
+        idf = {term: self.idf(term) for term in query.terms}
+        reranked = []
+        for doc_id, score in hits:
+            for first, second, distance in query.pairs:
+                first_positions = self._doc_positions(first, doc_id)
+                if not first_positions:
+                    continue
+                second_positions = set(self._doc_positions(second, doc_id))
+                if any(position + distance in second_positions for position in first_positions):
+                    score += PROXIMITY_BOOST * (idf[first] + idf[second]) / 2
+            reranked.append((doc_id, score))
+        reranked.sort(key=lambda hit: (-hit[1], hit[0]))
+        return reranked[:top_k], total
+
+    def _doc_positions(self, term: str, doc_id: int) -> Sequence[int]:
+        for entry in self._term_postings(term):
+            doc_ids = entry[0]
+            index = bisect_left(doc_ids, doc_id)
+            if index < len(doc_ids) and doc_ids[index] == doc_id:
+                return _positions(entry, index)
+        return ()
+
+    def _search_constrained(
+        self,
+        query: ParsedQuery,
+        top_k: int,
+        accept: Optional[Callable[[int], bool]],
+        facet_filter: Optional[Dict[str, Iterable[str]]]
+    ) -> Tuple[List[Tuple[int, float]], int]:
+        """Intersect required postings per segment, then verify phrases"""
+        partitions = self._partition_masks(facet_filter)
+        if partitions is not None and not partitions:
+            return [], 0
+
+        required = list(dict.fromkeys(
+            query.required + [term for phrase in query.phrases for term in phrase.terms]
+        ))
+        optional = [term for term in query.terms if term not in set(required)]
+        idf = {}
+        for term in required + optional:
+            df = sum(len(entry[0]) for entry in self._term_postings(term))
+            if not df and term in required:
+                return [], 0
+            idf[term] = self._idf(df) if df else 0.0
+
+        avgdl = self.avg_doc_length or 1.0
+        k1_plus_1 = self.k1 + 1.0
+        norm_base = self.k1 * (1.0 - self.b)
+        norm_scale = self.k1 * self.b / avgdl
+        doc_lengths = self.doc_lengths
+        tombstones = self.tombstones
+        scores: Dict[int, float] = {}
+
+        # A document's postings all live in one segment, so each is intersected alone
+        for segment in self.segments:
+            entries = [segment.postings.get(term) for term in required]
+            if any(entry is None for entry in entries):
+                continue
+            extra = [
+                (term, segment.postings[term], [0])
+                for term in optional if term in segment.postings
+            ]
+            for doc_id, indexes in _intersect(entries):
+                if doc_id in tombstones:
+                    continue
+                if partitions is not None and not any(
+                    mask[ordinals[doc_id]] for ordinals, mask in partitions
+                ):
+                    continue
+                if accept is not None and not accept(doc_id):
+                    continue
+                if query.phrases:
+                    positions = {}
+                    for term, entry, index in zip(required, entries, indexes):
+                        pos_ends = entry[2]
+                        positions[term] = entry[3][pos_ends[index - 1] if index else 0:pos_ends[index]]
+                    if not all(phrase.matches(positions) for phrase in query.phrases):
+                        continue
+
+                norm = norm_base + norm_scale * doc_lengths[doc_id]
+                score = 0.0
+                for term, entry, index in zip(required, entries, indexes):
+                    freq = entry[1][index]
+                    score += idf[term] * freq * k1_plus_1 / (freq + norm)
+                for term, entry, cursor in extra:
+                    doc_ids = entry[0]
+                    index = bisect_left(doc_ids, doc_id, cursor[0])
+                    cursor[0] = index
+                    if index < len(doc_ids) and doc_ids[index] == doc_id:
+                        freq = entry[1][index]
+                        score += idf[term] * freq * k1_plus_1 / (freq + norm)
+                scores[doc_id] = score
+
+        top = heapq.nsmallest(
+            top_k,
+            ((-score, doc_id) for doc_id, score in scores.items())
+        ) if top_k > 0 else []
+
+        return [(doc_id, -neg_score) for neg_score, doc_id in top], len(scores)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get index size statistics"""
+        return {
+            "documents": self.doc_count,
+            "deleted": len(self.tombstones),
+            "segments": len(self.segments),
+            "terms": len(self),
+            "postings": sum(segment.postings_count() for segment in self.segments),
+            "avg_doc_length": round(self.avg_doc_length, 2)
+        }
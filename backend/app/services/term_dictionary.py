@@ -0,0 +1,154 @@
+"""
+Sorted term dictionary for prefix completion and fuzzy term lookup
+"""
+
+import heapq
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+
+def _prefix_end(prefix: str) -> str:
+    """Smallest string that sorts after every string starting with prefix"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+class TermDictionary:
+    """Vocabulary kept in sorted order with a document frequency per term
+
+    Sorting makes every prefix a contiguous range, which gives O(log n)
+    prefix lookup and lets fuzzy matching walk the terms like a trie,
+    reusing edit-distance rows for shared prefixes and skipping whole
+    ranges once a prefix is out of reach.
+
+    Frequencies are a ranking hint: new terms start at 1 and existing
+    terms are refreshed when the dictionary is rebuilt.
+    """
+
+    # Short prefixes match large ranges; their top completions are cached
+    CACHED_PREFIX_LENGTH = 2
+    CACHED_COMPLETIONS = 32
+    # Misspellings repeat; remember this many fuzzy lookups
+    CACHED_FUZZY_LOOKUPS = 4096
+
+    def __init__(self, frequencies: Dict[str, int] = None):
+        frequencies = frequencies or {}
+        self.terms: List[str] = sorted(frequencies)
+        self.frequencies: Dict[str, int] = dict(frequencies)
+        self._completions: Dict[str, List[str]] = {}
+        self._fuzzy: Dict[Tuple[str, int, int], List[Tuple[str, int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def __contains__(self, term: object) -> bool:
+        return term in self.frequencies
+
+    def add(self, term: str):
+        """Insert a new term (no-op if already present)"""
+        if term in self.frequencies:
+            return
+        self.terms.insert(bisect_left(self.terms, term), term)
+        self.frequencies[term] = 1
+        if self._completions:
+            self._completions.clear()
+        if self._fuzzy:
+            self._fuzzy.clear()
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        """Index range of terms starting with prefix"""
+        if not prefix:
+            return 0, len(self.terms)
+        start = bisect_left(self.terms, prefix)
+        return start, bisect_left(self.terms, _prefix_end(prefix), start)
+
+    def complete(self, prefix: str, limit: int = 8) -> List[str]:
+        """Most frequent terms starting with prefix"""
+        if len(prefix) <= self.CACHED_PREFIX_LENGTH and limit <= self.CACHED_COMPLETIONS:
+            cached = self._completions.get(prefix)
+            if cached is None:
+                cached = self._top(prefix, self.CACHED_COMPLETIONS)
+                self._completions[prefix] = cached
+            return cached[:limit]
+        return self._top(prefix, limit)
+
+    def _top(self, prefix: str, limit: int) -> List[str]:
+        start, end = self.prefix_range(prefix)
+        frequencies = self.frequencies
+        return heapq.nsmallest(
+            limit,
+            self.terms[start:end],
+            key=lambda term: (-frequencies[term], term)
+        )
+
+    def fuzzy(self, term: str, max_distance: int, prefix_length: int = 1) -> List[Tuple[str, int]]:
+        """Terms within max_distance edits (Levenshtein) of term
+
+        The first prefix_length characters must match exactly (as with
+        Lucene's fuzzy prefix_length), which confines the walk to one slice
+        of the dictionary. Within it, terms are visited in sorted order;
+        rows of the edit-distance table are shared by consecutive terms
+        with a common prefix, only the diagonal band that can stay within
+        max_distance is computed, and a prefix whose best cell already
+        exceeds max_distance prunes every term that starts with it.
+        """
+        key = (term, max_distance, prefix_length)
+        cached = self._fuzzy.get(key)
+        if cached is None:
+            cached = self._fuzzy_scan(term, max_distance, prefix_length)
+            if len(self._fuzzy) >= self.CACHED_FUZZY_LOOKUPS:
+                self._fuzzy.clear()
+            self._fuzzy[key] = cached
+        return list(cached)
+
+    def _fuzzy_scan(self, term: str, max_distance: int, prefix_length: int) -> List[Tuple[str, int]]:
+        terms = self.terms
+        length = len(term)
+        over = max_distance + 1
+        rows = [[j if j <= max_distance else over for j in range(length + 1)]]
+        previous = ""
+        matches = []
+        index, end = self.prefix_range(term[:prefix_length])
+
+        while index < end:
+            candidate = terms[index]
+            common = 0
+            limit = min(len(candidate), len(previous), len(rows) - 1)
+            while common < limit and candidate[common] == previous[common]:
+                common += 1
+            del rows[common + 1:]
+
+            pruned = False
+            for depth in range(common, len(candidate)):
+                char = candidate[depth]
+                above = rows[-1]
+                i = depth + 1
+                # Cells more than max_distance off the diagonal can never recover
+                row = [over] * (length + 1)
+                row[0] = i if i <= max_distance else over
+                best = row[0]
+                for j in range(max(1, i - max_distance), min(length, i + max_distance) + 1):
+                    cell = min(
+                        row[j - 1] + 1,
+                        above[j] + 1,
+                        above[j - 1] + (term[j - 1] != char),
+                        over
+                    )
+                    row[j] = cell
+                    if cell < best:
+                        best = cell
+                rows.append(row)
+                if best > max_distance:
+                    pruned = True
+                    break
+
+            previous = candidate
+            if pruned:
+                # No extension of this prefix can come back within range
+                prefix = candidate[:len(rows) - 1]
+                index = bisect_left(terms, _prefix_end(prefix), index + 1, end)
+                continue
+
+            distance = rows[-1][length]
+            if distance <= max_distance:
+                matches.append((candidate, distance))
+            index += 1
+
+        return matches
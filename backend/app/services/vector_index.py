@@ -0,0 +1,338 @@
+"""
+Local vector search tier for the knowledge base
+Text chunking, pluggable embedders and an IVF approximate index over a
+contiguous float32 matrix
+"""
+
+import zlib
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple, Hashable, Callable
+import numpy as np
+import structlog
+
+from app.services.search_index import tokenize
+
+logger = structlog.get_logger()
+
+def chunk_text(text: str, chunk_size: int, overlap: int) -> List[str]:
+    """Split text into overlapping character windows on word boundaries"""
+    text = " ".join(text.split())
+    if len(text) <= chunk_size:
+        return [text] if text else []
+
+    step = max(1, chunk_size - overlap)
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + chunk_size)
+        if end < len(text):
+            # Back off to the last space so words are not cut in half
+            space = text.rfind(" ", start + step // 2, end)
+            if space > start:
+                end = space
+        chunks.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        next_start = max(start + 1, end - overlap)
+        space = text.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return [chunk for chunk in chunks if chunk]
+
+@lru_cache(maxsize=262144)
+def _hash_feature(feature: str, dimension: int) -> Tuple[int, float]:
+    digest = zlib.crc32(feature.encode("utf-8"))
+    return digest % dimension, 1.0 if digest & 0x80000000 else -1.0
+
+class HashingEmbedder:
+    """Deterministic feature-hashing embedder that needs no model files
+
+    Unigrams and bigrams are hashed into a signed bag of features and
+    L2-normalized, so cosine similarity rewards shared terms and phrases.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts into an (n, dimension) float32 matrix of unit rows"""
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        dimension = self.dimension
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            vector = matrix[row]
+            for feature in features:
+                column, sign = _hash_feature(feature, dimension)
+                vector[column] += sign
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+        return matrix
+
+EMBEDDERS: Dict[str, Callable[..., Any]] = {
+    HashingEmbedder.name: HashingEmbedder
+}
+
+def register_embedder(name: str, factory: Callable[..., Any]):
+    """Register an embedder factory taking a dimension keyword"""
+    EMBEDDERS[name] = factory
+
+def create_embedder(name: str, dimension: int):
+    """Instantiate a registered embedder"""
+    if name not in EMBEDDERS:
+        raise ValueError(f"Unknown embedder {name}. Available: {sorted(EMBEDDERS)}")
+    return EMBEDDERS[name](dimension=dimension)
+
+class VectorIndex:
+    """Inverted-file (IVF) approximate nearest neighbour index
+
+    Vectors live in one contiguous float32 matrix. Once enough rows exist,
+    spherical k-means partitions them into nlist cells; a query scores the
+    centroids, probes the nprobe closest cells and exactly rescores only
+    their members. Rows added after the last partitioning are scanned
+    exhaustively until the next rebuild.
+    """
+
+    def __init__(
+        self,
+        dimension: int,
+        nprobe: int = 8,
+        train_threshold: int = 4096,
+        seed: int = 7
+    ):
+        self.dimension = dimension
+        self.nprobe = nprobe
+        self.train_threshold = train_threshold
+        self.seed = seed
+        self._vectors = np.empty((0, dimension), dtype=np.float32)
+        self._alive = np.empty(0, dtype=bool)
+        self._size = 0
+        self.row_keys: List[Optional[Hashable]] = []
+        self.key_rows: Dict[Hashable, List[int]] = {}
+        # (centroids, list offsets, list rows, rows covered) swapped as one
+        # reference so a rebuild in a worker thread never tears a search
+        self._ivf: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, int]] = None
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        """Number of live vectors"""
+        return self._size - int((~self._alive[:self._size]).sum())
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._vectors[:self._size]
+
+    @property
+    def centroids(self) -> Optional[np.ndarray]:
+        return None if self._ivf is None else self._ivf[0]
+
+    @property
+    def unindexed(self) -> int:
+        """Rows appended since the inverted lists were last built"""
+        return self._size - (0 if self._ivf is None else self._ivf[3])
+
+    def _reserve(self, extra: int):
+        needed = self._size + extra
+        capacity = self._vectors.shape[0]
+        if needed <= capacity and self._vectors.flags.writeable:
+            return
+        new_capacity = max(needed, capacity * 2, 64)
+        vectors = np.empty((new_capacity, self.dimension), dtype=np.float32)
+        vectors[:self._size] = self._vectors[:self._size]
+        alive = np.zeros(new_capacity, dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+        self._vectors, self._alive = vectors, alive
+
+    def add(self, doc_key: Hashable, vectors: np.ndarray) -> List[int]:
+        """Append vectors belonging to a document and return their rows"""
+        count = vectors.shape[0]
+        if count == 0:
+            return []
+        self._reserve(count)
+        start = self._size
+        self._vectors[start:start + count] = vectors
+        self._alive[start:start + count] = True
+        self._size += count
+
+        rows = list(range(start, start + count))
+        self.row_keys.extend([doc_key] * count)
+        self.key_rows.setdefault(doc_key, []).extend(rows)
+        return rows
+
+    def remove(self, doc_key: Hashable) -> int:
+        """Drop every vector of a document; returns how many were removed"""
+        rows = self.key_rows.pop(doc_key, [])
+        for row in rows:
+            self._alive[row] = False
+            self.row_keys[row] = None
+        return len(rows)
+
+    def needs_maintenance(self) -> bool:
+        """Whether maintain() would train or rebuild the inverted lists"""
+        live = len(self)
+        if live < self.train_threshold:
+            return False
+        if self._ivf is None or live > 4 * self._trained_size:
+            return True
+        covered = self._ivf[3]
+        return self._size - covered > max(1024, covered // 10)
+
+    def maintain(self):
+        """(Re)partition when the index has grown enough to benefit"""
+        if not self.needs_maintenance():
+            return
+        if self._ivf is None or len(self) > 4 * self._trained_size:
+            self.train()
+        else:
+            self._assign_lists(self._ivf[0])
+
+    def train(self, iterations: int = 10):
+        """Fit spherical k-means centroids and rebuild the inverted lists"""
+        live_rows = np.flatnonzero(self._alive[:self._size])
+        if live_rows.size == 0:
+            return
+        nlist = max(1, int(np.sqrt(live_rows.size)))
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(live_rows.size, 64 * nlist)
+        sample = self._vectors[rng.choice(live_rows, size=sample_size, replace=False)]
+
+        centroids = sample[rng.choice(sample_size, size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = self._nearest(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            counts = np.bincount(assignment, minlength=nlist)
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(sample_size, size=int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+
+        self._trained_size = live_rows.size
+        self._assign_lists(centroids)
+        logger.info("Vector index trained", rows=int(live_rows.size), nlist=nlist)
+
+    @staticmethod
+    def _nearest(vectors: np.ndarray, centroids: np.ndarray, block: int = 8192) -> np.ndarray:
+        """Closest centroid per row, computed in blocks to bound memory"""
+        out = np.empty(vectors.shape[0], dtype=np.int64)
+        for start in range(0, vectors.shape[0], block):
+            out[start:start + block] = np.argmax(vectors[start:start + block] @ centroids.T, axis=1)
+        return out
+
+    def _assign_lists(self, centroids: np.ndarray):
+        """Rebuild the CSR inverted lists over every row present right now"""
+        size = self._size
+        assignment = self._nearest(self._vectors[:size], centroids)
+        order = np.argsort(assignment, kind="stable")
+        counts = np.bincount(assignment, minlength=centroids.shape[0])
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        self._ivf = (centroids, offsets, order, size)
+
+    @staticmethod
+    def _candidates(
+        ivf: Tuple[np.ndarray, np.ndarray, np.ndarray, int],
+        centroid_scores: np.ndarray,
+        nprobe: int,
+        size: int
+    ) -> np.ndarray:
+        _, offsets, list_rows, covered = ivf
+        nlist = centroid_scores.shape[0]
+        if nprobe >= nlist:
+            probe = np.arange(nlist)
+        else:
+            probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        parts = [list_rows[offsets[cell]:offsets[cell + 1]] for cell in probe]
+        if covered < size:
+            parts.append(np.arange(covered, size))
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def search(
+        self,
+        queries: np.ndarray,
+        top_k: int = 10,
+        nprobe: Optional[int] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """Return the top_k (row, cosine) pairs for each query row"""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        results: List[List[Tuple[int, float]]] = []
+        size, vectors, ivf = self._size, self._vectors, self._ivf
+        if size == 0 or top_k <= 0:
+            return [[] for _ in range(queries.shape[0])]
+
+        alive = self._alive[:size]
+        if ivf is None:
+            # Exhaustive: one matrix product scores the whole batch
+            scores = queries @ vectors[:size].T
+            scores[:, ~alive] = -np.inf
+            all_rows = np.arange(size)
+            for row_scores in scores:
+                results.append(self._top(all_rows, row_scores, top_k))
+            return results
+
+        centroid_scores = queries @ ivf[0].T
+        nprobe = nprobe or self.nprobe
+        for query, cell_scores in zip(queries, centroid_scores):
+            rows = self._candidates(ivf, cell_scores, nprobe, size)
+            rows = rows[alive[rows]]
+            row_scores = vectors[rows] @ query
+            results.append(self._top(rows, row_scores, top_k))
+        return results
+
+    @staticmethod
+    def _top(rows: np.ndarray, scores: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+        finite = np.isfinite(scores)
+        if not finite.all():
+            rows, scores = rows[finite], scores[finite]
+        if rows.size == 0:
+            return []
+        if rows.size > top_k:
+            keep = np.argpartition(-scores, top_k - 1)[:top_k]
+            rows, scores = rows[keep], scores[keep]
+        order = np.argsort(-scores, kind="stable")
+        return [(int(rows[i]), float(scores[i])) for i in order]
+
+    def export_arrays(self) -> Tuple[np.ndarray, List[Hashable], Optional[np.ndarray]]:
+        """Live vectors, their document keys and the trained centroids"""
+        live_rows = np.flatnonzero(self._alive[:self._size])
+        keys = [self.row_keys[row] for row in live_rows]
+        return self._vectors[live_rows], keys, self.centroids
+
+    @classmethod
+    def from_arrays(
+        cls,
+        vectors: np.ndarray,
+        keys: List[Hashable],
+        centroids: Optional[np.ndarray] = None,
+        **kwargs
+    ) -> "VectorIndex":
+        """Rebuild an index around an existing (possibly read-only) matrix
+
+        A read-only matrix, such as a memory-mapped snapshot section, is
+        used in place and only copied on the first append.
+        """
+        index = cls(dimension=vectors.shape[1], **kwargs)
+        index._vectors = vectors
+        index._size = vectors.shape[0]
+        index._alive = np.ones(index._size, dtype=bool)
+        index.row_keys = list(keys)
+        for row, key in enumerate(keys):
+            index.key_rows.setdefault(key, []).append(row)
+        if centroids is not None and centroids.shape[0] > 0:
+            index._trained_size = index._size
+            index._assign_lists(np.array(centroids, dtype=np.float32))
+        return index
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get vector index statistics"""
+        return {
+            "vectors": len(self),
+            "dimension": self.dimension,
+            "nlist": 0 if self.centroids is None else int(self.centroids.shape[0]),
+            "nprobe": self.nprobe,
+            "unindexed": self.unindexed,
+            "bytes": int(self._vectors.nbytes)
+        }
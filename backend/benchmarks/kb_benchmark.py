@@ -0,0 +1,254 @@
+"""
+Knowledge base benchmark harness
+Builds synthetic regulation corpora and measures build cost and query latency
+
+Run from the backend directory:
+
+    python -m benchmarks.kb_benchmark --sizes 1000,10000,100000 --output kb-bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import resource
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple, Iterator
+import numpy as np
+import structlog
+
+from app.core.cache import TTLCache
+from app.services.knowledge_base import KnowledgeBaseService, document_fields, document_passages
+from app.services.search_index import analyze
+
+WORD_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9.\-']*")
+
+QUERY_SHAPES = ("single_term", "multi_term", "filtered", "phrase", "required", "fuzzy")
+
+class SyntheticCorpus:
+    """Regulation-like sections sampled from the built-in knowledge store
+
+    Words are drawn with the frequencies they have in the seed M21-1, 38 CFR
+    and procedures content, so term statistics scale like the real store.
+    """
+
+    def __init__(self, seed: int = 7):
+        self.rng = np.random.default_rng(seed)
+        seed_kb = KnowledgeBaseService(snapshot_dir=None)
+        asyncio.run(self._load_seed(seed_kb))
+
+        counts: Counter = Counter()
+        categories = set()
+        for docs in seed_kb.knowledge_store.values():
+            for item in docs.values():
+                counts.update(WORD_PATTERN.findall(f"{item['title']} {item['content']} {' '.join(item['tags'])}"))
+                categories.add(item["category"])
+
+        self.words = sorted(counts)
+        weights = np.array([counts[word] for word in self.words], dtype=np.float64)
+        self.weights = weights / weights.sum()
+        self.sources = sorted(seed_kb.knowledge_store)
+        self.categories = sorted(categories)
+
+    @staticmethod
+    async def _load_seed(kb: KnowledgeBaseService):
+        await kb._load_m21_content()
+        await kb._load_cfr_content()
+        await kb._load_va_procedures()
+
+    def _text(self, low: int, high: int) -> str:
+        count = int(self.rng.integers(low, high))
+        picks = self.rng.choice(len(self.words), size=count, p=self.weights)
+        return " ".join(self.words[i] for i in picks)
+
+    def sections(self, count: int) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+        """Yield (source, key, document) for count synthetic sections"""
+        for number in range(count):
+            source = self.sources[number % len(self.sources)]
+            yield source, f"{number // 1000}.{number % 1000}", {
+                "title": self._text(4, 9),
+                "content": self._text(80, 300),
+                "category": self.categories[int(self.rng.integers(len(self.categories)))],
+                "tags": self._text(2, 4).split()
+            }
+
+    def queries(self, shape: str, count: int, sample_docs: List[Dict[str, Any]]) -> List[Tuple[str, Optional[List[str]]]]:
+        """(query text, categories) pairs for a query shape"""
+        queries = []
+        for _ in range(count):
+            categories = None
+            if shape == "single_term":
+                text = self._text(1, 2)
+            elif shape == "multi_term":
+                text = self._text(3, 6)
+            elif shape == "filtered":
+                text = self._text(3, 6)
+                picks = self.rng.choice(len(self.categories), size=2, replace=False)
+                categories = [self.categories[i] for i in picks]
+            elif shape == "phrase":
+                words = sample_docs[int(self.rng.integers(len(sample_docs)))]["content"].split()
+                start = int(self.rng.integers(len(words) - 1))
+                text = f'"{words[start]} {words[start + 1]}"'
+            elif shape == "required":
+                text = " ".join(f"+{word}" for word in self._text(2, 4).split())
+            elif shape == "fuzzy":
+                # Drop one letter from a longer word to force a correction
+                candidates = [word for word in self.words if len(word) >= 6 and word.isalpha()]
+                word = candidates[int(self.rng.integers(len(candidates)))]
+                cut = int(self.rng.integers(1, len(word)))
+                text = word[:cut] + word[cut + 1:]
+            else:
+                raise ValueError(f"Unknown query shape: {shape}")
+            queries.append((text, categories))
+        return queries
+
+def _rss_mb() -> float:
+    """Current resident set size (falls back to peak where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1e6
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    values = np.array(samples) * 1000.0
+    return {
+        "count": len(samples),
+        "mean_ms": round(float(values.mean()), 4),
+        "p50_ms": round(float(np.percentile(values, 50)), 4),
+        "p90_ms": round(float(np.percentile(values, 90)), 4),
+        "p99_ms": round(float(np.percentile(values, 99)), 4),
+        "max_ms": round(float(values.max()), 4)
+    }
+
+async def run_size(
+    corpus: SyntheticCorpus,
+    size: int,
+    queries_per_shape: int,
+    mode: str,
+    vectors: bool,
+    snapshot_dir: Optional[str]
+) -> Dict[str, Any]:
+    """Build a knowledge base of size sections and measure it"""
+    kb = KnowledgeBaseService(snapshot_dir=snapshot_dir)
+    kb.initialized = True
+    # Measure the index, not the result cache
+    kb.query_cache = TTLCache(max_size=0)
+
+    rss_before = _rss_mb()
+    sample_docs: List[Dict[str, Any]] = []
+    started = time.perf_counter()
+    for source, key, document in corpus.sections(size):
+        term_freqs, length, term_positions = analyze(document_fields(document))
+        embedded = kb.embedder.embed(document_passages(document)) if vectors else None
+        kb.add_analyzed(source, key, document, term_freqs, length, term_positions, embedded)
+        if len(sample_docs) < 1000:
+            sample_docs.append(document)
+    indexed = time.perf_counter()
+    snapshot_path = await kb.optimize()
+    finished = time.perf_counter()
+
+    result: Dict[str, Any] = {
+        "sections": size,
+        "build": {
+            "index_seconds": round(indexed - started, 3),
+            "optimize_seconds": round(finished - indexed, 3),
+            "sections_per_second": round(size / (indexed - started), 1)
+        },
+        "memory": {
+            "rss_mb": round(_rss_mb(), 1),
+            "rss_delta_mb": round(_rss_mb() - rss_before, 1)
+        },
+        "index": kb.search_index.get_stats(),
+        "vectors": kb.vector_index.get_stats() if vectors else None,
+        "queries": {}
+    }
+
+    if snapshot_path:
+        loaded = KnowledgeBaseService(snapshot_dir=snapshot_dir)
+        load_started = time.perf_counter()
+        loaded._load_snapshot()
+        result["snapshot"] = {
+            "bytes": os.path.getsize(snapshot_path),
+            "load_seconds": round(time.perf_counter() - load_started, 4)
+        }
+
+    query_mode = mode if vectors else "keyword"
+    for shape in QUERY_SHAPES:
+        queries = corpus.queries(shape, queries_per_shape, sample_docs)
+        # Warm up lazily built structures (term dictionary, IVF lists)
+        await kb.query(queries[0][0], categories=queries[0][1], mode=query_mode)
+        samples = []
+        hits = 0
+        for text, categories in queries:
+            query_started = time.perf_counter()
+            response = await kb.query(text, categories=categories, mode=query_mode)
+            samples.append(time.perf_counter() - query_started)
+            hits += bool(response["results"])
+        result["queries"][shape] = {**_percentiles(samples), "with_results": hits}
+
+    return result
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark KnowledgeBaseService on synthetic corpora")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma-separated section counts (e.g. 1000,10000,100000,1000000)")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per shape")
+    parser.add_argument("--mode", default="keyword", choices=["keyword", "vector", "hybrid"])
+    parser.add_argument("--vectors", action="store_true", help="Embed sections (needed for vector/hybrid modes)")
+    parser.add_argument("--snapshot-dir", default=None, help="Also write and time loading a snapshot here")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default=None, help="Write JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    # Keep stdout clean for the JSON report
+    structlog.configure(logger_factory=structlog.PrintLoggerFactory(sys.stderr))
+
+    corpus = SyntheticCorpus(seed=args.seed)
+    report = {
+        "benchmark": "knowledge_base",
+        "commit": _git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {
+            "queries_per_shape": args.queries,
+            "mode": args.mode if args.vectors else "keyword",
+            "vectors": args.vectors,
+            "seed": args.seed,
+            "vocabulary": len(corpus.words)
+        },
+        "results": []
+    }
+
+    for size in (int(value) for value in args.sizes.split(",") if value.strip()):
+        print(f"Benchmarking {size} sections...", file=sys.stderr)
+        report["results"].append(asyncio.run(run_size(
+            corpus, size, args.queries, args.mode, args.vectors, args.snapshot_dir
+        )))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""Shared test setup: import the app package from the backend directory"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,175 @@
+"""Agent orchestrator tests"""
+
+import asyncio
+
+import pytest
+
+from app.services.agent_orchestrator import AgentOrchestrator, TaskNode
+
+CLAIMS = [
+    {"claim_id": 1, "evidence": {"sufficient": True}, "evidence_types": ["STR", "current_diagnosis", "nexus"], "severity": "severe"},
+    {"claim_id": 2, "evidence_types": ["STR"], "severity": "mild"},
+    {"claim_id": 3, "evidence_types": ["STR", "nexus"]},
+    {"claim_id": 4, "severity": "unknown"}
+]
+
+async def _orchestrator() -> AgentOrchestrator:
+    orchestrator = AgentOrchestrator(execution_backends={})
+    await orchestrator.initialize()
+    return orchestrator
+
+def test_batch_claims_match_single_claim_analysis():
+    async def run():
+        orchestrator = await _orchestrator()
+        agent = orchestrator.agents["claims_processor"].agents[0]
+        single = [(await agent._execute_task(claim))["analysis"] for claim in CLAIMS]
+        batch = [result async for result in orchestrator.analyze_claims_batch(CLAIMS, "user_1", chunk_size=3)]
+        return single, batch
+
+    single, batch = asyncio.run(run())
+    assert [result["index"] for result in batch] == [0, 1, 2, 3]
+    for analysis, result in zip(single, batch):
+        for key, value in analysis.items():
+            assert result[key] == value
+    assert batch[2]["missing_evidence"] == ["current_diagnosis"]
+
+def test_batch_claims_report_malformed_claims_per_claim():
+    claims = [
+        {"claim_id": "bad-evidence", "evidence": "yes"},
+        {"claim_id": "bad-severity", "severity": ["severe"]},
+        {"claim_id": "bad-types", "evidence_types": "STR"},
+        "not a claim",
+        CLAIMS[0]
+    ]
+
+    async def run():
+        orchestrator = await _orchestrator()
+        return [result async for result in orchestrator.analyze_claims_batch(claims, "user_1")]
+
+    results = asyncio.run(run())
+    assert [result.get("error") is not None for result in results] == [True, True, True, True, False]
+    assert results[0]["claim_id"] == "bad-evidence"
+    assert results[4]["claim_id"] == 1
+    assert results[4]["evidence_status"] == "complete"
+
+def test_agent_stats_keep_agent_id_alongside_pool_instances():
+    async def run():
+        orchestrator = AgentOrchestrator(pool_size=2, execution_backends={})
+        await orchestrator.initialize()
+        return orchestrator.get_agent_stats()["claims_processor"]
+
+    stats = asyncio.run(run())
+    assert stats["agent_id"] == stats["agent_ids"][0]
+    assert len(stats["agent_ids"]) == 2
+
+def _recording(orchestrator: AgentOrchestrator, failing=(), delay: float = 0.0):
+    """Replace agent execution with a stub that echoes each node's task"""
+    calls = []
+
+    async def process(agent_type, task, user_id, priority=None):
+        calls.append((task["step"], dict(task.get("inputs", {}))))
+        await asyncio.sleep(delay)
+        if task["step"] in failing:
+            return {"error": f"{task['step']} failed"}
+        return {"result": {"summary": f"{task['step']} done", "step": task["step"]}}
+
+    orchestrator.process_with_agent = process
+    return calls
+
+def _node(node_id: str, inputs=(), outputs=()):
+    return TaskNode(
+        node_id=node_id,
+        agent_type="general_assistant",
+        task={"step": node_id},
+        inputs=list(inputs),
+        outputs=list(outputs)
+    )
+
+def test_invalid_task_graphs_are_rejected():
+    async def run():
+        orchestrator = await _orchestrator()
+        graphs = [
+            [_node("a", inputs=["b"]), _node("b", inputs=["a"]), _node("c")],
+            [_node("a", inputs=["missing"])],
+            [_node("a", outputs=["x"]), _node("b", outputs=["x"])],
+            [_node("a"), _node("a")]
+        ]
+        errors = []
+        for graph in graphs:
+            with pytest.raises(ValueError) as error:
+                await orchestrator.coordinate_agents({}, graph, "user_1")
+            errors.append(str(error.value))
+        return errors
+
+    errors = asyncio.run(run())
+    assert errors[0] == "Task graph has a cycle through: a, b"
+    assert "unknown inputs: missing" in errors[1]
+    assert "Output x produced by both a and b" in errors[2]
+    assert "Duplicate task node a" in errors[3]
+
+def test_nodes_receive_upstream_outputs_and_independent_nodes_overlap():
+    async def run():
+        orchestrator = await _orchestrator()
+        calls = _recording(orchestrator, delay=0.1)
+        graph = [
+            _node("extract", outputs=["summary", "step"]),
+            _node("review", inputs=["summary"]),
+            _node("audit", inputs=["step"]),
+            _node("report", inputs=["review", "audit"])
+        ]
+        return calls, await orchestrator.coordinate_agents({"claim_id": 7}, graph, "user_1")
+
+    calls, result = asyncio.run(run())
+    inputs = dict(calls)
+    assert inputs["review"] == {"summary": "extract done"}
+    assert inputs["audit"] == {"step": "extract"}
+    assert inputs["report"]["review"] == {"summary": "review done", "step": "review"}
+    assert calls[-1][0] == "report"
+
+    timings = result["timings"]
+    assert timings["review"]["start_ms"] >= timings["extract"]["end_ms"]
+    assert timings["audit"]["start_ms"] < timings["review"]["end_ms"]
+    # Three levels of 100ms nodes: the critical path, not the sum of all four
+    assert result["elapsed_ms"] < 390
+
+def test_failed_node_skips_everything_downstream():
+    async def run():
+        orchestrator = await _orchestrator()
+        calls = _recording(orchestrator, failing={"extract"})
+        graph = [
+            _node("extract"),
+            _node("review", inputs=["extract"]),
+            _node("report", inputs=["review"]),
+            _node("notify")
+        ]
+        return calls, await orchestrator.coordinate_agents({}, graph, "user_1")
+
+    calls, result = asyncio.run(run())
+    results = result["coordinated_results"]
+    assert sorted(step for step, _ in calls) == ["extract", "notify"]
+    assert results["review"]["error_code"] == "UPSTREAM_FAILED"
+    assert results["review"]["error"] == "Skipped: upstream extract failed"
+    assert results["report"]["error"] == "Skipped: upstream review failed"
+    assert "error" not in results["notify"]
+    assert set(result["timings"]) == {"extract", "notify"}
+
+def test_node_timeout_covers_the_queue_wait(monkeypatch):
+    async def run():
+        orchestrator = AgentOrchestrator(pool_size=1, queue_timeout_seconds=5, execution_backends={})
+        await orchestrator.initialize()
+        permissions = orchestrator.agents["quality_auditor"].agents[0].permissions
+        monkeypatch.setattr(permissions, "timeout_seconds", 0.05)
+        graph = [
+            TaskNode(node_id="audit", agent_type="quality_auditor"),
+            TaskNode(node_id="follow_up", agent_type="general_assistant", inputs=["audit"]),
+            TaskNode(node_id="answer", agent_type="general_assistant", task={"query": "hello"})
+        ]
+        async with orchestrator.agents["quality_auditor"].acquire("someone_else"):
+            result = await orchestrator.coordinate_agents({}, graph, "user_1")
+        return result["coordinated_results"], orchestrator.agents["quality_auditor"].get_stats()
+
+    results, stats = asyncio.run(run())
+    assert results["audit"]["error_code"] == "AGENT_TIMEOUT"
+    assert results["follow_up"]["error_code"] == "UPSTREAM_FAILED"
+    assert "error" not in results["answer"]
+    assert (stats["queue_depth"], stats["in_use"]) == (0, 0)
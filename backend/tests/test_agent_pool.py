@@ -0,0 +1,207 @@
+"""Agent pools: bounded instances, priority scheduling and load shedding"""
+import asyncio
+
+import pytest
+
+from app.services.agent_orchestrator import AgentOrchestrator
+from app.services.agent_pool import AgentOverloaded, AgentPool, TaskPriority
+
+def test_pool_needs_an_agent():
+    with pytest.raises(ValueError):
+        AgentPool("claims_processor", [])
+
+def test_concurrent_work_is_bounded_by_pool_size():
+    pool = AgentPool("claims_processor", ["a", "b"], max_queue=10)
+    running = []
+    peak = []
+
+    async def work(n: int):
+        async with pool.acquire(f"user_{n}") as agent:
+            running.append(agent)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.remove(agent)
+
+    async def run():
+        await asyncio.gather(*(work(n) for n in range(6)))
+
+    asyncio.run(run())
+    stats = pool.get_stats()
+    assert max(peak) == 2
+    assert (stats["submitted"], stats["in_use"], stats["queue_depth"]) == (6, 0, 0)
+    assert stats["peak_queue_depth"] == 4
+
+def test_full_queue_sheds_immediately():
+    pool = AgentPool("claims_processor", ["a"], max_queue=1, queue_timeout_seconds=5)
+
+    async def run():
+        async with pool.acquire("user_1"):
+            queued = asyncio.create_task(_hold(pool, "user_2"))
+            await asyncio.sleep(0)
+            with pytest.raises(AgentOverloaded) as overloaded:
+                async with pool.acquire("user_3"):
+                    pass
+        await queued
+        return overloaded.value
+
+    error = asyncio.run(run())
+    assert error.role == "claims_processor"
+    assert error.reason == "normal queue full"
+    stats = pool.get_stats()
+    assert (stats["rejected"], stats["submitted"], stats["in_use"]) == (1, 3, 0)
+
+async def _hold(pool: AgentPool, user_id: str, priority: TaskPriority = TaskPriority.NORMAL):
+    async with pool.acquire(user_id, priority) as agent:
+        return agent
+
+def test_queue_wait_times_out_and_cancelled_waiters_leave_no_trace():
+    pool = AgentPool("claims_processor", ["a"], max_queue=4, queue_timeout_seconds=0.02)
+
+    async def run():
+        async with pool.acquire("user_1"):
+            with pytest.raises(AgentOverloaded, match="timed out"):
+                await _hold(pool, "user_2")
+            cancelled = asyncio.create_task(_hold(pool, "user_3"))
+            await asyncio.sleep(0)
+            cancelled.cancel()
+            await asyncio.gather(cancelled, return_exceptions=True)
+        # The agent went back to the idle list rather than to a dead waiter
+        return await _hold(pool, "user_4")
+
+    assert asyncio.run(run()) == "a"
+    stats = pool.get_stats()
+    assert (stats["queue_timeouts"], stats["queue_depth"], stats["in_use"], stats["active_users"]) == (1, 0, 0, 0)
+
+def test_saturated_role_returns_overload_error():
+    async def run():
+        orchestrator = AgentOrchestrator(pool_size=1, queue_limit=0, execution_backends={})
+        await orchestrator.initialize()
+        pool = orchestrator.agents["general_assistant"]
+        async with pool.acquire("user_1"):
+            shed = await orchestrator.process_with_agent("general_assistant", {"query": "hello"}, "user_2")
+        served = await orchestrator.process_with_agent("general_assistant", {"query": "hello"}, "user_2")
+        return shed, served, pool.get_stats(), orchestrator.get_agent_stats()
+
+    shed, served, pool_stats, agent_stats = asyncio.run(run())
+    assert shed["error_code"] == "AGENT_OVERLOADED"
+    assert "error" not in served
+    assert pool_stats["rejected"] == 1
+    assert agent_stats["general_assistant"]["pool"]["rejected"] == 1
+
+def test_slow_agent_returns_timeout_error(monkeypatch):
+    async def run():
+        orchestrator = AgentOrchestrator(pool_size=1, execution_backends={})
+        await orchestrator.initialize()
+        agent = orchestrator.agents["general_assistant"].agents[0]
+
+        async def slow(task, workers=None):
+            await asyncio.sleep(1)
+
+        monkeypatch.setattr(agent, "process", slow)
+        monkeypatch.setattr(agent.permissions, "timeout_seconds", 0.02)
+        result = await orchestrator.process_with_agent("general_assistant", {"query": "hello"}, "user_1")
+        return result, orchestrator.agents["general_assistant"].get_stats()
+
+    result, stats = asyncio.run(run())
+    assert result["error_code"] == "AGENT_TIMEOUT"
+    assert stats["in_use"] == 0
+
+def _grant_order(pool: AgentPool, holders, waiters, pause: float = 0.0):
+    """Users in the order they get an instance once the holders let go"""
+    order = []
+
+    async def wait(user_id: str, priority: TaskPriority):
+        async with pool.acquire(user_id, priority):
+            order.append(user_id)
+            await asyncio.sleep(0)
+
+    async def run():
+        releases = []
+        for user_id in holders:
+            release = asyncio.Event()
+            releases.append(release)
+
+            async def hold(user_id=user_id, release=release):
+                async with pool.acquire(user_id):
+                    await release.wait()
+
+            asyncio.create_task(hold())
+            await asyncio.sleep(0)
+        tasks = []
+        for user_id, priority in waiters:
+            tasks.append(asyncio.create_task(wait(user_id, priority)))
+            await asyncio.sleep(0)
+            if pause:
+                await asyncio.sleep(pause)
+        releases[-1].set()
+        await asyncio.gather(*tasks)
+        for release in releases:
+            release.set()
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    return order
+
+def test_higher_priority_classes_are_served_first():
+    pool = AgentPool("document_analyzer", ["a"], aging_seconds=60)
+    order = _grant_order(pool, ["holder"], [
+        ("batch", TaskPriority.BATCH),
+        ("normal", TaskPriority.NORMAL),
+        ("interactive", TaskPriority.INTERACTIVE),
+        ("interactive_2", TaskPriority.INTERACTIVE)
+    ])
+
+    assert order == ["interactive", "interactive_2", "normal", "batch"]
+    assert set(pool.get_stats()["classes"]) == {"interactive", "normal", "batch"}
+
+def test_waiting_batch_work_ages_past_newer_interactive_work():
+    pool = AgentPool("document_analyzer", ["a"], aging_seconds=0.01)
+    order = _grant_order(pool, ["holder"], [
+        ("batch", TaskPriority.BATCH),
+        ("interactive", TaskPriority.INTERACTIVE)
+    ], pause=0.05)
+
+    assert order == ["batch", "interactive"]
+    assert pool.get_stats()["classes"]["batch"]["wait_ms_p50"] >= 50
+
+def test_users_holding_fewer_instances_go_first_within_a_class():
+    pool = AgentPool("claims_processor", ["a", "b"], aging_seconds=60)
+    order = _grant_order(pool, ["busy_user", "other"], [
+        ("busy_user", TaskPriority.NORMAL),
+        ("busy_user", TaskPriority.NORMAL),
+        ("quiet_user", TaskPriority.NORMAL)
+    ])
+
+    assert order == ["quiet_user", "busy_user", "busy_user"]
+
+def test_queue_limits_apply_per_class():
+    pool = AgentPool("document_analyzer", ["a"], max_queue=1)
+
+    async def run():
+        async with pool.acquire("holder"):
+            queued = [
+                asyncio.create_task(_hold(pool, "batch", TaskPriority.BATCH)),
+                asyncio.create_task(_hold(pool, "interactive", TaskPriority.INTERACTIVE))
+            ]
+            await asyncio.sleep(0)
+            with pytest.raises(AgentOverloaded, match="batch queue full"):
+                await _hold(pool, "batch_2", TaskPriority.BATCH)
+            depth = {name: info["queue_depth"] for name, info in pool.get_stats()["classes"].items()}
+        await asyncio.gather(*queued)
+        return depth
+
+    assert asyncio.run(run()) == {"interactive": 1, "normal": 0, "batch": 1}
+    assert pool.get_stats()["rejected"] == 1
+
+def test_bulk_roles_default_to_the_batch_class():
+    async def run():
+        orchestrator = AgentOrchestrator(execution_backends={})
+        await orchestrator.initialize()
+        await orchestrator.process_with_agent("document_analyzer", {"documents": []}, "user_1")
+        await orchestrator.process_with_agent("general_assistant", {"query": "hello"}, "user_1")
+        await orchestrator.process_with_agent(
+            "general_assistant", {"query": "hello"}, "user_1", priority=TaskPriority.INTERACTIVE
+        )
+        return [record["priority"] for record in orchestrator.request_log.recent()]
+
+    assert asyncio.run(run()) == ["batch", "normal", "interactive"]
@@ -0,0 +1,100 @@
+"""Agent worker processes: results, failures and cancellation"""
+import asyncio
+import math
+import operator
+import os
+import time
+
+import pytest
+
+from app.services.agent_orchestrator import AgentOrchestrator
+from app.services.agent_workers import AgentWorkerError, WorkerPool
+
+def test_jobs_run_in_other_processes_and_failures_are_reported():
+    async def run():
+        pool = WorkerPool(size=2)
+        try:
+            results = await asyncio.gather(pool.run(math.factorial, 20), pool.run(os.getpid))
+            with pytest.raises(AgentWorkerError, match="ZeroDivisionError"):
+                await pool.run(operator.truediv, 1, 0)
+            with pytest.raises(AgentWorkerError, match="could not be sent"):
+                await pool.run(lambda: 1)
+            # Both failures leave the worker usable
+            after = await pool.run(operator.add, 2, 3)
+            return results, after, pool.get_stats()
+        finally:
+            await pool.shutdown()
+
+    (factorial, pid), after, stats = asyncio.run(run())
+    assert factorial == math.factorial(20)
+    assert pid != os.getpid()
+    assert after == 5
+    assert (stats["workers"], stats["completed"], stats["failed"], stats["restarts"]) == (2, 3, 2, 0)
+
+def test_dead_worker_is_replaced():
+    async def run():
+        pool = WorkerPool(size=1)
+        try:
+            first = await pool.run(os.getpid)
+            with pytest.raises(AgentWorkerError, match="died"):
+                await pool.run(os._exit, 1)
+            second = await pool.run(os.getpid)
+            return first, second, pool.get_stats()
+        finally:
+            await pool.shutdown()
+
+    first, second, stats = asyncio.run(run())
+    assert first != second
+    assert (stats["workers"], stats["failed"], stats["restarts"]) == (1, 1, 1)
+
+def test_timeout_kills_the_running_job():
+    async def run():
+        pool = WorkerPool(size=1)
+        try:
+            before = await pool.run(os.getpid)
+            started = time.monotonic()
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(pool.run(time.sleep, 30), timeout=0.5)
+            # A fresh worker takes the next job without waiting out the sleep
+            after = await pool.run(os.getpid)
+            return before, after, time.monotonic() - started, pool.get_stats()
+        finally:
+            await pool.shutdown()
+
+    before, after, elapsed, stats = asyncio.run(run())
+    assert before != after
+    assert elapsed < 15
+    assert (stats["cancelled"], stats["restarts"], stats["busy"]) == (1, 1, 0)
+
+def test_shutdown_stops_every_worker():
+    async def run():
+        pool = WorkerPool(size=2)
+        pool.start()
+        processes = [worker.process for worker in pool._workers]
+        await pool.shutdown()
+        return pool, processes
+
+    pool, processes = asyncio.run(run())
+    assert not pool.started
+    assert not any(process.is_alive() for process in processes)
+    assert pool.get_stats()["workers"] == 0
+
+def test_process_backend_matches_inline_results():
+    records = [{"claim_id": n, "days_pending": float(n % 2 * 100 + n), "status": "open"} for n in range(20)]
+    task = {"data": records, "k": 5}
+
+    async def run(backends):
+        orchestrator = AgentOrchestrator(execution_backends=backends, process_workers=1)
+        await orchestrator.initialize()
+        try:
+            result = await orchestrator.process_with_agent("leiden_analyzer", task, "user_1")
+            return result, orchestrator.get_agent_stats()["leiden_analyzer"]
+        finally:
+            await orchestrator.shutdown()
+
+    pooled, stats = asyncio.run(run({"leiden_analyzer": "process"}))
+    inline, _ = asyncio.run(run({}))
+    assert stats["backend"] == "process"
+    assert stats["workers"]["completed"] == 1
+    assert pooled["result"]["clusters"] == inline["result"]["clusters"]
+    assert pooled["result"]["patterns"] == inline["result"]["patterns"]
@@ -0,0 +1,120 @@
+"""LRU/TTL cache, in-flight coalescing and knowledge base query caching"""
+import asyncio
+
+import pytest
+
+from app.core.cache import SingleFlight, TTLCache
+from app.services.knowledge_base import KnowledgeBaseService
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(max_size=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.get_stats()["evictions"] == 1
+
+def test_expired_entries_miss_and_are_dropped():
+    cache = TTLCache(max_size=4, ttl_seconds=60)
+    cache.set("stale", 1, ttl_seconds=0)
+    cache.set("fresh", 2)
+
+    assert cache.get("stale", "default") == "default"
+    assert len(cache) == 1
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"]) == (0, 1, 1)
+    assert cache.get("fresh") == 2
+
+def test_zero_size_cache_stores_nothing():
+    cache = TTLCache(max_size=0)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+def test_query_results_are_cached_until_the_index_changes():
+    async def run():
+        kb_service = KnowledgeBaseService(snapshot_dir=None)
+        await kb_service.initialize()
+        first = await kb_service.query("service connection", mode="keyword")
+        first["results"][0]["title"] = "changed by the caller"
+        second = await kb_service.query("service connection", mode="keyword")
+        filtered = await kb_service.query("service connection", categories=["presumptive"], mode="keyword")
+        hits = kb_service.query_cache.get_stats()["hits"]
+
+        await kb_service.add_document("38CFR", "3.310", {
+            "title": "Secondary Service Connection",
+            "content": "Disability proximately due to a service-connected condition is service connected.",
+            "category": "service_connection",
+            "tags": ["service connection"]
+        })
+        third = await kb_service.query("service connection", top_k=10, mode="keyword")
+        return second, filtered, hits, third, kb_service.query_cache.get_stats()
+
+    second, filtered, hits, third, stats = asyncio.run(run())
+    assert hits == 1
+    assert second["results"][0]["title"] != "changed by the caller"
+    assert filtered["results"]
+    assert {result["category"] for result in filtered["results"]} == {"presumptive"}
+    assert any(result["section"] == "3.310" for result in third["results"])
+    assert stats["hits"] == 1
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+
+    async def work(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return {"key": key}
+
+    async def run():
+        results = await asyncio.gather(*(flight.do(key, lambda key=key: work(key)) for key in "aaab"))
+        in_flight = "a" in flight
+        again = await flight.do("a", lambda: work("a"))
+        return results, in_flight, again
+
+    results, in_flight, again = asyncio.run(run())
+    assert [result["key"] for result in results] == ["a", "a", "a", "b"]
+    assert results[0] is results[1]
+    assert not in_flight and len(flight) == 0
+    # Results are not cached once the call finishes
+    assert again == {"key": "a"} and calls == ["a", "b", "a"]
+    stats = flight.get_stats()
+    assert (stats["executions"], stats["coalesced"], stats["in_flight"]) == (3, 2, 0)
+
+def test_failures_reach_every_waiter_and_release_the_key():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("agent failed")
+
+    async def run():
+        results = await asyncio.gather(flight.do("k", fail), flight.do("k", fail), return_exceptions=True)
+        return results, "k" in flight
+
+    results, in_flight = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert not in_flight
+
+def test_cancelled_caller_does_not_cancel_the_shared_call():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def run():
+        first = asyncio.create_task(flight.do("k", work))
+        second = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == "done"
+    assert flight.get_stats()["executions"] == 1
@@ -0,0 +1,81 @@
+"""Append-only chat log: cursor pagination and tombstone clears"""
+import asyncio
+
+from app.services.agent_orchestrator import AgentOrchestrator
+from app.services.chat_log import ChatLog
+from app.services.knowledge_base import KnowledgeBaseService
+from app.services.qbit_chatbot import QBitChatbot
+
+def _turns(start: int, count: int):
+    return [{"role": "user", "content": f"turn {n}", "metadata": {"n": n}} for n in range(start, start + count)]
+
+def _pages(chat_log: ChatLog, user_id: str, session_id: str, limit: int):
+    async def run():
+        pages = []
+        cursor = None
+        while True:
+            page = await chat_log.page(user_id, session_id, limit=limit, cursor=cursor)
+            pages.append(page)
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return pages
+
+    return asyncio.run(run())
+
+def test_pages_walk_back_from_newest_without_gaps(tmp_path):
+    chat_log = ChatLog(str(tmp_path / "chat.db"))
+    assert asyncio.run(chat_log.append("user_1", "s", _turns(0, 7))) == 7
+    asyncio.run(chat_log.append("user_1", "other", _turns(100, 2)))
+    asyncio.run(chat_log.append("user_2", "s", _turns(200, 2)))
+
+    pages = _pages(chat_log, "user_1", "s", limit=3)
+    assert [[message["content"] for message in page["messages"]] for page in pages] == [
+        ["turn 4", "turn 5", "turn 6"], ["turn 1", "turn 2", "turn 3"], ["turn 0"]
+    ]
+    assert [page["has_more"] for page in pages] == [True, True, False]
+    assert pages[0]["messages"][0]["metadata"] == {"n": 4}
+    chat_log.close()
+
+def test_exact_page_boundary_has_no_empty_trailing_page():
+    chat_log = ChatLog(":memory:")
+    asyncio.run(chat_log.append("user_1", "s", _turns(0, 4)))
+
+    pages = _pages(chat_log, "user_1", "s", limit=2)
+    assert len(pages) == 2
+    assert pages[-1]["has_more"] is False
+    assert _pages(chat_log, "user_1", "missing", limit=2)[0] == {
+        "messages": [], "next_cursor": None, "has_more": False
+    }
+
+def test_clear_hides_earlier_turns_and_keeps_later_ones(tmp_path):
+    path = str(tmp_path / "chat.db")
+    chat_log = ChatLog(path)
+    asyncio.run(chat_log.append("user_1", "s", _turns(0, 3)))
+    asyncio.run(chat_log.append("user_1", "keep", _turns(10, 1)))
+    assert asyncio.run(chat_log.clear("user_1", "s")) == 3
+    asyncio.run(chat_log.append("user_1", "s", _turns(3, 1)))
+    chat_log.close()
+
+    # The log and its tombstones survive a restart
+    reopened = ChatLog(path)
+    assert [message["content"] for message in _pages(reopened, "user_1", "s", 10)[0]["messages"]] == ["turn 3"]
+    assert len(_pages(reopened, "user_1", "keep", 10)[0]["messages"]) == 1
+    assert asyncio.run(reopened.clear("user_1", "never-used")) == 0
+    reopened.close()
+
+def test_chatbot_logs_each_exchange():
+    async def run():
+        kb_service = KnowledgeBaseService(snapshot_dir=None)
+        await kb_service.initialize()
+        orchestrator = AgentOrchestrator(kb_service=kb_service, execution_backends={})
+        await orchestrator.initialize()
+        chat_log = ChatLog(":memory:")
+        chatbot = QBitChatbot(kb_service, orchestrator, chat_log=chat_log)
+        await chatbot.process_message("user_1", "s", "hello there")
+        return await chat_log.page("user_1", "s")
+
+    page = asyncio.run(run())
+    assert [message["role"] for message in page["messages"]] == ["user", "assistant"]
+    assert page["messages"][0]["content"] == "hello there"
+    assert page["messages"][0]["metadata"] == {"intent": "general"}
+    assert page["messages"][1]["metadata"] == {"type": "chat"}
@@ -0,0 +1,130 @@
+"""Shared conversation store: per-session history and bounded size"""
+import asyncio
+
+from app import main_simplified
+from app.services.agent_orchestrator import AgentOrchestrator
+from app.services.conversation_store import ConversationStore
+from app.services.knowledge_base import KnowledgeBaseService
+from app.services.qbit_chatbot import QBitChatbot
+
+def test_history_is_kept_per_user_and_session():
+    store = ConversationStore()
+    store.append("user_1", "a", "user", "first")
+    store.append("user_1", "a", "assistant", "reply", type="chat")
+    store.append("user_1", "b", "user", "other session")
+    store.append("user_2", "a", "user", "other user")
+
+    history = store.history("user_1", "a")
+    assert [(turn["role"], turn["content"]) for turn in history] == [("user", "first"), ("assistant", "reply")]
+    assert history[1]["type"] == "chat" and "_bytes" not in history[1]
+    assert [turn["content"] for turn in store.history("user_1", "a", limit=1)] == ["reply"]
+    assert store.history("user_2", "b") == []
+    assert len(store) == 3
+
+    assert store.clear("user_1", "a")
+    assert not store.clear("user_1", "a")
+    assert store.history("user_1", "a") == []
+
+def test_least_recently_active_conversation_is_evicted():
+    store = ConversationStore(max_sessions=2)
+    store.append("user_1", "s", "user", "one")
+    store.append("user_2", "s", "user", "two")
+    store.append("user_1", "s", "user", "one again")
+    store.append("user_3", "s", "user", "three")
+
+    assert store.history("user_2", "s") == []
+    assert len(store.history("user_1", "s")) == 2
+    assert store.get_stats()["evictions"] == 1
+    assert len(store) == 2
+
+def test_idle_conversations_expire():
+    store = ConversationStore(idle_seconds=0)
+    store.append("user_1", "s", "user", "hello")
+
+    assert store.history("user_1", "s") == []
+    assert store.get_stats()["expirations"] == 1
+    assert store.prune() == 0
+    assert len(store) == 0
+
+def test_disabled_store_keeps_nothing():
+    store = ConversationStore(max_sessions=0)
+    store.append("user_1", "s", "user", "hello")
+    assert len(store) == 0
+
+def test_one_chatbot_serves_many_sessions_from_the_shared_store():
+    async def run():
+        kb_service = KnowledgeBaseService(snapshot_dir=None)
+        await kb_service.initialize()
+        orchestrator = AgentOrchestrator(kb_service=kb_service, execution_backends={})
+        await orchestrator.initialize()
+        store = ConversationStore(max_sessions=3)
+        chatbot = QBitChatbot(kb_service, orchestrator, conversations=store)
+        for n in range(4):
+            await chatbot.process_message(f"user_{n}", "session", "hello there")
+        return store
+
+    store = asyncio.run(run())
+    assert len(store) == 3
+    assert store.history("user_0", "session") == []
+    history = store.history("user_3", "session")
+    assert [turn["role"] for turn in history] == ["user", "assistant"]
+    assert history[0]["content"] == "hello there"
+    assert history[1]["content"]
+
+def _measured_bytes(store: ConversationStore) -> int:
+    return sum(conversation.bytes for conversation in store._sessions.values())
+
+def test_turns_leaving_the_ring_buffer_are_compacted():
+    store = ConversationStore(max_turns=3)
+    for n in range(7):
+        store.append("user_1", "s", "user", f"message {n}", intent="claim_query" if n % 2 else "general")
+
+    assert [turn["content"] for turn in store.history("user_1", "s")] == ["message 4", "message 5", "message 6"]
+    summary = store.summary("user_1", "s")
+    assert summary["turns"] == 4
+    assert summary["intents"] == {"general": 2, "claim_query": 2}
+    assert summary["first_timestamp"] <= summary["last_timestamp"]
+    stats = store.get_stats()
+    assert (stats["turns"], stats["compacted_turns"]) == (3, 4)
+    assert store.summary("user_2", "s") is None
+
+def test_stored_content_is_capped():
+    store = ConversationStore(max_content_chars=10)
+    store.append("user_1", "s", "user", "x" * 5000)
+    assert store.history("user_1", "s")[0]["content"] == "x" * 10
+
+def test_memory_gauge_tracks_appends_compaction_and_drops():
+    store = ConversationStore(max_sessions=2, max_turns=2)
+    for n in range(6):
+        store.append("user_1", "s", "user", "long message " * 20)
+        store.append(f"user_{n % 3}", "t", "assistant", "reply", type="chat")
+        assert store.approx_bytes == _measured_bytes(store) > 0
+
+    # Compaction keeps a conversation's footprint flat as it grows
+    single = ConversationStore(max_turns=2)
+    sizes = []
+    for n in range(10):
+        single.append("user_1", "s", "user", "message", intent="general")
+        sizes.append(single.approx_bytes)
+    assert sizes[-1] == sizes[-2] == sizes[-3]
+
+    for user_id, session_id in list(store._sessions):
+        store.clear(user_id, session_id)
+    assert store.approx_bytes == 0
+
+def test_simplified_service_records_each_exchange_once_per_session():
+    store = ConversationStore(max_turns=4)
+    service = main_simplified.QBitService(main_simplified.storage.knowledge_base, store)
+
+    async def run():
+        for _ in range(3):
+            await service.process_message("user_1", "What is service connection?", session_id="a")
+        return await service.process_message("user_1", "hello", session_id="b")
+
+    asyncio.run(run())
+    history = store.history("user_1", "a")
+    assert [turn["role"] for turn in history] == ["user", "assistant"] * 2
+    assert history[-1]["citations"] == ["M21-1 Part III.i.1", "38 CFR 3.303"]
+    assert "suggestions" not in history[-1]
+    assert store.summary("user_1", "a")["intents"] == {"service_connection": 1}
+    assert len(store.history("user_1", "b")) == 2
@@ -0,0 +1,58 @@
+"""Facet-partitioned postings: filtered search and facet counts"""
+import asyncio
+
+from app.services.knowledge_base import KnowledgeBaseService
+from app.services.search_index import InvertedIndex
+
+def _index() -> InvertedIndex:
+    index = InvertedIndex()
+    index.add_document("ptsd", [("ptsd rating criteria", 1)], facets={"source": "M21-1", "category": "mental_health"})
+    index.add_document("4.130", [("mental disorders rating", 1)], facets={"source": "38CFR", "category": "rating_schedule"})
+    index.add_document("4.71a", [("spine rating", 1)], facets={"source": "38CFR", "category": "rating_schedule"})
+    index.add_document("tdiu", [("unemployability rating", 1)], facets={"source": "VA_procedures"})
+    return index
+
+def _keys(index: InvertedIndex, terms, facet_filter=None):
+    hits, total = index.search(terms, top_k=10, facet_filter=facet_filter)
+    return sorted(index.doc_keys[doc_id] for doc_id, _ in hits), total
+
+def test_filtered_search_only_scores_allowed_partitions():
+    index = _index()
+
+    assert _keys(index, ["rating"], {"source": ["38CFR"]}) == (["4.130", "4.71a"], 2)
+    assert _keys(index, ["rating"], {"category": ["mental_health", "rating_schedule"]})[1] == 3
+    assert _keys(index, ["rating"], {"category": ["unknown"]}) == ([], 0)
+    assert _keys(index, ["rating"])[1] == 4
+
+def test_documents_without_a_value_never_match_a_filter():
+    index = _index()
+    assert "tdiu" not in _keys(index, ["unemployability"], {"category": ["mental_health"]})[0]
+
+    # A field first seen on a later document leaves earlier ones unset
+    index.add_document("fdc", [("fully developed rating", 1)], facets={"source": "VA_procedures", "track": "fast"})
+    assert _keys(index, ["rating"], {"track": ["fast"]}) == (["fdc"], 1)
+
+def test_facet_counts_follow_deletes_and_queries():
+    index = _index()
+    assert index.facet_counts(["source"]) == {"source": {"M21-1": 1, "38CFR": 2, "VA_procedures": 1}}
+
+    index.delete_document("4.71a")
+    assert index.facet_counts(["category"]) == {"category": {"mental_health": 1, "rating_schedule": 1}}
+    assert index.facet_counts(["source"], terms=["spine", "ptsd"]) == {"source": {"M21-1": 1}}
+    assert index.facet_counts(
+        ["category"], terms=["rating"], facet_filter={"source": ["38CFR"]}
+    ) == {"category": {"rating_schedule": 1}}
+
+def test_category_filtered_knowledge_base_query():
+    async def run():
+        kb_service = KnowledgeBaseService(snapshot_dir=None)
+        await kb_service.initialize()
+        filtered = await kb_service.query("rating", categories=["rating_schedule"], mode="keyword")
+        facets = await kb_service.get_facets("rating")
+        return filtered, facets, kb_service.get_categories()
+
+    filtered, facets, categories = asyncio.run(run())
+    assert filtered["results"]
+    assert {result["category"] for result in filtered["results"]} == {"rating_schedule"}
+    assert filtered["total_found"] == facets["category"]["rating_schedule"]
+    assert "rating_schedule" in categories
@@ -0,0 +1,112 @@
+"""kNN graph construction and community detection over claim features"""
+import numpy as np
+
+from app.services import graph_clustering
+from app.services.graph_clustering import (
+    analyze_patterns, encode_records, knn, knn_graph, louvain, modularity
+)
+
+def _blobs(sizes, dimensions: int = 4, spread: float = 0.3, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(scale=10.0, size=(len(sizes), dimensions))
+    vectors = np.concatenate([
+        center + rng.normal(scale=spread, size=(size, dimensions)) for center, size in zip(centers, sizes)
+    ]).astype(np.float32)
+    labels = np.repeat(np.arange(len(sizes)), sizes)
+    return vectors, labels
+
+def _brute_force(vectors: np.ndarray, k: int) -> np.ndarray:
+    squared = ((vectors[:, None, :] - vectors[None, :, :]) ** 2).sum(axis=2)
+    np.fill_diagonal(squared, np.inf)
+    return np.argsort(squared, axis=1, kind="stable")[:, :k]
+
+def test_records_encode_numbers_and_flags_without_identifiers():
+    records = [
+        {"claim_id": "a", "age": 30, "status": "pending", "conditions": ["ptsd", "tinnitus"], "fdc": True},
+        {"claim_id": "b", "age": 50, "status": "closed", "conditions": ["tinnitus"], "fdc": False},
+        {"claim_id": "c", "status": "pending"}
+    ]
+    matrix, names, flags = encode_records(records)
+
+    assert names[0] == "age"
+    assert "claim_id" not in " ".join(names)
+    assert set(names[1:]) == {
+        "status=pending", "status=closed", "conditions=ptsd", "conditions=tinnitus", "fdc=true", "fdc=false"
+    }
+    assert list(flags) == [False] + [True] * 6
+    # A missing number takes the column mean
+    assert matrix[2, 0] == 40.0
+    assert matrix[0, names.index("conditions=ptsd")] == 1.0
+    assert matrix[2].sum() == 41.0
+
+def test_exact_knn_matches_brute_force():
+    vectors = np.random.default_rng(1).normal(size=(120, 5)).astype(np.float32)
+    indices, distances = knn(vectors, k=6)
+
+    assert (indices == _brute_force(vectors, 6)).mean() > 0.99
+    assert (np.diff(distances, axis=1) >= 0).all()
+    assert not (indices == np.arange(120)[:, None]).any()
+
+def test_bucketed_knn_keeps_most_true_neighbours(monkeypatch):
+    vectors, _ = _blobs([150, 150, 100], spread=1.0, seed=2)
+    monkeypatch.setattr(graph_clustering, "EXACT_KNN_LIMIT", 50)
+    indices, _ = knn(vectors, k=8, nprobe=4)
+
+    truth = _brute_force(vectors, 8)
+    recall = np.mean([len(set(found) & set(expected)) / 8 for found, expected in zip(indices, truth)])
+    assert recall > 0.9
+
+def test_tiny_inputs_pad_missing_neighbours():
+    indices, distances = knn(np.zeros((2, 3), dtype=np.float32), k=4)
+    assert (indices[:, 1:] == -1).all()
+    assert np.isinf(distances[:, 1:]).all()
+
+def test_knn_graph_is_symmetric_with_unit_bounded_weights():
+    vectors, _ = _blobs([30, 30], seed=3)
+    indptr, cols, weights = knn_graph(*knn(vectors, k=5))
+
+    rows = np.repeat(np.arange(60), np.diff(indptr))
+    edges = dict(zip(zip(rows.tolist(), cols.tolist()), weights.tolist()))
+    assert all(edges[(col, row)] == weight for (row, col), weight in edges.items())
+    assert ((weights > 0) & (weights <= 1)).all()
+    assert len(edges) >= 60 * 5
+
+def test_louvain_recovers_planted_clusters():
+    vectors, labels = _blobs([80, 60, 40, 20], seed=4)
+    graph = knn_graph(*knn(vectors, k=10))
+    membership = louvain(graph, seed=0)
+
+    # Large blobs may split, but no community mixes planted clusters
+    assert 4 <= len(set(membership)) <= 8
+    for community in set(membership):
+        assert len(set(labels[membership == community])) == 1
+    assert modularity(graph, membership) > modularity(graph, np.zeros(len(labels), dtype=np.int64)) + 0.5
+
+def test_analyze_patterns_reports_clusters_traits_and_outliers():
+    rng = np.random.default_rng(5)
+    records = []
+    for n in range(60):
+        pending = n < 40
+        records.append({
+            "claim_id": n,
+            "days_pending": float(rng.normal(200 if pending else 20, 5)),
+            "status": "pending" if pending else "closed",
+            "issues": float(rng.normal(3, 0.5))
+        })
+    records.append({"claim_id": "odd", "days_pending": 2000.0, "status": "closed", "issues": 40.0})
+
+    result = analyze_patterns(records, k=8)
+    clusters = result["clusters"]
+    assert clusters["algorithm"] == ("leiden" if graph_clustering.leidenalg else "louvain")
+    assert clusters["cluster_sizes"] == sorted(clusters["cluster_sizes"], reverse=True)
+    membership = np.array(clusters["membership"])
+    assert len(set(membership[:40]) & set(membership[40:60])) == 0
+    assert "status=pending 100%" in result["patterns"][0]
+    assert result["anomalies"][0]["claim_id"] == "odd"
+    assert set(result["timings_ms"]) >= {"encode_ms", "graph_ms", "cluster_ms", "total_ms"}
+
+def test_analyze_patterns_handles_tiny_inputs():
+    assert analyze_patterns([])["clusters"]["num_clusters"] == 0
+    small = analyze_patterns([{"claim_id": 1, "age": 3}, {"claim_id": 2, "age": 4}])
+    assert small["clusters"]["membership"] == [0, 0]
+    assert small["anomalies"] == []
@@ -0,0 +1,108 @@
+"""Knowledge base snapshots: mapped restore and staleness checks"""
+import asyncio
+import json
+
+import pytest
+
+from app.services.index_snapshot import (
+    _PREAMBLE, MappedKeyIndex, SnapshotDocuments, SnapshotError, load_snapshot, snapshot_path
+)
+from app.services.knowledge_base import KnowledgeBaseService
+
+QUERIES = ["ptsd rating", "service connection nexus", "agent orange vietnam"]
+
+def _build(snapshot_dir) -> KnowledgeBaseService:
+    kb_service = KnowledgeBaseService(snapshot_dir=str(snapshot_dir))
+    asyncio.run(kb_service.initialize())
+    return kb_service
+
+def _sections(kb_service: KnowledgeBaseService, query: str):
+    response = asyncio.run(kb_service.query(query, mode="keyword"))
+    return [(match["source"], match["section"]) for match in response["results"]], response["total_found"]
+
+def test_restored_snapshot_matches_built_index(tmp_path):
+    built = _build(tmp_path)
+    assert built.snapshot is None
+
+    restored = _build(tmp_path)
+    assert restored.snapshot is not None
+    assert isinstance(restored.search_index.key_to_id, MappedKeyIndex)
+    assert isinstance(restored.knowledge_store["38CFR"], SnapshotDocuments)
+    for query in QUERIES:
+        assert _sections(restored, query) == _sections(built, query)
+    assert restored.search_index.doc_count == built.search_index.doc_count
+    assert sorted(restored.knowledge_store["M21-1"]) == sorted(built.knowledge_store["M21-1"])
+
+def test_restored_index_accepts_live_updates(tmp_path):
+    _build(tmp_path)
+    kb_service = _build(tmp_path)
+
+    assert asyncio.run(kb_service.delete_document("38CFR", "3.309"))
+    assert ("38CFR", "3.309") not in kb_service.search_index
+    assert "3.309" not in kb_service.knowledge_store["38CFR"]
+    assert not any(section == "3.309" for _, section in _sections(kb_service, "agent orange vietnam")[0])
+
+    asyncio.run(kb_service.add_document("38CFR", "3.310", {
+        "title": "Secondary Service Connection",
+        "content": "Disability proximately due to a service-connected condition is service connected.",
+        "category": "service_connection",
+        "tags": ["secondary", "service connection"]
+    }))
+    assert kb_service.search_index.key_to_id[("38CFR", "3.310")] == len(kb_service.search_index.doc_keys) - 1
+    assert any(section == "3.310" for _, section in _sections(kb_service, "secondary service connection")[0])
+
+def test_snapshot_from_different_seed_content_is_rebuilt(tmp_path, monkeypatch):
+    _build(tmp_path)
+
+    original = KnowledgeBaseService._load_va_procedures
+
+    async def load_changed(self):
+        await original(self)
+        self.knowledge_store["VA_procedures"]["tdiu"]["content"] += " Schedular ratings apply."
+
+    monkeypatch.setattr(KnowledgeBaseService, "_load_va_procedures", load_changed)
+    changed = _build(tmp_path)
+    assert changed.snapshot is None
+    assert "Schedular" in changed.knowledge_store["VA_procedures"]["tdiu"]["content"]
+
+    reloaded = _build(tmp_path)
+    assert reloaded.snapshot is not None
+    assert "Schedular" in reloaded.knowledge_store["VA_procedures"]["tdiu"]["content"]
+
+def _rewrite_header(path: str, edit):
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, fmt, header_len = _PREAMBLE.unpack_from(data, 0)
+    header = json.loads(data[_PREAMBLE.size:_PREAMBLE.size + header_len])
+    encoded = json.dumps(edit(header)).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(_PREAMBLE.pack(magic, fmt, len(encoded)) + encoded + data[_PREAMBLE.size + header_len:])
+
+def test_corrupt_snapshot_header_falls_back_to_rebuild(tmp_path):
+    built = _build(tmp_path)
+    path = snapshot_path(str(tmp_path), built.index_version)
+
+    edits = [
+        lambda header: {key: value for key, value in header.items() if key != "sections"},
+        lambda header: {**header, "documents": None, "sections": {**header["sections"], "key_order": "x"}},
+        lambda header: [header]
+    ]
+    for edit in edits:
+        _rewrite_header(path, edit)
+        with pytest.raises(SnapshotError):
+            load_snapshot(path)
+
+        rebuilt = _build(tmp_path)
+        assert rebuilt.snapshot is None
+        assert rebuilt.search_index.doc_count == built.search_index.doc_count
+        assert load_snapshot(path).header["documents"] == built.search_index.doc_count
+
+def test_truncated_snapshot_falls_back_to_rebuild(tmp_path):
+    built = _build(tmp_path)
+    path = snapshot_path(str(tmp_path), built.index_version)
+    with open(path, "r+b") as f:
+        f.truncate(_PREAMBLE.size + 10)
+
+    with pytest.raises(SnapshotError):
+        load_snapshot(path)
+    assert _build(tmp_path).snapshot is None
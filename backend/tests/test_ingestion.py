@@ -0,0 +1,85 @@
+"""Regulation ingestion: source parsing, batching and the worker pool"""
+import asyncio
+
+from app.services.ingestion import IngestionPipeline, iter_batches, iter_sections, parse_html, parse_xml
+from app.services.knowledge_base import KnowledgeBaseService
+
+TEXT_EXPORT = """§ 3.310 Disabilities that are proximately due to service-connected disease.
+Disability which is proximately due to or the result of a service-connected
+disease or injury shall be service connected.
+   § 3.303 cited inside the body stays body text.
+§ 3.311 Claims based on exposure to ionizing radiation.
+Radiogenic diseases are developed under this section.
+§ 3.310 Duplicate heading later in the file.
+Second copy of the section.
+"""
+
+HTML_EXPORT = """<html><head><style>h2 { color: red }</style></head><body>
+<nav>Skip me</nav>
+<h2>M21-1, III.iv.4.A.1 Exam Requirements</h2><p>An exam is required when</p><p>evidence is insufficient.</p>
+<h2>Development Overview</h2><div>Obtain service treatment records.</div>
+</body></html>"""
+
+XML_EXPORT = """<ECFR><DIV8><SECTNO>§ 3.303</SECTNO><SUBJECT>Principles relating to service connection.</SUBJECT>
+<P>Service connection connotes many factors.</P></DIV8>
+<DIV8><SECTNO>§ 3.304</SECTNO><SUBJECT>Direct service connection.</SUBJECT><P>Wartime and peacetime.</P></DIV8></ECFR>"""
+
+def _write(tmp_path, name: str, text: str) -> str:
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+def test_text_export_splits_at_citation_lines(tmp_path):
+    sections = list(iter_sections([_write(tmp_path, "part3.txt", TEXT_EXPORT)], "regulation"))
+
+    assert [section["key"] for section in sections] == ["3.310", "3.311", "3.310-2"]
+    assert sections[0]["title"] == "Disabilities that are proximately due to service-connected disease"
+    assert "cited inside the body" in sections[0]["content"]
+    assert sections[0]["tags"] == ["3.310"]
+
+def test_html_export_skips_chrome_and_slugs_plain_headings(tmp_path):
+    sections = list(parse_html(_write(tmp_path, "m21.html", HTML_EXPORT), "procedures"))
+
+    assert [(section["key"], section["title"]) for section in sections] == [
+        ("III.iv.4.A.1", "Exam Requirements"),
+        ("development-overview", "Development Overview")
+    ]
+    assert sections[0]["content"] == "An exam is required when evidence is insufficient."
+    assert all("Skip me" not in section["content"] for section in sections)
+
+def test_xml_export_yields_one_section_per_div8(tmp_path):
+    sections = list(parse_xml(_write(tmp_path, "title38.xml", XML_EXPORT), "regulation"))
+
+    assert [section["key"] for section in sections] == ["3.303", "3.304"]
+    assert sections[1]["title"] == "Direct service connection"
+
+def test_batches_are_bounded():
+    batches = list(iter_batches(iter(range(7)), 3))
+    assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+
+def _ingest(paths, workers: int):
+    async def run():
+        kb_service = KnowledgeBaseService(snapshot_dir=None)
+        pipeline = IngestionPipeline(kb_service, workers=workers, batch_size=1, max_pending=2)
+        report = await pipeline.run(paths, source="38CFR", category="regulation")
+        response = await kb_service.query("ionizing radiation radiogenic", mode="keyword")
+        return kb_service, report, response
+
+    return asyncio.run(run())
+
+def test_pipeline_indexes_sections_in_process_and_in_worker_processes(tmp_path):
+    paths = [
+        _write(tmp_path, "part3.txt", TEXT_EXPORT),
+        _write(tmp_path, "title38.xml", XML_EXPORT)
+    ]
+    local_kb, local_report, local_response = _ingest(paths, workers=1)
+    pooled_kb, pooled_report, pooled_response = _ingest(paths, workers=2)
+
+    assert local_report["sections"] == pooled_report["sections"] == 5
+    assert local_response["results"][0]["section"] == "3.311"
+    assert [result["section"] for result in pooled_response["results"]] == [
+        result["section"] for result in local_response["results"]
+    ]
+    assert sorted(pooled_kb.knowledge_store["38CFR"]) == sorted(local_kb.knowledge_store["38CFR"])
+    assert pooled_kb.search_index.doc_count == local_kb.search_index.doc_count
+    assert pooled_kb.vector_index.get_stats()["vectors"] == local_kb.vector_index.get_stats()["vectors"]
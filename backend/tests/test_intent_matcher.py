@@ -0,0 +1,64 @@
+"""Aho-Corasick intent matcher"""
+import random
+
+from app.services.intent_matcher import IntentMatcher
+from app.services.qbit_chatbot import INTENT_MATCHER, INTENT_PATTERNS
+
+def _naive(table, text: str):
+    """Reference: the `pattern in message` chain the matcher replaces"""
+    text = text.lower()
+    ranked = sorted(enumerate(table), key=lambda row: (-row[1][1], row[0]))
+    matches = []
+    for _, (intent, weight, patterns) in ranked:
+        found = list(dict.fromkeys(p.lower() for p in patterns if p and p.lower() in text))
+        if found:
+            matches.append({"intent": intent, "weight": weight, "patterns": sorted(found)})
+    return matches
+
+def _sorted_patterns(matches):
+    return [{**match, "patterns": sorted(match["patterns"])} for match in matches]
+
+def test_overlapping_and_nested_patterns_are_all_found():
+    matcher = IntentMatcher([
+        ("a", 1.0, ["he", "she", "his", "hers"]),
+        ("b", 0.5, ["e"])
+    ])
+
+    assert sorted(matcher.patterns[i] for i in matcher.scan("ushers")) == ["e", "he", "hers", "she"]
+    assert matcher.match("USHERS")[0]["intent"] == "a"
+    assert [match["intent"] for match in matcher.match("eel")] == ["b"]
+    assert matcher.best("xyz") is None
+
+def test_equal_weights_keep_table_order():
+    matcher = IntentMatcher([("first", 0.5, ["claim"]), ("second", 0.5, ["claim"]), ("top", 0.9, ["status"])])
+
+    assert [match["intent"] for match in matcher.match("claim status")] == ["top", "first", "second"]
+    assert matcher.best("my claim")["intent"] == "first"
+
+def test_matches_substring_chain_on_random_text():
+    rng = random.Random(11)
+    table = [
+        (f"intent_{n}", rng.choice([0.5, 0.8, 0.9]), [
+            "".join(rng.choice("abc ") for _ in range(rng.randint(1, 4))) for _ in range(3)
+        ])
+        for n in range(12)
+    ]
+    matcher = IntentMatcher(table)
+
+    for _ in range(200):
+        text = "".join(rng.choice("abcABC d") for _ in range(rng.randint(0, 30)))
+        assert _sorted_patterns(matcher.match(text)) == _naive(table, text)
+
+def test_qbit_intent_table_routes_like_the_elif_chain():
+    messages = [
+        "Take me to the claims page",
+        "What is the rating for tinnitus?",
+        "Explain the M21 procedure",
+        "Hi, can you help with my C&P exam?",
+        "I need to file an appeal",
+        "hello there"
+    ]
+    for message in messages:
+        assert _sorted_patterns(INTENT_MATCHER.match(message)) == _naive(INTENT_PATTERNS, message)
+    assert INTENT_MATCHER.best(messages[0])["intent"] == "navigation"
+    assert INTENT_MATCHER.best("hello there") is None
@@ -0,0 +1,53 @@
+"""Knowledge base benchmark harness: synthetic corpus and a small run"""
+import asyncio
+import json
+
+import structlog
+
+from benchmarks.kb_benchmark import QUERY_SHAPES, SyntheticCorpus, main, run_size
+
+def test_corpus_is_deterministic_per_seed():
+    first = list(SyntheticCorpus(seed=3).sections(5))
+    second = list(SyntheticCorpus(seed=3).sections(5))
+    other = list(SyntheticCorpus(seed=4).sections(5))
+
+    assert first == second
+    assert first != other
+    assert [(source, key) for source, key, _ in first][:2] == [("38CFR", "0.0"), ("M21-1", "0.1")]
+    assert all(document["content"] and document["tags"] for _, _, document in first)
+
+def test_every_query_shape_is_generated():
+    corpus = SyntheticCorpus()
+    sample_docs = [document for _, _, document in corpus.sections(10)]
+
+    for shape in QUERY_SHAPES:
+        queries = corpus.queries(shape, 3, sample_docs)
+        assert len(queries) == 3
+        assert all(text for text, _ in queries)
+    assert all(len(categories) == 2 for _, categories in corpus.queries("filtered", 3, sample_docs))
+    assert all(text.startswith('"') for text, _ in corpus.queries("phrase", 3, sample_docs))
+
+def test_small_run_reports_build_and_query_latency(tmp_path):
+    result = asyncio.run(run_size(SyntheticCorpus(), 60, 5, "keyword", False, str(tmp_path)))
+
+    assert result["sections"] == 60
+    assert result["index"]["documents"] == 60
+    assert result["snapshot"]["bytes"] > 0
+    assert set(result["queries"]) == set(QUERY_SHAPES)
+    for stats in result["queries"].values():
+        assert stats["count"] == 5
+        assert 0 <= stats["p50_ms"] <= stats["p99_ms"] <= stats["max_ms"]
+    assert result["queries"]["phrase"]["with_results"] == 5
+
+def test_main_writes_a_json_report(tmp_path):
+    output = tmp_path / "kb-bench.json"
+    config = structlog.get_config()
+    try:
+        main(["--sizes", "20,40", "--queries", "2", "--output", str(output)])
+    finally:
+        structlog.configure(**config)
+
+    report = json.loads(output.read_text())
+    assert report["benchmark"] == "knowledge_base"
+    assert report["config"]["mode"] == "keyword"
+    assert [result["sections"] for result in report["results"]] == [20, 40]
@@ -0,0 +1,81 @@
+"""Knowledge base service: live updates and index maintenance"""
+import asyncio
+import threading
+
+from app.services import knowledge_base
+from app.services.knowledge_base import KnowledgeBaseService, document_fields
+from app.services.search_index import InvertedIndex, merge_segments, tokenize
+
+DELETED = [("38CFR", "3.307"), ("38CFR", "3.309"), ("M21-1", "III.iv.4.C.3"), ("VA_procedures", "tdiu")]
+
+NEW_DOCUMENT = {
+    "title": "Secondary Service Connection",
+    "content": "Disability proximately due to a service-connected condition is service connected.",
+    "category": "service_connection",
+    "tags": ["secondary"]
+}
+
+def _reference(kb_service: KnowledgeBaseService) -> InvertedIndex:
+    index = InvertedIndex()
+    for source, docs in kb_service.knowledge_store.items():
+        for key, item in docs.items():
+            index.add_document((source, key), document_fields(item))
+    return index
+
+def test_optimize_waits_for_background_compaction(monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+
+    def held_merge(segments, tombstones):
+        started.set()
+        release.wait(5)
+        return merge_segments(segments, tombstones)
+
+    monkeypatch.setattr(knowledge_base, "merge_segments", held_merge)
+
+    async def run():
+        kb_service = KnowledgeBaseService(snapshot_dir=None)
+        await kb_service.initialize()
+        for source, key in DELETED:
+            await kb_service.delete_document(source, key)
+        background = kb_service._compaction_task
+        assert background is not None
+
+        # Land a live update and an optimize() while the background merge runs
+        assert await asyncio.to_thread(started.wait, 5)
+        await kb_service.add_document("38CFR", "3.310", NEW_DOCUMENT)
+        await kb_service.delete_document("38CFR", "4.130")
+        optimizing = asyncio.create_task(kb_service.optimize())
+        await asyncio.sleep(0.05)
+        release.set()
+        await optimizing
+        await background
+        return kb_service
+
+    kb_service = asyncio.run(run())
+    index = kb_service.search_index
+    reference = _reference(kb_service)
+
+    # optimize() ran its own full merge after the background one
+    assert not index.tombstones
+    assert len(index.segments) == 2 and index.active_segment.doc_count == 0
+    assert index.get_stats()["postings"] == reference.get_stats()["postings"]
+    terms = tokenize("service connection secondary rating")
+    for term in terms:
+        assert index.doc_frequency(term) == reference.doc_frequency(term)
+    hits, _ = index.search(terms, top_k=20)
+    assert hits and all(score > 0 for _, score in hits)
+
+def test_delete_removes_document_from_results_and_store():
+    async def run():
+        kb_service = KnowledgeBaseService(snapshot_dir=None)
+        await kb_service.initialize()
+        before = await kb_service.query("agent orange vietnam", mode="keyword")
+        await kb_service.delete_document("38CFR", "3.309")
+        after = await kb_service.query("agent orange vietnam", mode="keyword")
+        return kb_service, before, after
+
+    kb_service, before, after = asyncio.run(run())
+    assert any(result["section"] == "3.309" for result in before["results"])
+    assert not any(result["section"] == "3.309" for result in after["results"])
+    assert "3.309" not in kb_service.knowledge_store["38CFR"]
@@ -0,0 +1,84 @@
+"""Positional postings: phrase, proximity and required-term queries"""
+import asyncio
+
+from app.services.knowledge_base import KnowledgeBaseService
+from app.services.search_index import InvertedIndex, parse_query
+
+def _index() -> InvertedIndex:
+    index = InvertedIndex()
+    index.add_document("lod", [("Line of Duty", 2), ("An injury incurred in the line of duty is service connected.", 1)])
+    index.add_document("duty", [("Active duty service", 2), ("Service during duty hours on the line.", 1)])
+    index.add_document("tdiu", [("Unemployability", 2), ("Individual unemployability for service connected veterans.", 1)])
+    index.add_document("nexus", [("Nexus", 2), ("A medical nexus opinion connects the condition to service.", 1)])
+    return index
+
+def _keys(index: InvertedIndex, text: str, top_k: int = 10):
+    hits, total = index.search_query(parse_query(text), top_k=top_k)
+    return [index.doc_keys[doc_id] for doc_id, _ in hits], total
+
+def test_parse_splits_phrases_proximity_and_required_terms():
+    parsed = parse_query('"line of duty" "service nexus"~3 +tdiu rating')
+
+    assert parsed.terms == ["line", "duty", "service", "nexus", "tdiu", "rating"]
+    assert parsed.required == ["tdiu"]
+    assert [(phrase.terms, phrase.offsets, phrase.slop) for phrase in parsed.phrases] == [
+        (["line", "duty"], [0, 2], 0),
+        (["service", "nexus"], [0, 1], 3)
+    ]
+    assert parsed.pairs == [("tdiu", "rating", 1)]
+    assert parse_query('"ptsd"').required == ["ptsd"]
+    assert not parse_query("service connection").constrained
+
+def test_phrase_requires_terms_at_their_offsets():
+    index = _index()
+
+    assert _keys(index, '"line of duty"') == (["lod"], 1)
+    # The stopword still occupies a position, so adjacent words do not match
+    assert _keys(index, '"line duty"') == ([], 0)
+    assert _keys(index, '"duty line"') == ([], 0)
+    # Phrases never span the gap between title and body
+    assert _keys(index, '"duty service"') == (["duty"], 1)
+    assert _keys(index, '"duty injury"') == ([], 0)
+
+def test_proximity_allows_slop_in_either_order():
+    index = _index()
+
+    assert _keys(index, '"nexus service"~4') == ([], 0)
+    assert _keys(index, '"nexus service"~5') == (["nexus"], 1)
+    assert _keys(index, '"connected service"~0')[1] == 0
+    assert sorted(_keys(index, '"connected service"~1')[0]) == ["lod", "tdiu"]
+
+def test_required_terms_filter_and_plain_words_still_score():
+    index = _index()
+
+    assert _keys(index, "+unemployability service") == (["tdiu"], 1)
+    assert _keys(index, "+unemployability +nexus") == ([], 0)
+    assert _keys(index, "+missing service") == ([], 0)
+    assert _keys(index, "service connected")[1] == 4
+
+def test_adjacent_plain_words_get_a_proximity_bonus():
+    index = InvertedIndex()
+    index.add_document("far", [("connected claims need evidence of service", 1)])
+    index.add_document("near", [("claims need evidence of service connected", 1)])
+
+    plain, _ = index.search(["service", "connected"], top_k=2)
+    boosted, _ = index.search_query(parse_query("service connected"), top_k=2)
+    assert plain[0][1] == plain[1][1]
+    assert index.doc_keys[boosted[0][0]] == "near"
+    assert boosted[0][1] > boosted[1][1] == plain[0][1]
+
+def test_knowledge_base_phrase_query():
+    async def run():
+        kb_service = KnowledgeBaseService(snapshot_dir=None)
+        await kb_service.initialize()
+        phrase = await kb_service.query('"agent orange"', mode="keyword")
+        missing = await kb_service.query('"orange agent"', mode="keyword")
+        return phrase, missing
+
+    phrase, missing = asyncio.run(run())
+    assert phrase["results"]
+    assert all(
+        "agent orange" in f"{result['title']} {result['content']}".lower()
+        for result in phrase["results"]
+    )
+    assert missing["total_found"] < phrase["total_found"]
@@ -0,0 +1,160 @@
+"""QBit chatbot tests"""
+
+import asyncio
+
+from app import main_simplified
+from app.services.agent_orchestrator import AgentOrchestrator
+from app.services.conversation_store import ConversationStore
+from app.services.knowledge_base import KnowledgeBaseService
+from app.services.qbit_chatbot import QBitChatbot
+
+async def _chatbot():
+    kb_service = KnowledgeBaseService(snapshot_dir=None)
+    await kb_service.initialize()
+    orchestrator = AgentOrchestrator(kb_service=kb_service, execution_backends={})
+    await orchestrator.initialize()
+    return QBitChatbot(kb_service, orchestrator), orchestrator
+
+def test_repeated_claim_review_hits_result_cache():
+    async def run():
+        chatbot, orchestrator = await _chatbot()
+        message = "What evidence do I need for a PTSD claim?"
+        first = await chatbot.process_message("user_1", "session_1", message)
+        second = await chatbot.process_message("user_1", "session_1", message)
+        return first, second, orchestrator.result_caches["claims_processor"].get_stats()
+
+    first, second, stats = asyncio.run(run())
+    assert first["type"] == "claim_assistance"
+    assert second["message"] == first["message"]
+    assert stats["misses"] == 1
+    assert stats["hits"] == 1
+
+def test_result_cache_follows_knowledge_base_generation():
+    async def run():
+        chatbot, orchestrator = await _chatbot()
+        message = "What evidence do I need for a PTSD claim?"
+        await chatbot.process_message("user_1", "session_1", message)
+        chatbot.kb_service.search_index.generation += 1
+        await chatbot.process_message("user_1", "session_1", message)
+        return orchestrator.result_caches["claims_processor"].get_stats()
+
+    stats = asyncio.run(run())
+    assert stats["hits"] == 0
+    assert stats["misses"] == 2
+
+def test_general_chat_replies_without_error():
+    async def run():
+        chatbot, _ = await _chatbot()
+        return await chatbot.process_message("user_1", "session_1", "hello there")
+
+    response = asyncio.run(run())
+    assert response["type"] == "chat"
+    assert response["message"]
+    assert "error" not in response
+
+def test_broadcast_claim_query_runs_once_and_is_logged_per_user():
+    async def run():
+        chatbot, orchestrator = await _chatbot()
+        message = "What evidence do I need for a PTSD claim?"
+        users = [f"user_{n}" for n in range(5)] + ["user_0"]
+        responses = await asyncio.gather(*(
+            chatbot.process_message(user_id, f"session_{n}", message)
+            for n, user_id in enumerate(users)
+        ))
+        return users, responses, chatbot, orchestrator
+
+    users, responses, chatbot, orchestrator = asyncio.run(run())
+    pool = orchestrator.agents["claims_processor"].get_stats()
+    assert chatbot.in_flight.get_stats()["executions"] == 1
+    assert orchestrator.result_caches["claims_processor"].get_stats()["misses"] == 1
+    assert pool["submitted"] == len(users)
+    assert pool["coalesced"] == len(users) - 1
+    assert pool["coalesced_users"] == 5
+    assert sorted(record["user_id"] for record in orchestrator.request_log.recent()) == sorted(users)
+    assert len({response["message"] for response in responses}) == 1
+
+def test_shed_claim_query_reports_overload_after_references():
+    async def run():
+        chatbot, orchestrator = await _chatbot()
+
+        async def overloaded(*args, **kwargs):
+            return {"error": "Agent is overloaded, please retry shortly", "error_code": "AGENT_OVERLOADED"}
+
+        orchestrator.process_with_agent = overloaded
+        return [frame async for frame in chatbot.stream_message(
+            "user_1", "session_1", "What evidence do I need for a PTSD claim?"
+        )]
+
+    frames = asyncio.run(run())
+    response = frames[-1]["response"]
+    assert any(frame.get("kind") == "reference" for frame in frames[:-1])
+    assert response["type"] == "error"
+    assert response["error_code"] == "AGENT_OVERLOADED"
+    assert "try again" in response["message"]
+
+def test_general_chat_reports_agent_timeout():
+    async def run():
+        chatbot, orchestrator = await _chatbot()
+
+        async def timed_out(*args, **kwargs):
+            return {"error": "Processing timeout", "error_code": "AGENT_TIMEOUT"}
+
+        orchestrator.process_with_agent = timed_out
+        return await chatbot.process_message("user_1", "session_1", "hello there")
+
+    response = asyncio.run(run())
+    assert response["type"] == "error"
+    assert response["error_code"] == "AGENT_TIMEOUT"
+
+async def _frames(chatbot: QBitChatbot, message: str):
+    return [frame async for frame in chatbot.stream_message("user_1", "session_1", message)]
+
+def test_deterministic_replies_are_memoized_until_the_index_changes():
+    async def run():
+        chatbot, _ = await _chatbot()
+        message = "Explain the M21 procedure for appeals"
+        first = await _frames(chatbot, message)
+        first[-1]["response"]["message"] = "changed by the caller"
+        second = await _frames(chatbot, "explain the  M21 procedure for appeals?")
+        hits = chatbot.response_cache.get_stats()["hits"]
+        chatbot.kb_service.search_index.generation += 1
+        await _frames(chatbot, message)
+        return first, second, hits, chatbot.response_cache.get_stats()
+
+    first, second, hits, stats = asyncio.run(run())
+    assert hits == 1
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+    assert second[-1]["response"]["type"] == "knowledge"
+    assert second[-1]["response"]["message"] != "changed by the caller"
+    # Replayed chunks are restamped for the new stream
+    assert [frame["kind"] for frame in second[:-1]] == [frame["kind"] for frame in first[:-1]]
+    assert second[0]["stream_id"] != first[0]["stream_id"]
+    assert [frame["sequence"] for frame in second[:-1]] == list(range(len(second) - 1))
+
+def test_navigation_is_memoized_and_claims_are_not():
+    async def run():
+        chatbot, _ = await _chatbot()
+        for _ in range(2):
+            await chatbot.process_message("user_1", "session_1", "Take me to the appeals page")
+        navigation = chatbot.response_cache.get_stats()
+        await chatbot.process_message("user_1", "session_1", "What evidence do I need for a PTSD claim?")
+        return navigation, chatbot.response_cache.get_stats()
+
+    navigation, stats = asyncio.run(run())
+    assert (navigation["hits"], navigation["size"]) == (1, 1)
+    assert stats["size"] == 1
+
+def test_simplified_service_memoizes_static_handlers():
+    service = main_simplified.QBitService(main_simplified.storage.knowledge_base, ConversationStore())
+
+    async def run():
+        first = await service.process_message("user_1", "What is service connection?")
+        first["content"] = "changed by the caller"
+        second = await service.process_message("user_2", "what is  service connection")
+        await service.process_message("user_1", "hello")
+        return second
+
+    second = asyncio.run(run())
+    stats = service.response_cache.get_stats()
+    assert (stats["hits"], stats["size"]) == (1, 1)
+    assert second["content"].startswith("Based on M21-1")
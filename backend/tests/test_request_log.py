@@ -0,0 +1,27 @@
+"""Agent request log tests"""
+
+from app.services.request_log import FINGERPRINT_NESTED_VALUES, task_fingerprint
+
+def _task(title: str):
+    return {
+        "query": "PTSD evidence",
+        "kb_results": {
+            "results": [
+                {"source": "M21-1 IV.ii.1.B.1", "section": "IV.ii.1.B.1", "title": title, "score": 2.5}
+            ],
+            "total_found": 1
+        }
+    }
+
+def test_fingerprint_covers_nested_content():
+    assert task_fingerprint(_task("PTSD Rating Criteria")) == task_fingerprint(_task("PTSD Rating Criteria"))
+    assert task_fingerprint(_task("PTSD Rating Criteria")) != task_fingerprint(_task("Mental Disorders"))
+
+def test_fingerprint_samples_large_payloads():
+    head = list(range(FINGERPRINT_NESTED_VALUES * 2))
+    changed_tail = head[:-1] + [-1]
+    changed_head = [-1] + head[1:]
+
+    assert task_fingerprint({"items": head}) == task_fingerprint({"items": changed_tail})
+    assert task_fingerprint({"items": head}) != task_fingerprint({"items": changed_head})
+    assert task_fingerprint({"items": head}) != task_fingerprint({"items": head + [0]})
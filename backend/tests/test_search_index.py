@@ -0,0 +1,87 @@
+"""Inverted index: incremental updates, tombstones and segment compaction"""
+
+from app.services.search_index import InvertedIndex, merge_segments
+
+def _index(**kwargs) -> InvertedIndex:
+    index = InvertedIndex(**kwargs)
+    index.add_document("a", [("alpha beta", 1)])
+    index.add_document("b", [("alpha gamma", 1)])
+    index.add_document("c", [("delta", 1)])
+    return index
+
+def _keys(index: InvertedIndex, terms):
+    return [index.doc_keys[doc_id] for doc_id, _ in index.search(terms, top_k=10)[0]]
+
+def test_replacing_a_document_tombstones_the_old_version():
+    index = _index()
+    index.add_document("a", [("epsilon", 1)])
+
+    assert index.doc_count == 3
+    assert len(index.tombstones) == 1
+    assert _keys(index, ["beta"]) == []
+    assert _keys(index, ["epsilon"]) == ["a"]
+    assert sorted(_keys(index, ["alpha"])) == ["b"]
+
+def test_delete_then_compact_purges_dead_postings():
+    index = _index()
+    assert index.delete_document("b")
+    assert not index.delete_document("b")
+    assert index.doc_frequency("gamma") == 1
+
+    index.compact()
+    assert not index.tombstones
+    assert index.doc_frequency("gamma") == 0
+    assert index.doc_frequency("alpha") == 1
+    assert _keys(index, ["alpha"]) == ["a"]
+
+def test_full_segments_are_sealed_and_counted_for_compaction():
+    index = InvertedIndex(segment_size=2, max_segments=1)
+    for n in range(5):
+        index.add_document(n, [(f"term{n} shared", 1)])
+
+    assert len(index.segments) == 3
+    assert index.needs_compaction()
+    index.compact()
+    assert len(index.segments) == 2
+    assert index.get_stats()["postings"] == 10
+    assert index.doc_frequency("shared") == 5
+
+def test_only_one_compaction_plan_is_open_at_a_time():
+    index = _index()
+    plan = index.begin_compaction()
+    assert not plan.empty
+    assert index.begin_compaction().empty
+    assert not index.compact()
+
+    merged = merge_segments(plan.segments, plan.tombstones)
+    assert index.finish_compaction(plan, merged)
+    assert not index.finish_compaction(plan, merged)
+    assert index.get_stats()["postings"] == 5
+
+def test_stale_plan_is_rejected_instead_of_duplicating_postings():
+    index = _index()
+    plan = index.begin_compaction()
+    merged = merge_segments(plan.segments, plan.tombstones)
+    # Another writer swaps the plan's segments out underneath it
+    index.segments = [merged, index.active_segment]
+
+    assert not index.finish_compaction(plan, merged)
+    assert index.doc_frequency("alpha") == 2
+    assert not index.begin_compaction().empty
+
+def test_aborted_plan_can_be_retried():
+    index = _index()
+    index.abort_compaction(index.begin_compaction())
+    assert index.compact()
+    assert len(index.segments) == 2
+
+def test_updates_during_a_merge_survive_it():
+    index = _index()
+    plan = index.begin_compaction()
+    index.add_document("d", [("alpha", 1)])
+    index.delete_document("c")
+
+    assert index.finish_compaction(plan, merge_segments(plan.segments, plan.tombstones))
+    assert sorted(_keys(index, ["alpha"])) == ["a", "b", "d"]
+    assert _keys(index, ["delta"]) == []
+    assert index.doc_count == 3
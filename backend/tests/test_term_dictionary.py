@@ -0,0 +1,84 @@
+"""Term dictionary: prefix completion and fuzzy correction"""
+import asyncio
+import random
+
+from app.services.knowledge_base import KnowledgeBaseService
+from app.services.search_index import InvertedIndex
+from app.services.term_dictionary import TermDictionary
+
+def _levenshtein(a: str, b: str) -> int:
+    row = list(range(len(b) + 1))
+    for i, char in enumerate(a, 1):
+        previous, row[0] = row[0], i
+        for j in range(1, len(b) + 1):
+            previous, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, previous + (char != b[j - 1]))
+    return row[-1]
+
+def test_completions_rank_by_frequency_and_see_new_terms():
+    dictionary = TermDictionary({"service": 9, "serum": 2, "sequela": 2, "rating": 5})
+
+    assert dictionary.complete("se") == ["service", "sequela", "serum"]
+    assert dictionary.complete("ser", limit=1) == ["service"]
+    assert dictionary.complete("x") == []
+    assert dictionary.prefix_range("") == (0, 4)
+
+    # Adding a term drops cached short-prefix completions
+    dictionary.add("sed")
+    assert "sed" in dictionary and len(dictionary) == 5
+    assert dictionary.complete("se") == ["service", "sequela", "serum", "sed"]
+
+def test_fuzzy_matches_brute_force_edit_distance():
+    rng = random.Random(7)
+    vocabulary = {
+        "".join(rng.choice("abcde") for _ in range(rng.randint(2, 7))): rng.randint(1, 9)
+        for _ in range(400)
+    }
+    dictionary = TermDictionary(vocabulary)
+
+    for term in ["abcde", "bad", "ceedab", "aaaa", "e"]:
+        for max_distance in (1, 2):
+            expected = sorted(
+                (candidate, _levenshtein(term, candidate)) for candidate in vocabulary
+                if candidate[0] == term[0] and _levenshtein(term, candidate) <= max_distance
+            )
+            assert sorted(dictionary.fuzzy(term, max_distance)) == expected
+            # Repeat lookups come from the cache and are not shared lists
+            dictionary.fuzzy(term, max_distance).clear()
+            assert sorted(dictionary.fuzzy(term, max_distance)) == expected
+
+def test_index_correction_prefers_closest_then_most_common_live_term():
+    index = InvertedIndex()
+    index.add_document("a", [("hearing loss tinnitus", 1)])
+    index.add_document("b", [("hearing aids", 1)])
+    index.add_document("c", [("heating season", 1)])
+
+    assert index.complete("hea") == ["hearing", "heating"]
+    assert index.correct("heaing", 1) == "hearing"
+    assert index.correct("hearin", 2) == "hearing"
+    assert index.correct("tinitus", 1) == "tinnitus"
+    # Terms with postings and exact-only lookups are never corrected
+    assert index.correct("hearing", 2) is None
+    assert index.correct("hearin", 0) is None
+
+    # Once compaction drops its postings a deleted term is no longer offered
+    index.delete_document("a")
+    index.compact()
+    assert index.correct("tinitus", 1) is None
+
+def test_knowledge_base_suggest_and_query_corrections():
+    async def run():
+        kb_service = KnowledgeBaseService(snapshot_dir=None)
+        await kb_service.initialize()
+        suggest = await kb_service.suggest("agent ora")
+        misspelled = await kb_service.suggest("presumtive")
+        corrected = await kb_service.query("presumtive", mode="keyword")
+        citation = await kb_service.query("3.3099", mode="keyword")
+        return suggest, misspelled, corrected, citation
+
+    suggest, misspelled, corrected, citation = asyncio.run(run())
+    assert suggest["completions"][0] == "orange"
+    assert suggest["suggestions"][0] == "agent orange"
+    assert misspelled["completions"] == ["presumptive"]
+    assert corrected["corrections"] == {"presumtive": "presumptive"}
+    assert corrected["results"]
+    assert citation["corrections"] == {}